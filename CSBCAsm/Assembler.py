@@ -1,12 +1,16 @@
-import copy
-import io
+import bisect
 import os
 
 from . import ParserAST
 from . import Opcodes
 
 from .Lexer import CreateLexer
-from .Parser import CreateParser, ParseError
+from .Parser import CreateParser, ParseError, default_parser_cache_dir
+from .ParseCache import ParseCache, DEFAULT_PARSE_CACHE_SIZE, dump_program, load_program
+from .BuildCache import BuildCache, DEFAULT_BUILD_CACHE_SIZE
+from .Listing import ListingWriter, LISTING_SOURCE_COLUMN, LISTING_COMMENT_COLUMN
+from .DebugInfo import SYMBOL_LOCAL, SYMBOL_GLOBAL, SYMBOL_TEMPORARY
+from .ObjectFile import RELOCATION_ABSOLUTE, RELOCATION_RELATIVE, RELOCATION_RELATIVE_LONG
 from .Errors import *
 
 from rply.errors import LexingError
@@ -24,7 +28,7 @@ class LexerWrapper():
         return self
 
     def next(self):
-        v = self.lexer_stream.next()
+        v = next(self.lexer_stream)
         if self.in_multiline_comment:
             if v.gettokentype() != 'MULTILINE_COMMENT_END':
                 raise StopIteration
@@ -32,7 +36,7 @@ class LexerWrapper():
                 # skip this token and keep going!
                 self.in_multiline_comment = False
                 self.ended_with_comment = False
-                v = self.lexer_stream.next()
+                v = next(self.lexer_stream)
         if v.gettokentype() == 'MULTILINE_COMMENT_START':
             self.ended_with_comment = True
             raise StopIteration
@@ -50,19 +54,193 @@ class Assembler():
     VERBOSE_BASIC = 1
     VERBOSE_NONE = 0
 
-    LISTING_SOURCE_COLUMN = 32
-    LISTING_COMMENT_COLUMN = 52
+    LISTING_SOURCE_COLUMN = LISTING_SOURCE_COLUMN
+    LISTING_COMMENT_COLUMN = LISTING_COMMENT_COLUMN
 
-    def __init__(self, verbose=0, include_path=[], listing_file=None):
+    def __init__(self, verbose=0, include_path=[], listing_file=None, parser_cache=True, parser_cache_dir=None,
+                 streaming_parse=True, lexer_backend="rply", include_cache=False, include_cache_dir=None,
+                 include_cache_size=DEFAULT_PARSE_CACHE_SIZE, listing_summary=False, collect_debug_info=False,
+                 build_cache=False, build_cache_dir=None, build_cache_size=DEFAULT_BUILD_CACHE_SIZE, relocatable=False,
+                 keep_source_parse=False, tables=None):
         self.verbose = verbose
         self.include_path = include_path
         self.listing_file = listing_file
+        self.listing_summary = listing_summary # list bulk data as one line with its length and CRC-32
+        self.streaming_parse = streaming_parse
         self.segments = {}
-        self.opcodes = Opcodes.OpcodeDatabase()
-        self.lexer = CreateLexer()
-        self.parser = CreateParser()
+        if tables is None or tables.lexer_backend != lexer_backend:
+            tables = AssemblerTables(lexer_backend=lexer_backend, parser_cache=parser_cache, parser_cache_dir=parser_cache_dir)
+        self.opcodes = tables.opcodes
+        self.lexer = tables.lexer
+        self.buffer_lexer = tables.buffer_lexer
+        self.parser = tables.parser
+        self.instruction_table = tables.instruction_table
+        self.include_cache = None
+        if include_cache:
+            if include_cache_dir is None:
+                include_cache_dir = os.path.join(default_parser_cache_dir(), "includes")
+            self.include_cache = ParseCache(include_cache_dir, max_size=include_cache_size)
+        self._parsed_files = {} # real path -> (mtime, size, serialized lines), see parse_include_file()
+        self.keep_source_parse = keep_source_parse # reuse the parse of an unchanged source file, see parse_source()
+        self._parsed_sources = {} # file name -> (source, serialized lines)
+        self.dependencies = []         # the files the last assembly read, see add_dependency()
+        self.missing_dependencies = [] # include path candidates that were searched and didn't exist
+        self.collect_debug_info = collect_debug_info
+        self.debug_info = None         # ProgramBuilder.get_debug_info() of the last assembly, with collect_debug_info set
+        self.build_cache = None
+        if build_cache:
+            if build_cache_dir is None:
+                build_cache_dir = os.path.join(default_parser_cache_dir(), "builds")
+            self.build_cache = BuildCache(build_cache_dir, max_size=build_cache_size)
+        self.relocatable = relocatable # leave labels named in .GLOBAL but not declared to the linker
+        self.link_info = None          # ProgramBuilder.get_link_info() of the last assembly, when relocatable
 
     def parse_string(self, s, fn="<unknown>", included_from=None):
+        if self.streaming_parse:
+            return self.parse_string_streaming(s, fn=fn, included_from=included_from)
+        return self.parse_string_by_line(s, fn=fn, included_from=included_from)
+
+    def find_include(self, fn):
+        '''Locate include file fn, first relative to the current directory and then in the include path.
+           The file found is added to the dependencies, and the places searched before it to the
+           missing dependencies, since a file created at one of them would be included instead'''
+        missing = []
+        if os.path.isfile(fn):
+            self.add_dependency(fn)
+            return fn
+        missing.append(fn)
+        if not os.path.isabs(fn):
+            for path in self.include_path or []:
+                newfname = os.path.sep.join([path, fn])
+                if os.path.isfile(newfname):
+                    self.add_missing_dependencies(missing)
+                    self.add_dependency(newfname)
+                    return newfname
+                missing.append(newfname)
+        # creating any of them fixes the build
+        self.add_missing_dependencies(missing)
+        raise FileNotFoundError("Could not locate file '{}'".format(fn))
+
+    def add_dependency(self, path):
+        '''Record that the assembly read path, for dependency files'''
+        if path not in self.dependencies:
+            self.dependencies.append(path)
+
+    def add_missing_dependencies(self, paths):
+        '''Record that the assembly looked for each of paths and didn't find it'''
+        for path in paths:
+            if path not in self.missing_dependencies:
+                self.missing_dependencies.append(path)
+
+    def parse_include_file(self, path, fn, included_from):
+        '''Parse the include file at path. A file that is included more than once and hasn't changed in
+           between is only read and parsed the first time; every use gets its own copy of the lines'''
+        st = os.stat(path)
+        real_path = os.path.realpath(path)
+        saved = self._parsed_files.get(real_path)
+        if saved is not None and saved[:2] == (st.st_mtime_ns, st.st_size):
+            if self.verbose >= Assembler.VERBOSE_EVERYTHING:
+                print("reusing parse of {}".format(fn))
+            return load_program(saved[2], fn, included_from)
+
+        with open(path, "r") as fp:
+            content = fp.read()
+        program = self.parse_include(content, fn, included_from)
+        self._parsed_files[real_path] = (st.st_mtime_ns, st.st_size, dump_program(program))
+        return program
+
+    def parse_source(self, s, fn):
+        '''parse_string() for the file being assembled. With keep_source_parse, the last parse of each file
+           is kept and used again while the source hasn't changed, for rebuilds after an include changed'''
+        if not self.keep_source_parse:
+            return self.parse_string(s, fn)
+
+        saved = self._parsed_sources.get(fn)
+        if saved is not None and saved[0] == s:
+            if self.verbose >= Assembler.VERBOSE_EVERYTHING:
+                print("reusing parse of {}".format(fn))
+            return load_program(saved[1], fn, None)
+
+        program = self.parse_string(s, fn)
+        self._parsed_sources[fn] = (s, dump_program(program))
+        return program
+
+    def parse_include(self, s, fn, included_from):
+        '''parse_string() for included files, which go through the include cache when it's enabled'''
+        if self.include_cache is None:
+            return self.parse_string(s, fn=fn, included_from=included_from)
+
+        program = self.include_cache.get(s)
+        if program is None:
+            program = self.parse_string(s, fn=fn, included_from=included_from)
+            self.include_cache.put(s, program)
+        else:
+            if self.verbose >= Assembler.VERBOSE_EVERYTHING:
+                print("using cached parse of {}".format(fn))
+            for line in program:
+                line.filename = fn
+                line.included_from = included_from
+        return program
+
+    def parse_string_streaming(self, s, fn="<unknown>", included_from=None):
+        '''Tokenize all of s in one pass and parse it a line at a time. Produces the same lines as parse_string_by_line()'''
+        program = [] # list of lines
+        for line_number, tokens in self._token_lines(s, fn):
+            try:
+                parsed_line = self.parser.parse(iter(tokens))
+            except ParseError as e:
+                print("failure parsing line {} in file {}: {}".format(line_number, fn, str(e)))
+                raise
+            parsed_line.line_number = line_number
+            parsed_line.filename = fn
+            parsed_line.included_from = included_from
+            program.append(parsed_line)
+
+        return program
+
+    def _token_lines(self, s, fn):
+        '''Split the token stream of the whole buffer s into (line_number, tokens) for every line that
+           parse_string_by_line() would parse: empty lines and lines completely inside a multi-line
+           comment are skipped'''
+        line_number = 1
+        line_start = 0 # index into s of the current line, -1 if the line is known to be non-empty
+        tokens = []
+        stream = self.buffer_lexer.lex(s)
+        while True:
+            try:
+                token = next(stream)
+            except StopIteration:
+                break
+            except LexingError as e:
+                print("failure parsing line {} in file {}: {}".format(line_number, fn, str(e)))
+                raise
+
+            token_type = token.gettokentype()
+            if token_type == 'NEWLINE':
+                if line_start < 0 or token.getsourcepos().idx > line_start:
+                    yield line_number, tokens
+                line_number += 1
+                line_start = token.getsourcepos().idx + 1
+                tokens = []
+            elif token_type == 'MULTILINE_COMMENT':
+                comment = token.getstr()
+                newlines = comment.count("\n")
+                if newlines == 0:
+                    continue
+                # the line the comment starts on ends here, and the one it stops on picks up after it
+                yield line_number, tokens
+                if len(comment) < 4 or not comment.endswith("*/"):
+                    return # unterminated
+                line_number += newlines
+                line_start = -1
+                tokens = []
+            else:
+                tokens.append(token)
+
+        if line_start < 0 or len(s) > line_start:
+            yield line_number, tokens
+
+    def parse_string_by_line(self, s, fn="<unknown>", included_from=None):
         lines = s.split("\n")
         program = [] # list of lines
         in_multiline_comment = False
@@ -92,18 +270,63 @@ class Assembler():
     
         return program
 
-    def assemble_string(self, s, fn):
+    def assemble_string(self, s, fn="<unknown>"):
+        self.dependencies = []
+        self.missing_dependencies = []
         try:
-            return self.assemble(self.parse_string(s, fn), fn)
+            if self.build_cache is not None:
+                return self.assemble_cached(s, fn)
+            return self.assemble(self.parse_source(s, fn), fn)
         except:
             # on all errors, print the file name
             print("exception caught while parsing file {}".format(fn))
             raise
 
+    def assemble_cached(self, s, fn):
+        '''assemble_string() through the build cache. A build of the same source with the same options,
+           whose include and incbin files haven't changed, is restored from the cache with its listing,
+           debug info and dependencies instead of being parsed and built again'''
+        # relative include paths are searched from the current directory, so it's part of the key
+        key = self.build_cache.build_key(s, (os.getcwd(), fn, list(self.include_path or []), self.listing_file is not None,
+                                             self.listing_summary, self.collect_debug_info, self.relocatable))
+        build = self.build_cache.get(key)
+        if build is not None:
+            if self.verbose >= Assembler.VERBOSE_BASIC:
+                print("using cached build of {}".format(fn))
+            if self.listing_file is not None:
+                with open(self.listing_file, "w") as lf:
+                    lf.write(build['listing'])
+            self.dependencies = list(build['dependencies'])
+            self.missing_dependencies = list(build['missing_dependencies'])
+            self.debug_info = build['debug_info']
+            self.link_info = build['link_info']
+            return {name: dict(segment, code=[(addr, memoryview(chunk)) for addr, chunk in segment['code']])
+                    for name, segment in build['code_object'].items()}
+
+        code = self.assemble(self.parse_source(s, fn), fn)
+
+        listing = None
+        if self.listing_file is not None:
+            with open(self.listing_file, "r") as lf:
+                listing = lf.read()
+        self.build_cache.put(key, self.dependencies, self.missing_dependencies, {
+            'code_object': {name: dict(segment, code=[(addr, bytes(chunk)) for addr, chunk in segment['code']])
+                            for name, segment in code.items()},
+            'listing': listing,
+            'debug_info': self.debug_info,
+            'link_info': self.link_info,
+            'dependencies': self.dependencies,
+            'missing_dependencies': self.missing_dependencies,
+        })
+        return code
+
     def assemble_file(self, fn):
         with open(fn, "r") as fp:
             buf = fp.read()
-        return self.assemble_string(buf, fn)
+        code = self.assemble_string(buf, fn)
+        if fn not in self.dependencies:
+            self.dependencies.insert(0, fn)
+        return code
 
     def assemble(self, program, fn):
         pb = ProgramBuilder(self, program)
@@ -120,21 +343,45 @@ class Assembler():
         pb.finalize_labels()
 
         # Pass 3: ...
-        lf = None
-        if self.listing_file is not None:
-            lf = open(self.listing_file, "w")
-        code = pb.generate_code_object(lf)
-        if lf is not None:
-            lf.close()
+        if self.listing_file is None:
+            code = pb.generate_code_object(None)
+        else:
+            with open(self.listing_file, "w") as lf:
+                listing = ListingWriter(lf)
+                try:
+                    code = pb.generate_code_object(listing)
+                finally:
+                    listing.close()
+
+        self.debug_info = pb.get_debug_info() if self.collect_debug_info else None
+        self.link_info = pb.get_link_info() if self.relocatable else None
         return code
 
+class AssemblerTables():
+    '''The lexers, parser and opcode tables of an Assembler. Nothing in them changes while assembling, so
+       a long running process like the assembly server builds them once and gives them to the Assembler
+       for each request'''
+
+    def __init__(self, lexer_backend="rply", parser_cache=True, parser_cache_dir=None):
+        self.lexer_backend = lexer_backend
+        self.opcodes = Opcodes.OpcodeDatabase()
+        self.lexer = CreateLexer(backend=lexer_backend)
+        self.buffer_lexer = CreateLexer(whole_buffer=True, backend=lexer_backend)
+        self.parser = CreateParser(cache=parser_cache, cache_dir=parser_cache_dir)
+        self.instruction_table = self.opcodes.build_dispatch_tables(BuildInstructionAction.ADDRESSING_MODE_HANDLERS)
+
 class ProgramBuilder():
     def __init__(self, assembler, program):
         assert all(isinstance(x, ParserAST.Line) for x in program)
         self.assembler = assembler
         self.program = program
         self.current_segment = None
-        self.build_address = None
+        self.build_address = None      # int
+        self.build_address_size = None # stated byte size of build_address, see advance_build_address()
+        self.current_include = None # real path of the include file being processed
+        self.once_includes = set()  # real paths of include files that used .ONCE
+        self.listing_fp = None      # the listing being generated, see generate_code_object()
+        self.listing_enabled = True # turned off and on by .NOLIST and .LIST
 
         self.accumulator_mode = 8
         self.index_mode = 8 
@@ -166,7 +413,10 @@ class ProgramBuilder():
             'GLOBALALL': self._process_scd_globalall,
             'INCLUDE'  : self._process_scd_include,
             'INCBIN'   : self._process_scd_incbin,
+            'LIST'     : self._process_scd_list,
+            'NOLIST'   : self._process_scd_nolist,
             'MACRO'    : self._process_scd_macro,
+            'ONCE'     : self._process_scd_once,
             'ENDMACRO' : self._process_scd_endmacro,
             'ORG'      : self._process_scd_org,
             'SEGMENT'  : self._process_scd_segment,
@@ -193,6 +443,11 @@ class ProgramBuilder():
 
         self._macro_arguments = []
 
+        # labels from other modules in a relocatable assembly, see add_external_references()
+        self._external_names = {}
+        self._relocated_actions = set()
+        self._relocations = []
+
     def add_segment(self, segment):
         uv = segment.name.value.upper()
         if uv in self._segments:
@@ -269,15 +524,22 @@ class ProgramBuilder():
             old = current_segment.get_label(label_str)
             if old is not None:
                 label_declaration = old
-                label_declaration['build_addresses'].append(self.build_address.collapse())
-                label_declaration['build_addresses'].sort(key=lambda v: v.eval())
+                addresses = label_declaration['addresses']
+                if self.build_address >= addresses[-1]:
+                    addresses.append(self.build_address)
+                    label_declaration['address_sizes'].append(self.build_address_size)
+                else:
+                    i = bisect.bisect_right(addresses, self.build_address)
+                    addresses.insert(i, self.build_address)
+                    label_declaration['address_sizes'].insert(i, self.build_address_size)
                 return label_declaration
 
         self.verify_label_available(label_str, line, current_segment)
 
         label_declaration = {
             'segment': current_segment,
-            'build_addresses': [self.build_address.collapse()],
+            'addresses': [self.build_address],          # sorted, more than one for temporary labels
+            'address_sizes': [self.build_address_size], # stated byte size of each address
             'line': line
         }
 
@@ -302,13 +564,33 @@ class ProgramBuilder():
     def make_label_references(self, line, expr, action):
         self.require_current_segment(line).make_label_references(line, expr, action, self.build_address)
 
+    def is_external(self, label_str):
+        '''In a relocatable assembly, a label named in .GLOBAL that this module doesn't declare comes from another module'''
+        return self.assembler.relocatable and label_str in self._global_labels and label_str not in self._label_declarations
+
+    def add_external_references(self, label_str, references):
+        '''Leave the references to label_str to the linker. The names get the address of the code that uses
+           them as a stand-in while the code is generated, so the instruction encodings and range checks
+           work as they will once linked, and the actions record where their bytes need the real address'''
+        names = self._external_names.setdefault(label_str, [])
+        for reference in references:
+            address = reference['build_address']
+            for name in reference['names']:
+                resolve_label_name(name, address, 3 if address > 0xFFFF else 2)
+                names.append(name)
+            self._relocated_actions.add(reference['action'])
+
+    def uses_external(self, expr):
+        search_results = expr.find_referenced_names()
+        return search_results is not None and any(name_str in self._external_names for name_str in search_results)
+
     def replace_equates(self, line, operand, replace_undefined=None):
         search_results = operand.find_referenced_names()
         if search_results is not None:
             for name_str, names in search_results.items():
                 if name_str == '.':
                     for name in names:
-                        name.set_actual_value(self.build_address.collapse())
+                        name.set_actual_value(self.build_address_number())
                 else:
                     equate = self.get_equate(name_str)
                     if equate is None and replace_undefined is not None:
@@ -364,8 +646,20 @@ class ProgramBuilder():
     def pop_macro_arguments(self):
         self._macro_arguments.pop()
 
-    def set_build_address(self, address):
-        self.build_address = address.collapse()
+    def set_build_address(self, address, stated_byte_size):
+        self.build_address = address
+        self.build_address_size = stated_byte_size
+
+    def advance_build_address(self, nbytes):
+        # The address keeps the largest byte size it has been stated or grown to, which is what
+        # adding Numbers would do
+        self.build_address += nbytes
+        size = (self.build_address.bit_length() + 7) >> 3
+        if size > self.build_address_size:
+            self.build_address_size = size
+
+    def build_address_number(self):
+        return ParserAST.Number(self.build_address, 'hex', self.build_address_size)
 
     def build_code_actions(self):
         for line in self.program:
@@ -575,6 +869,31 @@ class ProgramBuilder():
         if self.assembler.verbose >= Assembler.VERBOSE_EVERYTHING:
             print("*** Created INCLUDE: {}".format(str(statement.operands.value[0])))
 
+    def _process_scd_list(self, line, i, statement):
+        if len(statement.operands.value) != 0:
+            raise IncorrectParameterCountError("Line {}: extra parameters to LIST".format(line.line_number))
+        action = ListingOn(line)
+        self.append_action(action)
+        if self.assembler.verbose >= Assembler.VERBOSE_EVERYTHING:
+            print("*** Created ListingOn")
+
+    def _process_scd_nolist(self, line, i, statement):
+        if len(statement.operands.value) != 0:
+            raise IncorrectParameterCountError("Line {}: extra parameters to NOLIST".format(line.line_number))
+        action = ListingOff(line)
+        self.append_action(action)
+        if self.assembler.verbose >= Assembler.VERBOSE_EVERYTHING:
+            print("*** Created ListingOff")
+
+    def _process_scd_once(self, line, i, statement):
+        if len(statement.operands.value) != 0:
+            raise IncorrectParameterCountError("Line {}: extra parameters to ONCE".format(line.line_number))
+        # .ONCE in the top level file has nothing to guard
+        if self.current_include is not None:
+            self.once_includes.add(self.current_include)
+        if self.assembler.verbose >= Assembler.VERBOSE_EVERYTHING:
+            print("*** Processed ONCE")
+
     def _process_scd_macro(self, line, i, statement):
         action = CreateMacroAction(line, statement, self)
         self.append_action(action, skip_top=True)
@@ -714,6 +1033,7 @@ class ProgramBuilder():
     def validate_actions(self):
         self.current_segment = None
         self.build_address = None
+        self.build_address_size = None
         self.index_mode = 8
         self.accumulator_mode = 8
 
@@ -729,12 +1049,13 @@ class ProgramBuilder():
         if required_byte_size > 0:
             current_segment = self.require_current_segment(action.line)
         
-            self.build_address = ParserAST.BinaryOp_Add(self.build_address, ParserAST.Number(required_byte_size, 'dec', ParserAST.Number.required_bytes(required_byte_size))).collapse()
-            if self.build_address.eval() > current_segment.end.eval():
+            self.advance_build_address(required_byte_size)
+            if self.build_address > current_segment.end_address:
                 #raise SegmentOverflowError("Line {}: segment \"{}\" reaches beyond segment limits".format(action.line.line_number, current_segment.name.value))
                 print(SegmentOverflowError("Line {}: segment \"{}\" reaches beyond segment limits".format(action.line.line_number, current_segment.name.value)))
         
             current_segment.last_build_address = self.build_address
+            current_segment.last_build_address_size = self.build_address_size
 
     def finalize_labels(self):
         for segment in self._segments.values():
@@ -744,15 +1065,24 @@ class ProgramBuilder():
     def generate_code_object(self, listing_fp):
         self.current_segment = None
         self.build_address = None
+        self.build_address_size = None
         self.index_mode = 8
         self.accumulator_mode = 8
+        self.listing_fp = listing_fp
+        self.listing_enabled = True
 
         # reset build addresses
         for segment in self._segments.values():
-            segment.last_build_address = segment.start.collapse()
+            segment.reset_build_address()
+            segment.debug_lines = [] if self.assembler.collect_debug_info else None
 
         for action in self.actions:
-            self.generate_action_bytes(action, listing_fp)
+            self.generate_action_bytes(action)
+
+        # the relocations keep the expressions with the external names unresolved
+        for names in self._external_names.values():
+            for name in names:
+                name.actual_value = None
 
         segments_by_start = list(self._segments.values())
         segments_by_start.sort(key=lambda s: s.start.eval())
@@ -760,9 +1090,7 @@ class ProgramBuilder():
         co = {}
         for segment in segments_by_start:
             if listing_fp is not None:
-                listing_segments = segment.get_sorted_listing_segments()
-                for addr, txt in listing_segments:
-                    listing_fp.write(txt)
+                segment.write_listing(listing_fp)
             code_chunks = segment.get_code_chunks(self)
             co[segment.name.value.lower()] = {
                 'code': code_chunks,
@@ -773,17 +1101,76 @@ class ProgramBuilder():
 
         return co
 
-    def generate_action_bytes(self, action, listing_fp):
-        action_bytes = action.generate_bytes(self, listing_fp)
+    def get_debug_info(self):
+        '''The segments in start address order with their labels, as (address, name, kind) for each address
+           a label was declared at, and the (address, size, file name, line number) of the code generated
+           by each line when the assembler collects debug info. For DebugInfo.save_debug_info()'''
+        segments_by_start = list(self._segments.values())
+        segments_by_start.sort(key=lambda s: s.start.eval())
+
+        debug_info = []
+        for segment in segments_by_start:
+            symbols = []
+            for name_str, declaration in segment.get_labels():
+                if name_str[0] == '@':
+                    kind = SYMBOL_TEMPORARY
+                elif self._label_declarations.get(name_str) is declaration:
+                    kind = SYMBOL_GLOBAL
+                else:
+                    kind = SYMBOL_LOCAL
+                symbols.extend((address, name_str, kind) for address in declaration['addresses'])
+            debug_info.append({
+                'name': segment.name.value.lower(),
+                'start': segment.start.eval(),
+                'size': segment.size.eval(),
+                'file_offset': segment.file_offset.eval(),
+                'symbols': symbols,
+                'lines': segment.debug_lines or [],
+            })
+        return debug_info
+
+    def get_link_info(self):
+        '''The global labels declared by this module as (name, segment, address, address size), the labels
+           it uses from other modules, and the relocations that fill in the addresses of those labels,
+           for a relocatable object file. See Linker'''
+        symbols = [(name_str, declaration['segment'].name.value.lower(), declaration['addresses'][0], declaration['address_sizes'][0])
+                   for name_str, declaration in sorted(self._label_declarations.items())]
+        return {
+            'symbols': symbols,
+            'externals': sorted(self._external_names),
+            'relocations': self._relocations,
+        }
+
+    def add_relocations(self, action, segment, size):
+        for offset, width, kind, expression in action.relocations(self, size):
+            self._relocations.append({
+                'segment': segment.name.value.lower(),
+                'address': self.build_address + offset,
+                'width': width,
+                'kind': kind,
+                'build_address': self.build_address,
+                'filename': action.line.filename or "",
+                'line_number': action.line.line_number,
+                'expression': expression,
+            })
+
+    def generate_action_bytes(self, action):
+        # .NOLIST and .LIST can appear anywhere, including inside macros and conditional blocks
+        action_bytes = action.generate_bytes(self, self.listing_fp if self.listing_enabled else None)
         if len(action_bytes) > 0:
             current_segment = self.require_current_segment(action.line)
-            current_segment.set_bytes(self.build_address, action_bytes)
+            if action in self._relocated_actions:
+                self.add_relocations(action, current_segment, len(action_bytes))
+            current_segment.set_bytes(action.line, self.build_address, action_bytes)
+            if current_segment.debug_lines is not None:
+                current_segment.debug_lines.append((self.build_address, len(action_bytes), action.line.filename or "", action.line.line_number))
 
-            self.build_address = ParserAST.BinaryOp_Add(self.build_address, ParserAST.Number(len(action_bytes), 'dec', ParserAST.Number.required_bytes(len(action_bytes)))).collapse()
-            if self.build_address.eval() > self.require_current_segment(action.line).end.eval():
-                raise SegmentOverflowError("Line {}: segment \"{}\" reaches beyond segment limits".format(action.line.line_number, self.segment.name.value))
+            self.advance_build_address(len(action_bytes))
+            if self.build_address > current_segment.end_address:
+                raise SegmentOverflowError("Line {}: segment \"{}\" reaches beyond segment limits".format(action.line.line_number, current_segment.name.value))
 
-            current_segment.last_build_address = self.build_address.collapse()
+            current_segment.last_build_address = self.build_address
+            current_segment.last_build_address_size = self.build_address_size
 
 class Segment():
     def __init__(self, name, start, size, file_offset, line):
@@ -791,11 +1178,12 @@ class Segment():
         self.start = start
         self.size = size
         self.end = ParserAST.BinaryOp_Add(start, size).collapse()
+        self.end_address = self.end.eval()
         self.file_offset = file_offset
         self.line = line
-        self.last_build_address = start.collapse()
+        self.reset_build_address()
         self.listing_buffer = None
-        self.listing_buffer_build_address = None
+        self.debug_lines = None # (address, size, file name, line number) of the code, see ProgramBuilder.get_debug_info()
         self.global_all = False
         
         self._label_declarations = {
@@ -804,14 +1192,27 @@ class Segment():
         self._label_references = {
         }
 
-        self._bytes = {
-        }
+        # the code is written into a bytearray image of the segment, grown as needed, and
+        # the ranges written so far are kept as sorted lists of [start, end) offsets
+        self.start_address = self.start.eval()
+        self._image = bytearray()
+        self._written_starts = []
+        self._written_ends = []
 
-        self._listing_buffers = []
+        # where the segment's listing text is in the listing's spill file, see ListingWriter
+        self._listing_records = []
+
+    def reset_build_address(self):
+        start = self.start.collapse()
+        self.last_build_address = start.eval()
+        self.last_build_address_size = start.stated_byte_size
 
     def get_label(self, label_str):
         return self._label_declarations.get(label_str, None)
 
+    def get_labels(self):
+        return self._label_declarations.items()
+
     def declare_label(self, label_str, label_declaration):
         assert label_str not in self._label_declarations
         self._label_declarations[label_str] = label_declaration
@@ -823,7 +1224,7 @@ class Segment():
                 referenced_names = [rn for rn in referenced_names if rn.actual_value is None]
                 if name_str.upper() not in Assembler.BUILT_IN_LABELS and len(referenced_names) > 0:
                     lrs = self._label_references.get(name_str, [])
-                    lrs.append({'name_str': name_str, 'names': referenced_names, 'action': action, 'line': line, 'build_address': build_address.collapse()})
+                    lrs.append({'name_str': name_str, 'names': referenced_names, 'action': action, 'line': line, 'build_address': build_address})
                     self._label_references[name_str] = lrs
 
     def finalize_labels(self, program_builder):
@@ -840,107 +1241,133 @@ class Segment():
                     name_str = name_str[:-1]
                 
             declaration = program_builder.get_label(name_str)
+            if declaration is None and program_builder.is_external(name_str):
+                program_builder.add_external_references(name_str, references)
+                continue
             if declaration is None:
                 raise UndefinedLabelError("Line {} file {}: name \"{}\" used but not defined".format(references[0]['action'].line.line_number, references[0]['action'].line.filename, name_str))
 
+            addresses = declaration['addresses']
+            last = len(addresses) - 1
             for reference in references:
-                for name in reference['names']:
-                    addr = reference['build_address'].eval()
-                    j = 0
-
-                    while j < (len(declaration['build_addresses']) - 1) and addr > declaration['build_addresses'][j].eval():
+                # the first declaration at or after the reference, or the last one
+                addr = reference['build_address']
+                j = min(bisect.bisect_left(addresses, addr), last)
+
+                if addr < addresses[j] and j > 0:
+                    if ldir < 0:
+                        j = j - 1
+                    elif ldir == 0:
+                        raise Exception("Line {}: ambiguous reference to '{}'".format(reference['line'].line_number, name_str))
+                elif addr == addresses[j] and j < last:
+                    if ldir > 0:
                         j = j + 1
+                    elif ldir == 0:
+                        raise Exception("Line {}: ambiguous reference to '{}'".format(reference['line'].line_number, name_str))
 
-                    if addr < declaration['build_addresses'][j].eval() and j > 0:
-                        if ldir < 0:
-                            v = declaration['build_addresses'][j-1]
-                        elif ldir > 0:
-                            v = declaration['build_addresses'][j]
-                        else:
-                            raise Exception("Line {}: ambiguous reference to '{}'".format(reference['line'].line_number, name_str))
-                    elif addr == declaration['build_addresses'][j].eval() and j < len(declaration['build_addresses']) - 1:
-                        if ldir < 0:
-                            v = declaration['build_addresses'][j]
-                        elif ldir > 0:
-                            v = declaration['build_addresses'][j+1]
-                        else:
-                            raise Exception("Line {}: ambiguous reference to '{}'".format(reference['line'].line_number, name_str))
-                    else:
-                        v = declaration['build_addresses'][j]
-
-                    if name.as_long:
-                        name.set_actual_value(v.collapse())
-                    else:
-                        name.set_actual_value(ParserAST.BinaryOp_And(v.collapse(), ParserAST.Number(0xFFFF, 'hex', 2)).collapse())
-
-    def set_bytes(self, addr, inst):
-        addr = addr.eval()
-        assert addr not in self._bytes
-        self._bytes[addr] = inst
-
-    def get_code_chunks(self, program_builder):
-        addrs = list(self._bytes.keys())
-        addrs.sort()
-
-        code_chunks = []
-
-        offstart = self.start.eval()
-        offs = self.start.eval()
-        new_b = []
-        for addr in addrs:
-            if offs < addr:
-                if len(new_b):
-                    code_chunks.append((offstart, bytes(new_b)))
-                offstart = addr
-                offs = offstart
-                new_b = []
-            b = self._bytes[addr]
-            new_b = new_b + list(b)
-            offs += len(b)
-        if len(new_b):
-            code_chunks.append((offstart, bytes(new_b)))
-        return code_chunks
-
-    def start_new_listing_segment(self, build_address):
-        if self.listing_buffer is not None:
-            self._listing_buffers.append((self.listing_buffer_build_address.collapse(), self.listing_buffer.getvalue()))
-        self.listing_buffer = io.StringIO()
-        self.listing_buffer_build_address = build_address.collapse()
-        
-        def format_with_address_and_bytes(address, byte_values, inst="", comment=None):
-            byte_string = " ".join(["{:02X}".format(i) for i in byte_values])
-                                                     # spc       bytes      spc  addr colon bank
-            spacing = Assembler.LISTING_SOURCE_COLUMN - 1 - len(byte_string) - 1 - 4 - 1 - 2
-
-            output = "{:02X}:{:04X} {}{}{}".format(address >> 16, address & 0xFFFF, byte_string, " " * spacing, inst)
-            if comment is not None:
-                left_over = max(0, Assembler.LISTING_COMMENT_COLUMN - len(output))
-                self.listing_buffer.write("{}{}{}\n".format(output, " " * left_over, comment))
+                for name in reference['names']:
+                    resolve_label_name(name, addresses[j], declaration['address_sizes'][j])
+
+    def set_bytes(self, line, addr, inst):
+        start = addr - self.start_address
+        if start < 0:
+            raise SegmentOverflowError("Line {}: segment \"{}\" written below its start address".format(line.line_number, self.name.value))
+        end = start + len(inst)
+
+        starts = self._written_starts
+        ends = self._written_ends
+        if len(ends) and ends[-1] == start:
+            # code is almost always written in order
+            ends[-1] = end
+        else:
+            i = bisect.bisect_right(starts, start)
+            if (i > 0 and ends[i-1] > start) or (i < len(starts) and starts[i] < end):
+                raise CodeOverlapError("Line {}: code at 0x{:06X} overlaps code already in segment \"{}\"".format(line.line_number, addr, self.name.value))
+            if i > 0 and ends[i-1] == start:
+                i -= 1
+                ends[i] = end
             else:
-                self.listing_buffer.write("{}\n".format(output))
-
-        def format_right_comment(comment):
-            spacing = Assembler.LISTING_COMMENT_COLUMN
-            self.listing_buffer.write("{}{}\n".format(" " * spacing, comment))
+                starts.insert(i, start)
+                ends.insert(i, end)
+            if i + 1 < len(starts) and starts[i+1] == end:
+                ends[i] = ends.pop(i+1)
+                del starts[i+1]
+
+        image = self._image
+        if start >= len(image):
+            if start > len(image):
+                image.extend(bytes(start - len(image)))
+            image.extend(inst)
+        else:
+            if end > len(image):
+                image.extend(bytes(end - len(image)))
+            image[start:end] = inst
 
-        def format_single_line_left(comment):
-                   # bank spc addr spc
-            spacing = 2 + 1 + 4 + 1
-            self.listing_buffer.write("{}{}\n".format(" " * spacing, comment))
+    def get_code_chunks(self, program_builder):
+        # the chunks are read-only views into the segment image, not copies
+        image = memoryview(self._image).toreadonly()
+        return [(self.start_address + start, image[start:end]) for start, end in zip(self._written_starts, self._written_ends)]
 
-        self.listing_buffer.format_with_address_and_bytes = format_with_address_and_bytes
-        self.listing_buffer.format_right_comment = format_right_comment
-        self.listing_buffer.format_single_line_left = format_single_line_left
+    def start_new_listing_segment(self, build_address, listing_fp):
+        if self.listing_buffer is not None:
+            self.listing_buffer.flush()
+        self.listing_buffer = listing_fp.new_buffer(self._listing_records, build_address)
 
-    def get_sorted_listing_segments(self):
+    def write_listing(self, listing_fp):
         if self.listing_buffer is not None:
-            self._listing_buffers.append((self.listing_buffer_build_address.collapse(), self.listing_buffer.getvalue()))
+            self.listing_buffer.flush()
             self.listing_buffer = None
-            self.listing_buffer_build_address = None
-        self._listing_buffers.sort(key=lambda v: v[0].eval())
-        return self._listing_buffers
+        listing_fp.write_records(self._listing_records)
+        self._listing_records = []
+
+def resolve_label_name(name, address, address_size):
+    '''Give a reference to a label the label's address. Only long references (label.l) keep the bank byte'''
+    v = ParserAST.Number(address, 'hex', address_size)
+    if name.as_long:
+        name.set_actual_value(v)
+    else:
+        name.set_actual_value(ParserAST.BinaryOp_And(v, ParserAST.Number(0xFFFF, 'hex', 2)).collapse())
+
+def relative_branch_offset(target, build_address, is_long, line_number):
+    '''The operand of a branch at build_address to target, as a Number'''
+    if is_long:
+        distance = target - (build_address + 3)
+        if distance < -32768 or distance > 32767:
+            raise RelativeBranchOutOfRangeError("Line {}: relative long branch out of range ({})".format(line_number, distance))
+        return ParserAST.Number(distance & 0xFFFF, 'hex', 2)
+    else:
+        distance = target - ((build_address & 0xFFFF) + 2)
+        if distance < -128 or distance > 127:
+            raise RelativeBranchOutOfRangeError("Line {}: relative branch out of range ({})".format(line_number, distance))
+        return ParserAST.Number(distance & 0xFF, 'hex', 1)
+
+def instantiate_value(v, memo):
+    instantiate = getattr(v, 'instantiate', None)
+    if instantiate is not None:
+        return instantiate(memo)
+    if isinstance(v, list):
+        new = memo.get(id(v))
+        if new is None:
+            new = memo[id(v)] = [instantiate_value(x, memo) for x in v]
+        return new
+    # Lines, strings, numbers and references to the program builder are shared
+    return v
 
 class BuilderAction():
+    def instantiate(self, memo=None):
+        '''Return a new copy of this action for one use of the macro, compiler IF or VALOOP block that
+           captured it. Captured actions are never validated themselves and act as templates: each copy
+           gets its own expression trees, which validation fills in with macro arguments, equates and
+           labels, and shares everything else with the template.'''
+        if memo is None:
+            memo = {}
+        new = memo.get(id(self))
+        if new is None:
+            new = memo[id(self)] = self.__class__.__new__(self.__class__)
+            for k, v in self.__dict__.items():
+                new.__dict__[k] = instantiate_value(v, memo)
+        return new
+
     def validate(self, program_builder):
         return self._validate(program_builder)
 
@@ -953,6 +1380,11 @@ class BuilderAction():
     def _generate_bytes(self, program_builder, listing_fp):
         raise NotImplementedError("_generate_bytes override not implemented in class {}".format(self.__class__))
 
+    def relocations(self, program_builder, size):
+        '''For relocatable objects, the (offset, width, kind, expression) of each part of the size bytes
+           generated by the action that uses labels from other modules'''
+        raise UndefinedLabelError("Line {}: labels from other modules can't be used here".format(self.line.line_number))
+
 class CreateSegmentAction(BuilderAction):
     def __init__(self, line, name, start, size, file_offset):
         self.line = line
@@ -985,16 +1417,16 @@ class SegmentChangeAction(BuilderAction):
         if segment is None:
             raise UnknownCompilerDirectiveError("Line {}: unknown segment name or compiler directive '{}'".format(self.line.line_number, self.segment_name.upper()))
         program_builder.set_current_segment(segment)
-        program_builder.set_build_address(segment.last_build_address)
+        program_builder.set_build_address(segment.last_build_address, segment.last_build_address_size)
         return 0
 
     def _generate_bytes(self, program_builder, listing_fp):
         segment = program_builder.get_segment(self.segment_name)
         program_builder.set_current_segment(segment)
-        program_builder.set_build_address(segment.last_build_address)
+        program_builder.set_build_address(segment.last_build_address, segment.last_build_address_size)
         if listing_fp is not None:
-            segment.start_new_listing_segment(program_builder.build_address.collapse())
-            segment.listing_buffer.write("\n        ;; segment \"{}\", org = 0x{:04X}\n        ;;\n".format(segment.name.value, segment.last_build_address.eval()))
+            segment.start_new_listing_segment(program_builder.build_address, listing_fp)
+            segment.listing_buffer.write("\n        ;; segment \"{}\", org = 0x{:04X}\n        ;;\n".format(segment.name.value, segment.last_build_address))
             segment.listing_buffer.write("        ;; Accumulator/Memory = {}-bit, Index registers = {}-bit\n        ;;\n".format(program_builder.accumulator_mode, program_builder.index_mode))
         return bytes()
 
@@ -1028,7 +1460,7 @@ class SetSegmentOrg(BuilderAction):
         try:
             v = self.operand.collapse()
             # we got a value
-            program_builder.set_build_address(v)
+            program_builder.set_build_address(v.eval(), v.stated_byte_size)
         except:
             raise InvalidParameterError("Line {}: cannot evaluate argument to ORG".format(self.line.line_number))
 
@@ -1038,9 +1470,9 @@ class SetSegmentOrg(BuilderAction):
         v = self.operand.collapse()
         if program_builder.assembler.verbose >= Assembler.VERBOSE_EVERYTHING:
             print("--- {}: Setting build address to 0x{:04X}".format(program_builder.require_current_segment(self.line).name.value, v.eval()))
-        program_builder.set_build_address(v)
+        program_builder.set_build_address(v.eval(), v.stated_byte_size)
         if listing_fp is not None:
-            program_builder.current_segment.start_new_listing_segment(program_builder.build_address.collapse())
+            program_builder.current_segment.start_new_listing_segment(program_builder.build_address, listing_fp)
             #listing_fp.write("\t\t;; set org = 0x{:04X}\n\t\t;;\n".format(v.eval()))
             lb = program_builder.current_segment.listing_buffer
             lb.format_single_line_left(";; set org = 0x{:04X}".format(v.eval()))
@@ -1059,7 +1491,7 @@ class LabelDeclarationAction(BuilderAction):
             raise Exception("Line {}: invalid label".format(self.line.line_number))
         new = program_builder.declare_label_here(self.label.value, self.line)
         if program_builder.assembler.verbose >= Assembler.VERBOSE_BUILD:
-            print("=== {}: declared label {} @ 0x{:04X}".format(current_segment.name.value, self.label.value, new['build_addresses'][-1].eval()))
+            print("=== {}: declared label {} @ 0x{:04X}".format(current_segment.name.value, self.label.value, new['addresses'][-1]))
         return 0
 
     def _generate_bytes(self, program_builder, listing_fp):
@@ -1075,11 +1507,9 @@ class BuildInstructionAction(BuilderAction):
         self.statement = statement
 
     def _validate(self, program_builder):
-        opcodes = program_builder.assembler.opcodes
-
-        # determine if opcode is valid -- get set of possible addressing modes
-        addressing_modes = opcodes.get_addressing_modes(self.statement.name.value)
-        if addressing_modes is None:
+        # determine if opcode is valid -- get the possible addressing modes
+        instruction_table = program_builder.assembler.instruction_table.get(self.statement.name.value.upper(), None)
+        if instruction_table is None:
             raise UnknownOpcodeError("Line {}: unknown opcode '{}'".format(self.line.line_number, self.statement.name.value))
 
         # Replace all the macro arguments
@@ -1092,63 +1522,30 @@ class BuildInstructionAction(BuilderAction):
         # and create all references to labels
         program_builder.make_label_references(self.line, self.statement.operands, self)
 
-        addressing_mode_checks = [
-            (Opcodes.OpcodeDatabase.AddressingMode.IMPLIED                          , lambda f: self._validate_implied(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.ACCUMULATOR                      , lambda f: self._validate_implied(program_builder, f, allow_accumulator=True)),
-            (Opcodes.OpcodeDatabase.AddressingMode.BRKCOP                           , lambda f: self._validate_brkcop(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.STACK                            , lambda f: self._validate_stack(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.IMMEDIATE                        , lambda f: self._validate_immediate(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.BLOCK_MOVE                       , lambda f: self._validate_block_move(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.RELATIVE                         , lambda f: self._validate_relative(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.RELATIVE_LONG                    , lambda f: self._validate_relative_long(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.STACK_RELATIVE                   , lambda f: self._validate_stack_relative(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.STACK_RELATIVE_INDIRECT_INDEXED_Y, lambda f: self._validate_stack_relative_indirect_indexed_y(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.DIRECT                           , lambda f: self._validate_direct(program_builder, f)),    # DIRECT needs to be tested before ABSOLUT),
-            (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT                  , lambda f: self._validate_direct_indirect(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT_LONG             , lambda f: self._validate_direct_indirect(program_builder, f, True)),
-            (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDEXED_X                 , lambda f: self._validate_direct_indexed(program_builder, f, index_value="X")),
-            (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDEXED_Y                 , lambda f: self._validate_direct_indexed(program_builder, f, index_value="Y")),
-            (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDEXED_X_INDIRECT        , lambda f: self._validate_direct_indexed_x_indirect(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT_INDEXED_Y        , lambda f: self._validate_direct_indirect_indexed_y(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT_LONG_INDEXED_Y   , lambda f: self._validate_direct_indirect_indexed_y(program_builder, f, True)),
-            (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE                         , lambda f: self._validate_absolute(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_X               , lambda f: self._validate_absolute_indexed(program_builder, f, index_value="X")),
-            (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_Y               , lambda f: self._validate_absolute_indexed(program_builder, f, index_value="Y")),
-            (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_X_INDIRECT      , lambda f: self._validate_absolute_indexed_x_indirect(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_Y               , lambda f: self._validate_absolute_indexed_y(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_LONG                    , lambda f: self._validate_absolute_long(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_LONG_INDEXED_X          , lambda f: self._validate_absolute_long_indexed_x(program_builder, f)),  # like DIRECT first, I think _LONG_ needs to be checked las),
-            (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDIRECT                , lambda f: self._validate_absolute_indirect(program_builder, f)),
-            (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDIRECT_LONG           , lambda f: self._validate_absolute_indirect(program_builder, f, want_long=True)),
-        ]
-
         # determine which addressing mode is used and ensure 
         # all parameters to be valid for that given mode
         self.addressing_mode = None
         self.instruction_flags = None
-        for a, c in addressing_mode_checks:
-            if a in addressing_modes:
-                flags = program_builder.assembler.opcodes.get_instruction_flags(self.statement.name.value, a)
-                if c(flags):
-                    self.addressing_mode = a
-                    self.instruction_flags = flags
-                    break
+        for addressing_mode, checker, encoder, flags, size, opcode in instruction_table:
+            if checker(self, program_builder, flags):
+                self.addressing_mode = addressing_mode
+                self.instruction_flags = flags
+                self.encoder = encoder
+                self.opcode = opcode
+                instruction_size = size
+                break
         else:
             raise UnknownAddressingModeError("Line {}: could not determine addressing mode for '{}' (operands = {})".format(self.line.line_number, self.statement.name.value, self.statement.operands))
 
-        # determine byte size for said opcode
-        instruction_size = opcodes.get_instruction_size(self.statement.name.value, self.addressing_mode)
-
         # Special case the immediates
         if self.addressing_mode == Opcodes.OpcodeDatabase.AddressingMode.IMMEDIATE:
-            flags = opcodes.get_instruction_flags(self.statement.name.value, self.addressing_mode)
             if (flags & Opcodes.OpcodeDatabase.IF_EXTRA_ACCUMULATOR_IMMEDIATE) != 0 and program_builder.accumulator_mode == 16:
                 instruction_size += 1
             elif (flags & Opcodes.OpcodeDatabase.IF_EXTRA_INDEX_IMMEDIATE) != 0 and program_builder.index_mode == 16:
                 instruction_size += 1
 
         # some instructions need their own address
-        self.build_address = program_builder.build_address.collapse()
+        self.build_address = program_builder.build_address
 
         if program_builder.assembler.verbose >= Assembler.VERBOSE_BUILD:
             print("=== {}: Created instruction for {} ({}): {} byte(s)".format(program_builder.require_current_segment(self.line).name.value, self.statement.name.value, self.addressing_mode, instruction_size))
@@ -1471,25 +1868,6 @@ class BuildInstructionAction(BuilderAction):
 
         return False
 
-    def _validate_absolute_indexed_y(self, program_builder, flags):
-        if len(self.statement.operands.value) != 2:
-            return False
-        absolute = self.statement.operands.value[0]
-        index = self.statement.operands.value[1]
-
-        if isinstance(absolute, ParserAST.ExpressionList):
-            return False
-        if not isinstance(index, ParserAST.Name):
-            return False
-        if index.value.upper() != "Y":
-            return False
-
-        opsize = absolute.guess_size()
-        if 0 <= opsize <= 2:
-            return True
-
-        return False
-
     def _validate_absolute_indirect(self, program_builder, flags, want_long=False):
         if len(self.statement.operands.value) != 1:
             return False
@@ -1508,98 +1886,77 @@ class BuildInstructionAction(BuilderAction):
         return False
 
     def _calculate_relative(self, operands, is_long):
-        if is_long:
-            distance = operands.eval() - (self.build_address.eval() + 3)
-            if distance < -32768 or distance > 32767:
-                raise RelativeBranchOutOfRangeError("Line {}: relative long branch out of range ({})".format(self.line.line_number, distance))
-            hex_distance = distance & 0xFFFF
-            return ParserAST.Number(hex_distance, 'hex', 2)
-        else:
-            distance = operands.eval() - ((self.build_address.eval() & 0xFFFF) + 2)
-            if distance < -128 or distance > 127:
-                raise RelativeBranchOutOfRangeError("Line {}: relative branch out of range ({})".format(self.line.line_number, distance))
-            hex_distance = distance & 0xFF
-            return ParserAST.Number(hex_distance, 'hex', 1)
+        return relative_branch_offset(operands.eval(), self.build_address, is_long, self.line.line_number)
+
+    def relocations(self, program_builder, size):
+        mode_name, _, _, _ = self.encoder
+        operands = self.statement.operands.value
+        if mode_name == "relative":
+            kind = RELOCATION_RELATIVE if size == 2 else RELOCATION_RELATIVE_LONG
+            return [(1, size - 1, kind, operands[0])]
+        if mode_name == "block-move":
+            # the destination bank is encoded first
+            return [(1 + i, 1, RELOCATION_ABSOLUTE, operand.value) for i, operand in enumerate(reversed(operands))
+                    if program_builder.uses_external(operand.value)]
+
+        operand = operands[0]
+        if isinstance(operand, ParserAST.Immediate):
+            operand = operand.value
+        elif isinstance(operand, ParserAST.ExpressionList):
+            operand = operand.value[0]
+        return [(1, size - 1, RELOCATION_ABSOLUTE, operand)]
 
     def _generate_bytes(self, program_builder, listing_fp):
-        opcodes = program_builder.assembler.opcodes
-        ret = [opcodes.get_instruction_opcode(self.statement.name.value, self.addressing_mode)]
-
-        size_table = {
-            Opcodes.OpcodeDatabase.AddressingMode.BRKCOP                           : ("brkcop", 0, lambda operands: ParserAST.Number(0, 'dec', 1)),
-            Opcodes.OpcodeDatabase.AddressingMode.IMPLIED                          : ("implied", 0, lambda operands: None),
-            Opcodes.OpcodeDatabase.AddressingMode.ACCUMULATOR                      : ("accumulator", 0, lambda operands: None),
-            Opcodes.OpcodeDatabase.AddressingMode.STACK                            : ("stack", 0, lambda operands: None),
-            Opcodes.OpcodeDatabase.AddressingMode.STACK_RELATIVE                   : ("stack-relative", 1, lambda operands: operands.value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.STACK_RELATIVE_INDIRECT_INDEXED_Y: ("stack-relative-indirect-indexed-y", 1, lambda operands: operands.value[0].value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.RELATIVE                         : ("relative", 1, lambda operands: self._calculate_relative(operands.value[0], False)),
-            Opcodes.OpcodeDatabase.AddressingMode.RELATIVE_LONG                    : ("relative", 2, lambda operands: self._calculate_relative(operands.value[0], True)),
-            Opcodes.OpcodeDatabase.AddressingMode.IMMEDIATE                        : ("immediate", -1, lambda operands: operands.value[0].value.collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.BLOCK_MOVE                       : ("block-move", 1, lambda operands: (operands.value[0].value.collapse(), operands.value[1].value.collapse())),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT                           : ("direct", 1, lambda operands: operands.value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDEXED_X                 : ("direct-indexed-x", 1, lambda operands: operands.value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDEXED_Y                 : ("direct-indexed-y", 1, lambda operands: operands.value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDEXED_X_INDIRECT        : ("direct-indexed-x-indirect", 1, lambda operands: operands.value[0].value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT_INDEXED_Y        : ("direct-indirect-indexed-y", 1, lambda operands: operands.value[0].value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT                  : ("direct-indirect", 1, lambda operands: operands.value[0].value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT_LONG             : ("direct-indirect-long", 1, lambda operands: operands.value[0].value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT_LONG_INDEXED_Y   : ("direct-indirect-long-indexed-y", 1, lambda operands: operands.value[0].value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE                         : ("absolute", 2, lambda operands: operands.value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_X               : ("absolute-indexed-x", 2, lambda operands: operands.value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_Y               : ("absolute-indexed-y", 2, lambda operands: operands.value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_X_INDIRECT      : ("absolute-indexed-x-indirect", 2, lambda operands: operands.value[0].value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDIRECT                : ("absolute-indirect", 2, lambda operands: operands.value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDIRECT_LONG           : ("absolute-indirect-long", 2, lambda operands: operands.value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_LONG                    : ("absolute-long", 3, lambda operands: operands.value[0].collapse()),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_LONG_INDEXED_X          : ("absolute-long-indexed-x", 3, lambda operands: operands.value[0].collapse()),
-        }
+        ret = [self.opcode]
+
+        mode_name, operand_size, get_operand, format_operands = self.encoder
 
-        if size_table[self.addressing_mode][1] == 0:
-            v = size_table[self.addressing_mode][2](self.statement.operands)
+        if operand_size == 0:
+            v = get_operand(self, self.statement.operands)
             if v is not None:
                 ret.append(v.eval() & 0xFF)
-        elif size_table[self.addressing_mode][0] == "immediate":
-            v = size_table[self.addressing_mode][2](self.statement.operands)
+        elif operand_size < 0:
+            v = get_operand(self, self.statement.operands)
 
-            flags = program_builder.assembler.opcodes.get_instruction_flags(self.statement.name.value, self.addressing_mode)
+            flags = self.instruction_flags
             if (flags & Opcodes.OpcodeDatabase.IF_EXTRA_ACCUMULATOR_IMMEDIATE) != 0 and program_builder.accumulator_mode == 16:
                 if v.stated_byte_size > 2:
-                    raise ParameterTooLargeError("Line {}: argument too large for {}-long-accumulator mode".format(self.line.line_number, size_table[self.addressing_mode][0]))
+                    raise ParameterTooLargeError("Line {}: argument too large for {}-long-accumulator mode".format(self.line.line_number, mode_name))
                 v = v.eval()
                 ret.append(v & 0xFF)
                 ret.append((v >> 8) & 0xFF)
             elif (flags & Opcodes.OpcodeDatabase.IF_EXTRA_INDEX_IMMEDIATE) != 0 and program_builder.index_mode == 16:
                 if v.stated_byte_size > 2:
-                    raise ParameterTooLargeError("Line {}: argument too large for {}-long-index mode".format(self.line.line_number, size_table[self.addressing_mode][0]))
+                    raise ParameterTooLargeError("Line {}: argument too large for {}-long-index mode".format(self.line.line_number, mode_name))
                 v = v.eval()
                 ret.append(v & 0xFF)
                 ret.append((v >> 8) & 0xFF)
             else:
                 if v.stated_byte_size != 1:
-                    raise ParameterTooLargeError("Line {}: argument too large for {} mode".format(self.line.line_number, size_table[self.addressing_mode][0]))
+                    raise ParameterTooLargeError("Line {}: argument too large for {} mode".format(self.line.line_number, mode_name))
                 ret.append(v.eval() & 0xFF)
-        elif size_table[self.addressing_mode][1] == 1:
-            v = size_table[self.addressing_mode][2](self.statement.operands)
+        elif operand_size == 1:
+            v = get_operand(self, self.statement.operands)
             if isinstance(v, tuple):
                 if v[0].stated_byte_size != 1 or v[1].stated_byte_size != 1:
-                    raise ParameterTooLargeError("Line {}: argument too large for {} mode".format(self.line.line_number, size_table[self.addressing_mode][0]))
+                    raise ParameterTooLargeError("Line {}: argument too large for {} mode".format(self.line.line_number, mode_name))
                 ret.append(v[1].eval() & 0xFF)
                 ret.append(v[0].eval() & 0xFF)
             else:
                 if v.stated_byte_size != 1:
-                    raise ParameterTooLargeError("Line {}: argument too large for {} mode".format(self.line.line_number, size_table[self.addressing_mode][0]))
+                    raise ParameterTooLargeError("Line {}: argument too large for {} mode".format(self.line.line_number, mode_name))
                 ret.append(v.eval() & 0xFF)
-        elif size_table[self.addressing_mode][1] == 2:
-            v = size_table[self.addressing_mode][2](self.statement.operands)
+        elif operand_size == 2:
+            v = get_operand(self, self.statement.operands)
             if v.stated_byte_size > 2:
-                raise ParameterTooLargeError("Line {}: argument too large for {} mode".format(self.line.line_number, size_table[self.addressing_mode][0]))
+                raise ParameterTooLargeError("Line {}: argument too large for {} mode".format(self.line.line_number, mode_name))
             v = v.eval()
             ret.append(v & 0xFF)
             ret.append((v >> 8) & 0xFF)
-        elif size_table[self.addressing_mode][1] == 3:
-            v = size_table[self.addressing_mode][2](self.statement.operands)
+        elif operand_size == 3:
+            v = get_operand(self, self.statement.operands)
             if v.stated_byte_size > 3:
-                raise ParameterTooLargeError("Line {}: argument too large for {} mode".format(self.line.line_number, size_table[self.addressing_mode][0]))
+                raise ParameterTooLargeError("Line {}: argument too large for {} mode".format(self.line.line_number, mode_name))
             v = v.eval()
             ret.append(v & 0xFF)
             ret.append((v >> 8) & 0xFF)
@@ -1610,41 +1967,95 @@ class BuildInstructionAction(BuilderAction):
         if listing_fp is not None:
             #bs = " ".join(["{:02X}".format(r) for r in ret])
             #spacing = Assembler.LISTING_SOURCE_COLUMN - 1 - len(bs) - 1 - 4 - 1 - 2
-            #program_builder.current_segment.listing_buffer.write("{} {}{}{} {}\n".format(self.build_address.as_segment_address(), bs, " " * spacing, self.statement.name.value.upper(), self._format_operands(ret[1:])))
+            #program_builder.current_segment.listing_buffer.write("{} {}{}{} {}\n".format(self.build_address.as_segment_address(), bs, " " * spacing, self.statement.name.value.upper(), format_operands(self, ret[1:])))
             lb = program_builder.current_segment.listing_buffer
-            lb.format_with_address_and_bytes(self.build_address.eval(), ret, "{} {}".format(self.statement.name.value.upper(), self._format_operands(ret[1:])))
+            lb.format_with_address_and_bytes(self.build_address, ret, "{} {}".format(self.statement.name.value.upper(), format_operands(self, ret[1:])))
  
         return bytes(ret)
 
-    def _format_operands(self, values):
-        return {
-            Opcodes.OpcodeDatabase.AddressingMode.BRKCOP                           : lambda v: "0x{:02X}".format(v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.IMPLIED                          : lambda v: "",
-            Opcodes.OpcodeDatabase.AddressingMode.ACCUMULATOR                      : lambda v: "A",
-            Opcodes.OpcodeDatabase.AddressingMode.STACK                            : lambda v: "",
-            Opcodes.OpcodeDatabase.AddressingMode.STACK_RELATIVE                   : lambda v: "0x{:02X}, S".format(v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.STACK_RELATIVE_INDIRECT_INDEXED_Y: lambda v: "(0x{:02X}, S), Y".format(v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.RELATIVE                         : lambda v: "0x{:04X}".format(int.from_bytes(v, 'little', signed=True) + (self.build_address.eval() & 0xFFFF) + 2),
-            Opcodes.OpcodeDatabase.AddressingMode.RELATIVE_LONG                    : lambda v: "0x{:04X}".format(int.from_bytes(v, 'little', signed=True) + (self.build_address.eval() & 0xFFFF) + 2),
-            Opcodes.OpcodeDatabase.AddressingMode.IMMEDIATE                        : lambda v: "#0x{:02X}".format(v[0]) if len(v) == 1 else "#0x{:02X}{:02X}".format(v[1], v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.BLOCK_MOVE                       : lambda v: "0x{:02X}, 0x{:02X}".format(v[1], v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT                           : lambda v: "0x{:02X}".format(v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDEXED_X                 : lambda v: "0x{:02X}, X".format(v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDEXED_Y                 : lambda v: "0x{:02X}, Y".format(v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDEXED_X_INDIRECT        : lambda v: "(0x{:02X}, X)".format(v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT_INDEXED_Y        : lambda v: "(0x{:02X}), Y".format(v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT                  : lambda v: "(0x{:02X})".format(v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT_LONG             : lambda v: "[0x{:02X}]".format(v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT_LONG_INDEXED_Y   : lambda v: "[0x{:02X}], Y".format(v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE                         : lambda v: "0x{:02X}{:02X}".format(v[1], v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_X               : lambda v: "0x{:02X}{:02X}, X".format(v[1], v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_Y               : lambda v: "0x{:02X}{:02X}, Y".format(v[1], v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_X_INDIRECT      : lambda v: "(0x{:02X}{:02X}, X)".format(v[1], v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDIRECT                : lambda v: "(0x{:02X}{:02X})".format(v[1], v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDIRECT_LONG           : lambda v: "[0x{:02X}{:02X}]".format(v[1], v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_LONG                    : lambda v: "0x{:02X}:{:02X}{:02X}".format(v[2], v[1], v[0]),
-            Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_LONG_INDEXED_X          : lambda v: "0x{:02X}:{:02X}{:02X}, X".format(v[2], v[1], v[0]),
-        }[self.addressing_mode](values)
+# The addressing modes in the order they are tried when validating an instruction (DIRECT before ABSOLUTE,
+# the _LONG_ modes after their 16-bit versions), with the function that checks whether the operands fit the
+# mode and how the mode encodes: (name, operand bytes or -1 for immediates, operand getter, listing formatter)
+BuildInstructionAction.ADDRESSING_MODE_HANDLERS = (
+    (Opcodes.OpcodeDatabase.AddressingMode.IMPLIED,
+        BuildInstructionAction._validate_implied,
+        ("implied", 0, lambda self, operands: None, lambda self, v: "")),
+    (Opcodes.OpcodeDatabase.AddressingMode.ACCUMULATOR,
+        lambda self, program_builder, flags: self._validate_implied(program_builder, flags, allow_accumulator=True),
+        ("accumulator", 0, lambda self, operands: None, lambda self, v: "A")),
+    (Opcodes.OpcodeDatabase.AddressingMode.BRKCOP,
+        BuildInstructionAction._validate_brkcop,
+        ("brkcop", 0, lambda self, operands: ParserAST.Number(0, 'dec', 1), lambda self, v: "0x{:02X}".format(v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.STACK,
+        BuildInstructionAction._validate_stack,
+        ("stack", 0, lambda self, operands: None, lambda self, v: "")),
+    (Opcodes.OpcodeDatabase.AddressingMode.IMMEDIATE,
+        BuildInstructionAction._validate_immediate,
+        ("immediate", -1, lambda self, operands: operands.value[0].value.collapse(), lambda self, v: "#0x{:02X}".format(v[0]) if len(v) == 1 else "#0x{:02X}{:02X}".format(v[1], v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.BLOCK_MOVE,
+        BuildInstructionAction._validate_block_move,
+        ("block-move", 1, lambda self, operands: (operands.value[0].value.collapse(), operands.value[1].value.collapse()), lambda self, v: "0x{:02X}, 0x{:02X}".format(v[1], v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.RELATIVE,
+        BuildInstructionAction._validate_relative,
+        ("relative", 1, lambda self, operands: self._calculate_relative(operands.value[0], False), lambda self, v: "0x{:04X}".format(int.from_bytes(v, 'little', signed=True) + (self.build_address & 0xFFFF) + 2))),
+    (Opcodes.OpcodeDatabase.AddressingMode.RELATIVE_LONG,
+        BuildInstructionAction._validate_relative_long,
+        ("relative", 2, lambda self, operands: self._calculate_relative(operands.value[0], True), lambda self, v: "0x{:04X}".format(int.from_bytes(v, 'little', signed=True) + (self.build_address & 0xFFFF) + 2))),
+    (Opcodes.OpcodeDatabase.AddressingMode.STACK_RELATIVE,
+        BuildInstructionAction._validate_stack_relative,
+        ("stack-relative", 1, lambda self, operands: operands.value[0].collapse(), lambda self, v: "0x{:02X}, S".format(v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.STACK_RELATIVE_INDIRECT_INDEXED_Y,
+        BuildInstructionAction._validate_stack_relative_indirect_indexed_y,
+        ("stack-relative-indirect-indexed-y", 1, lambda self, operands: operands.value[0].value[0].collapse(), lambda self, v: "(0x{:02X}, S), Y".format(v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.DIRECT,
+        BuildInstructionAction._validate_direct,
+        ("direct", 1, lambda self, operands: operands.value[0].collapse(), lambda self, v: "0x{:02X}".format(v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT,
+        BuildInstructionAction._validate_direct_indirect,
+        ("direct-indirect", 1, lambda self, operands: operands.value[0].value[0].collapse(), lambda self, v: "(0x{:02X})".format(v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT_LONG,
+        lambda self, program_builder, flags: self._validate_direct_indirect(program_builder, flags, True),
+        ("direct-indirect-long", 1, lambda self, operands: operands.value[0].value[0].collapse(), lambda self, v: "[0x{:02X}]".format(v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDEXED_X,
+        lambda self, program_builder, flags: self._validate_direct_indexed(program_builder, flags, index_value="X"),
+        ("direct-indexed-x", 1, lambda self, operands: operands.value[0].collapse(), lambda self, v: "0x{:02X}, X".format(v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDEXED_Y,
+        lambda self, program_builder, flags: self._validate_direct_indexed(program_builder, flags, index_value="Y"),
+        ("direct-indexed-y", 1, lambda self, operands: operands.value[0].collapse(), lambda self, v: "0x{:02X}, Y".format(v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDEXED_X_INDIRECT,
+        BuildInstructionAction._validate_direct_indexed_x_indirect,
+        ("direct-indexed-x-indirect", 1, lambda self, operands: operands.value[0].value[0].collapse(), lambda self, v: "(0x{:02X}, X)".format(v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT_INDEXED_Y,
+        BuildInstructionAction._validate_direct_indirect_indexed_y,
+        ("direct-indirect-indexed-y", 1, lambda self, operands: operands.value[0].value[0].collapse(), lambda self, v: "(0x{:02X}), Y".format(v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.DIRECT_INDIRECT_LONG_INDEXED_Y,
+        lambda self, program_builder, flags: self._validate_direct_indirect_indexed_y(program_builder, flags, True),
+        ("direct-indirect-long-indexed-y", 1, lambda self, operands: operands.value[0].value[0].collapse(), lambda self, v: "[0x{:02X}], Y".format(v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE,
+        BuildInstructionAction._validate_absolute,
+        ("absolute", 2, lambda self, operands: operands.value[0].collapse(), lambda self, v: "0x{:02X}{:02X}".format(v[1], v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_X,
+        lambda self, program_builder, flags: self._validate_absolute_indexed(program_builder, flags, index_value="X"),
+        ("absolute-indexed-x", 2, lambda self, operands: operands.value[0].collapse(), lambda self, v: "0x{:02X}{:02X}, X".format(v[1], v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_Y,
+        lambda self, program_builder, flags: self._validate_absolute_indexed(program_builder, flags, index_value="Y"),
+        ("absolute-indexed-y", 2, lambda self, operands: operands.value[0].collapse(), lambda self, v: "0x{:02X}{:02X}, Y".format(v[1], v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDEXED_X_INDIRECT,
+        BuildInstructionAction._validate_absolute_indexed_x_indirect,
+        ("absolute-indexed-x-indirect", 2, lambda self, operands: operands.value[0].value[0].collapse(), lambda self, v: "(0x{:02X}{:02X}, X)".format(v[1], v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_LONG,
+        BuildInstructionAction._validate_absolute_long,
+        ("absolute-long", 3, lambda self, operands: operands.value[0].collapse(), lambda self, v: "0x{:02X}:{:02X}{:02X}".format(v[2], v[1], v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_LONG_INDEXED_X,
+        BuildInstructionAction._validate_absolute_long_indexed_x,
+        ("absolute-long-indexed-x", 3, lambda self, operands: operands.value[0].collapse(), lambda self, v: "0x{:02X}:{:02X}{:02X}, X".format(v[2], v[1], v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDIRECT,
+        BuildInstructionAction._validate_absolute_indirect,
+        ("absolute-indirect", 2, lambda self, operands: operands.value[0].collapse(), lambda self, v: "(0x{:02X}{:02X})".format(v[1], v[0]))),
+    (Opcodes.OpcodeDatabase.AddressingMode.ABSOLUTE_INDIRECT_LONG,
+        lambda self, program_builder, flags: self._validate_absolute_indirect(program_builder, flags, want_long=True),
+        ("absolute-indirect-long", 2, lambda self, operands: operands.value[0].collapse(), lambda self, v: "[0x{:02X}{:02X}]".format(v[1], v[0]))),
+)
 
 class InsertBytes(BuilderAction):
     def __init__(self, line, operands):
@@ -1667,7 +2078,13 @@ class InsertBytes(BuilderAction):
     def _generate_bytes(self, program_builder, listing_fp):
         ret = []
 
-        ba = program_builder.build_address.eval()
+        # in summary mode a DB of more than one line is listed after all the bytes are known
+        summary_fp = None
+        if listing_fp is not None and program_builder.assembler.listing_summary:
+            if sum(len(operand.value) if isinstance(operand, ParserAST.QuotedString) else 1 for operand in self.operands.value) > 4:
+                summary_fp, listing_fp = listing_fp, None
+
+        ba = program_builder.build_address
         for operand in self.operands.value:
             if isinstance(operand, ParserAST.QuotedString):
                 sbytes = list(operand.value.encode("ascii"))
@@ -1698,8 +2115,23 @@ class InsertBytes(BuilderAction):
                     lb.format_with_address_and_bytes(ba, [v], ".DB 0x{:02X}".format(v & 0xFF))
                     ba += 1
 
+        if summary_fp is not None:
+            program_builder.current_segment.listing_buffer.format_summary(ba, ret[:4], bytes(ret), ".DB")
+
         return bytes(ret)
 
+    def relocations(self, program_builder, size):
+        relocations = []
+        offset = 0
+        for operand in self.operands.value:
+            if isinstance(operand, ParserAST.QuotedString):
+                offset += len(operand.value)
+            else:
+                if program_builder.uses_external(operand):
+                    relocations.append((offset, 1, RELOCATION_ABSOLUTE, operand))
+                offset += 1
+        return relocations
+
 
 class InsertWords(BuilderAction):
     def __init__(self, line, operands):
@@ -1722,7 +2154,7 @@ class InsertWords(BuilderAction):
     def _generate_bytes(self, program_builder, listing_fp):
         ret = []
 
-        ba = program_builder.build_address.eval()
+        ba = program_builder.build_address
         for operand in self.operands.value:
             v = operand.collapse()
             if v.stated_byte_size > 2:
@@ -1738,6 +2170,10 @@ class InsertWords(BuilderAction):
                 
         return bytes(ret)
 
+    def relocations(self, program_builder, size):
+        return [(i * 2, 2, RELOCATION_ABSOLUTE, operand) for i, operand in enumerate(self.operands.value)
+                if program_builder.uses_external(operand)]
+
 class InsertLongs(BuilderAction):
     def __init__(self, line, operands):
         self.line = line
@@ -1759,7 +2195,7 @@ class InsertLongs(BuilderAction):
     def _generate_bytes(self, program_builder, listing_fp):
         ret = []
 
-        ba = program_builder.build_address.eval()
+        ba = program_builder.build_address
         for operand in self.operands.value:
             v = operand.collapse()
             if v.stated_byte_size > 3:
@@ -1776,6 +2212,10 @@ class InsertLongs(BuilderAction):
                 
         return bytes(ret)
 
+    def relocations(self, program_builder, size):
+        return [(i * 3, 3, RELOCATION_ABSOLUTE, operand) for i, operand in enumerate(self.operands.value)
+                if program_builder.uses_external(operand)]
+
 
 class FillBytes(BuilderAction):
     def __init__(self, line, operands):
@@ -1813,19 +2253,25 @@ class FillBytes(BuilderAction):
         except:
             raise InvalidParameterError("Line {}: error parsing FILL arguments".format(self.line.line_number))
 
+        data = bytes([fill_byte.eval()]) * count.eval()
+
         if listing_fp is not None:
-            ba = program_builder.build_address.eval()
+            ba = program_builder.build_address
             lb = program_builder.current_segment.listing_buffer
-            for x in range(0, count.eval(), 4):
-                c = min(4, count.eval() - x)
-                b = [fill_byte.eval()] * c
-                if x == 0:
-                    lb.format_with_address_and_bytes(ba, b, ".FILL 0x{:04X}, 0x{:02X}".format(count.eval(), fill_byte.eval()))
-                else:
-                    lb.format_with_address_and_bytes(ba, b)
-                ba += len(b)
+            inst = ".FILL 0x{:04X}, 0x{:02X}".format(count.eval(), fill_byte.eval())
+            if program_builder.assembler.listing_summary and len(data) > 4:
+                lb.format_summary(ba, data[:4], data, inst)
+            else:
+                for x in range(0, count.eval(), 4):
+                    c = min(4, count.eval() - x)
+                    b = [fill_byte.eval()] * c
+                    if x == 0:
+                        lb.format_with_address_and_bytes(ba, b, inst)
+                    else:
+                        lb.format_with_address_and_bytes(ba, b)
+                    ba += len(b)
 
-        return bytes([fill_byte.eval()] * count.eval())
+        return data
 
 class FillWords(BuilderAction):
     def __init__(self, line, operands):
@@ -1863,18 +2309,24 @@ class FillWords(BuilderAction):
             raise InvalidParameterError("Line {}: error parsing FILLW arguments".format(self.line.line_number))
         v = fill_word.eval()
 
+        data = bytes([(v & 0xFF), ((v >> 8) & 0x0FF)]) * count.eval()
+
         if listing_fp is not None:
-            ba = program_builder.build_address.eval()
+            ba = program_builder.build_address
             lb = program_builder.current_segment.listing_buffer
-            for x in range(0, count.eval(), 3):
-                b = [fill_word.eval()] * 3
-                if x == 0:
-                    lb.format_with_address_and_bytes(ba, b, ".FILLW 0x{:04X}, 0x{:04X}".format(count.eval(), fill_word.eval()))
-                else:
-                    lb.format_with_address_and_bytes(ba, b)
-                ba += len(b)
+            inst = ".FILLW 0x{:04X}, 0x{:04X}".format(count.eval(), fill_word.eval())
+            if program_builder.assembler.listing_summary and count.eval() > 3:
+                lb.format_summary(ba, [fill_word.eval()] * 3, data, inst)
+            else:
+                for x in range(0, count.eval(), 3):
+                    b = [fill_word.eval()] * 3
+                    if x == 0:
+                        lb.format_with_address_and_bytes(ba, b, inst)
+                    else:
+                        lb.format_with_address_and_bytes(ba, b)
+                    ba += len(b)
 
-        return bytes([(v & 0xFF), ((v >> 8) & 0x0FF)] * count.eval())
+        return data
 
 class SetAccumulator8(BuilderAction):
     def __init__(self, line):
@@ -1963,14 +2415,45 @@ class SetGlobalAll(BuilderAction):
         return bytes()
 
 
+class ListingOff(BuilderAction):
+    def __init__(self, line):
+        self.line = line
+
+    def _validate(self, program_builder):
+        return 0
+
+    def _generate_bytes(self, program_builder, listing_fp):
+        program_builder.listing_enabled = False
+        return bytes()
+
+class ListingOn(BuilderAction):
+    def __init__(self, line):
+        self.line = line
+
+    def _validate(self, program_builder):
+        return 0
+
+    def _generate_bytes(self, program_builder, listing_fp):
+        if not program_builder.listing_enabled:
+            program_builder.listing_enabled = True
+            # the segment's listing picks up again here, and nothing was listed since the last ORG
+            if program_builder.listing_fp is not None and program_builder.current_segment is not None:
+                program_builder.current_segment.start_new_listing_segment(program_builder.build_address, program_builder.listing_fp)
+        return bytes()
+
 class IncBinAction(BuilderAction):
     def __init__(self, line, filename):
         self.line = line
         self.filename = filename
 
     def _validate(self, program_builder):
-        with open(self.filename.value, "rb") as fp:
-            self.data = fp.read()
+        try:
+            with open(self.filename.value, "rb") as fp:
+                self.data = fp.read()
+        except OSError:
+            program_builder.assembler.add_missing_dependencies([self.filename.value])
+            raise
+        program_builder.assembler.add_dependency(self.filename.value)
 
         if program_builder.assembler.verbose >= Assembler.VERBOSE_BUILD:
             print("=== {}: INCBIN \"{}\" is {} bytes".format(program_builder.require_current_segment(self.line).name.value,
@@ -1979,15 +2462,19 @@ class IncBinAction(BuilderAction):
 
     def _generate_bytes(self, program_builder, listing_fp):
         if listing_fp is not None:
-            ba = program_builder.build_address.eval()
+            ba = program_builder.build_address
             lb = program_builder.current_segment.listing_buffer
-            for x in range(0, len(self.data), 4):
-                b = self.data[x:x+4]
-                if x == 0:
-                    lb.format_with_address_and_bytes(ba, b, ".INCBIN \"{}\"".format(self.filename))
-                else:
-                    lb.format_with_address_and_bytes(ba, b)
-                ba += len(b)
+            inst = ".INCBIN \"{}\"".format(self.filename)
+            if program_builder.assembler.listing_summary and len(self.data) > 4:
+                lb.format_summary(ba, self.data[:4], self.data, inst)
+            else:
+                for x in range(0, len(self.data), 4):
+                    b = self.data[x:x+4]
+                    if x == 0:
+                        lb.format_with_address_and_bytes(ba, b, inst)
+                    else:
+                        lb.format_with_address_and_bytes(ba, b)
+                    ba += len(b)
         return self.data
 
 class IncludeAction(BuilderAction):
@@ -1996,27 +2483,26 @@ class IncludeAction(BuilderAction):
         self.line = line
         self.filename = filename
 
-        try:
-            with open(filename.value, "r") as fp:
-                content = fp.read()
-        except OSError:
-            for path in program_builder.assembler.include_path:
-                if not os.path.isabs(filename.value):
-                    newfname = os.path.sep.join([path, filename.value])
-                    try:
-                        with open(newfname, "r") as fp:
-                            content = fp.read()
-                            break
-                    except OSError:
-                        continue
-            else:
-                raise FileNotFoundError("Could not locate file '{}'".format(filename.value))
+        assembler = program_builder.assembler
+        path = assembler.find_include(filename.value)
+        self.path = os.path.realpath(path)
+        if self.path in program_builder.once_includes:
+            if assembler.verbose >= assembler.VERBOSE_BASIC:
+                print("skipping {}, already included".format(filename.value))
+            self.program = []
+            return
 
-        if program_builder.assembler.verbose >= program_builder.assembler.VERBOSE_BASIC:
+        if assembler.verbose >= assembler.VERBOSE_BASIC:
             print("including {}".format(filename.value))
-        self.program = program_builder.assembler.parse_string(content, fn=filename.value, included_from=line)
-        for line in self.program:
-            program_builder.process_line(line)
+        self.program = assembler.parse_include_file(path, filename.value, line)
+
+        outer_include = program_builder.current_include
+        program_builder.current_include = self.path
+        try:
+            for line in self.program:
+                program_builder.process_line(line)
+        finally:
+            program_builder.current_include = outer_include
 
     def _validate(self, program_builder):
         return 0
@@ -2044,10 +2530,10 @@ class IfAction(BuilderAction):
         return 2 # Flow control is always a relative branch TODO: relative branches that are too far could use long branches, but we won't know how long the branch is until we parse the code..
 
     def set_else(self, program_builder):
-        self.else_location = program_builder.build_address.collapse()
+        self.else_location = program_builder.build_address
 
     def set_endif(self, program_builder):
-        self.endif_location = program_builder.build_address.collapse()
+        self.endif_location = program_builder.build_address
 
     def _generate_bytes(self, program_builder, listing_fp):
         # Swap the conditions because IF branches if the condition is not set
@@ -2065,13 +2551,13 @@ class IfAction(BuilderAction):
 
         if self.else_location is not None:
             # extra two bytes for the BRA that ends this IF segment
-            distance = (self.else_location.eval() + 2) - (program_builder.build_address.eval() + 2)
+            distance = (self.else_location + 2) - (program_builder.build_address + 2)
             if distance < -128 or distance > 127:
                 raise RelativeBranchOutOfRangeError("Line {}: IF/ELSE section too large".format(self.line.line_number))
             hex_distance = distance & 0xFF
             ret = bytes([opcode, hex_distance])
         else:
-            distance = self.endif_location.eval() - (program_builder.build_address.eval() + 2)
+            distance = self.endif_location - (program_builder.build_address + 2)
             if distance < -128 or distance > 127:
                 raise RelativeBranchOutOfRangeError("Line {}: IF/ENDIF section too large".format(self.line.line_number))
             hex_distance = distance & 0xFF
@@ -2079,8 +2565,8 @@ class IfAction(BuilderAction):
 
         if listing_fp is not None:
             lb = program_builder.current_segment.listing_buffer
-            dist_str = "{} 0x{:04X}".format(inst, int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (program_builder.build_address.eval() & 0xFFFF) + 2)
-            lb.format_with_address_and_bytes(program_builder.build_address.eval(), ret, dist_str, comment=";; IF {}".format(self.condition))
+            dist_str = "{} 0x{:04X}".format(inst, int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (program_builder.build_address & 0xFFFF) + 2)
+            lb.format_with_address_and_bytes(program_builder.build_address, ret, dist_str, comment=";; IF {}".format(self.condition))
 
         return ret
 
@@ -2106,11 +2592,11 @@ class ElseAction(BuilderAction):
         return 2
 
     def set_endif(self, program_builder):
-        self.endif_location = program_builder.build_address.collapse()
+        self.endif_location = program_builder.build_address
 
     def _generate_bytes(self, program_builder, listing_fp):
         opcode = program_builder.assembler.opcodes.get_instruction_opcode("BRA", Opcodes.OpcodeDatabase.AddressingMode.RELATIVE)
-        distance = self.endif_location.eval() - (program_builder.build_address.eval() + 2)
+        distance = self.endif_location - (program_builder.build_address + 2)
         if distance < -128 or distance > 127:
             raise RelativeBranchOutOfRangeError("Line {}: ELSE-ENDIF section too large".format(self.line.line_number))
         hex_distance = distance & 0xFF
@@ -2118,8 +2604,8 @@ class ElseAction(BuilderAction):
 
         if listing_fp is not None:
             lb = program_builder.current_segment.listing_buffer
-            dist_str = "BRA 0x{:04X}".format(int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (program_builder.build_address.eval() & 0xFFFF) + 2)
-            lb.format_with_address_and_bytes(program_builder.build_address.eval(), ret, dist_str, comment=";; ELSE !{}".format(self.condition))
+            dist_str = "BRA 0x{:04X}".format(int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (program_builder.build_address & 0xFFFF) + 2)
+            lb.format_with_address_and_bytes(program_builder.build_address, ret, dist_str, comment=";; ELSE !{}".format(self.condition))
 
         return ret
 
@@ -2157,7 +2643,7 @@ class DoAction(BuilderAction):
         self.line = line
 
     def _validate(self, program_builder):
-        self.do_location = program_builder.build_address.collapse()
+        self.do_location = program_builder.build_address
         program_builder.require_current_segment(self.line)
         program_builder.push_flow_control(self)
         return 0
@@ -2201,7 +2687,7 @@ class UntilAction(BuilderAction):
         }[self.condition]
         opcode = program_builder.assembler.opcodes.get_instruction_opcode(inst, Opcodes.OpcodeDatabase.AddressingMode.RELATIVE)
 
-        distance = self.do_action.do_location.eval() - (program_builder.build_address.eval() + 2)
+        distance = self.do_action.do_location - (program_builder.build_address + 2)
         if distance < -128 or distance > 127:
             raise RelativeBranchOutOfRangeError("Line {}: DO/UNTIL section too large".format(self.line.line_number))
         hex_distance = distance & 0xFF
@@ -2209,8 +2695,8 @@ class UntilAction(BuilderAction):
 
         if listing_fp is not None:
             lb = program_builder.current_segment.listing_buffer
-            dist_str = "{} 0x{:04X}".format(inst, int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (program_builder.build_address.eval() & 0xFFFF) + 2)
-            lb.format_with_address_and_bytes(program_builder.build_address.eval(), ret, dist_str, comment=";; UNTIL {}".format(self.condition))
+            dist_str = "{} 0x{:04X}".format(inst, int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (program_builder.build_address & 0xFFFF) + 2)
+            lb.format_with_address_and_bytes(program_builder.build_address, ret, dist_str, comment=";; UNTIL {}".format(self.condition))
         return ret
 
 class ForeverAction(BuilderAction):
@@ -2228,7 +2714,7 @@ class ForeverAction(BuilderAction):
         if not isinstance(self.do_action, DoAction):
             raise UnmatchedEndIfError("Line {}: FOREVER with no matching DO statement".format(line.line_number))
 
-        distance = self.do_action.do_location.eval() - (program_builder.build_address.eval() + 2)
+        distance = self.do_action.do_location - (program_builder.build_address + 2)
         if distance < -32768 or distance > 32767:
             raise RelativeBranchOutOfRangeError("Line {}: DO/FOREVER section too large".format(self.line.line_number))
         if distance < -127 or distance > 127:
@@ -2238,10 +2724,10 @@ class ForeverAction(BuilderAction):
     def _generate_bytes(self, program_builder, listing_fp):
         # Because this 'UNTIL' is until the condition IS met, we invert all these conditions
 
-        distance = self.do_action.do_location.eval() - (program_builder.build_address.eval() + 2)
+        distance = self.do_action.do_location - (program_builder.build_address + 2)
         if distance < -128 or distance > 127:
             # recompute distance because the instruction will be 3 bytes, not 2.
-            distance = self.do_action.do_location.eval() - (program_builder.build_address.eval() + 3)
+            distance = self.do_action.do_location - (program_builder.build_address + 3)
             inst = "BRL"
             opcode = program_builder.assembler.opcodes.get_instruction_opcode(inst, Opcodes.OpcodeDatabase.AddressingMode.RELATIVE_LONG)
             hex_distance = distance & 0xFFFF
@@ -2255,10 +2741,10 @@ class ForeverAction(BuilderAction):
         if listing_fp is not None:
             lb = program_builder.current_segment.listing_buffer
             if inst == "BRL":
-                dist_str = "{} 0x{:04X}".format(inst, int.from_bytes(hex_distance.to_bytes(2, 'little', signed=False), 'little', signed=True) + (program_builder.build_address.eval() & 0xFFFF) + 3)
+                dist_str = "{} 0x{:04X}".format(inst, int.from_bytes(hex_distance.to_bytes(2, 'little', signed=False), 'little', signed=True) + (program_builder.build_address & 0xFFFF) + 3)
             else:
-                dist_str = "{} 0x{:02X}".format(inst, int.from_bytes(hex_distance.to_bytes(1, 'little', signed=False), 'little', signed=True) + (program_builder.build_address.eval() & 0xFF) + 2)
-            lb.format_with_address_and_bytes(program_builder.build_address.eval(), ret, dist_str, comment=";; FOREVER")
+                dist_str = "{} 0x{:02X}".format(inst, int.from_bytes(hex_distance.to_bytes(1, 'little', signed=False), 'little', signed=True) + (program_builder.build_address & 0xFF) + 2)
+            lb.format_with_address_and_bytes(program_builder.build_address, ret, dist_str, comment=";; FOREVER")
         return ret
 
 
@@ -2275,13 +2761,13 @@ class WhileAction(BuilderAction):
         self.condition = operands.value[0].value.upper()
 
     def _validate(self, program_builder):
-        self.while_address = program_builder.build_address.collapse()
+        self.while_address = program_builder.build_address
         program_builder.require_current_segment(self.line)
         program_builder.push_flow_control(self)
         return 2 # at the beginning of the loop we check the flag
 
     def set_end_while(self, program_builder):
-        self.endwhile_address = program_builder.build_address.collapse()
+        self.endwhile_address = program_builder.build_address
 
     def _generate_bytes(self, program_builder, listing_fp):
         # Because this 'UNTIL' is until the condition IS met, we invert all these conditions
@@ -2297,7 +2783,7 @@ class WhileAction(BuilderAction):
         }[self.condition]
         opcode = program_builder.assembler.opcodes.get_instruction_opcode(inst, Opcodes.OpcodeDatabase.AddressingMode.RELATIVE)
 
-        distance = (self.endwhile_address.eval() + 2) - (program_builder.build_address.eval() + 2)
+        distance = (self.endwhile_address + 2) - (program_builder.build_address + 2)
         if distance < -128 or distance > 127:
             raise RelativeBranchOutOfRangeError("Line {}: DO/UNTIL section too large".format(self.line.line_number))
         hex_distance = distance & 0xFF
@@ -2305,8 +2791,8 @@ class WhileAction(BuilderAction):
 
         if listing_fp is not None:
             lb = program_builder.current_segment.listing_buffer
-            dist_str = "{} 0x{:04X}".format(inst, int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (program_builder.build_address.eval() & 0xFFFF) + 2)
-            lb.format_with_address_and_bytes(program_builder.build_address.eval(), ret, dist_str, ";; WHILE {}".format(self.condition))
+            dist_str = "{} 0x{:04X}".format(inst, int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (program_builder.build_address & 0xFFFF) + 2)
+            lb.format_with_address_and_bytes(program_builder.build_address, ret, dist_str, ";; WHILE {}".format(self.condition))
  
         return ret
 
@@ -2337,7 +2823,7 @@ class EndWhileAction(BuilderAction):
             'Z_SET':   "BEQ",
         }[self.while_action.condition]
         opcode = program_builder.assembler.opcodes.get_instruction_opcode(inst, Opcodes.OpcodeDatabase.AddressingMode.RELATIVE)
-        distance = (self.while_action.while_address.eval() + 2) - (program_builder.build_address.eval() + 2)
+        distance = (self.while_action.while_address + 2) - (program_builder.build_address + 2)
         if distance < -128 or distance > 127:
             raise RelativeBranchOutOfRangeError("Line {}: WHILE/ENDWHILE section too large".format(self.line.line_number))
 
@@ -2347,8 +2833,8 @@ class EndWhileAction(BuilderAction):
 
         if listing_fp is not None:
             lb = program_builder.current_segment.listing_buffer
-            dist_str = "{} 0x{:04X}".format(inst, int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (program_builder.build_address.eval() & 0xFFFF) + 2)
-            lb.format_with_address_and_bytes(program_builder.build_address.eval(), ret, dist_str, ";; ENDWHILE {}".format(self.while_action.condition))
+            dist_str = "{} 0x{:04X}".format(inst, int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (program_builder.build_address & 0xFFFF) + 2)
+            lb.format_with_address_and_bytes(program_builder.build_address, ret, dist_str, ";; ENDWHILE {}".format(self.while_action.condition))
         return ret
 
 class SwitchAction(BuilderAction):
@@ -2369,7 +2855,7 @@ class SwitchAction(BuilderAction):
         return 0
 
     def set_end_switch(self, program_builder):
-        self.endswitch_address = program_builder.build_address.collapse()
+        self.endswitch_address = program_builder.build_address
 
     def _generate_bytes(self, program_builder, listing_fp):
         # SWITCH doesn't generate any code
@@ -2395,8 +2881,7 @@ class CaseAction(BuilderAction):
         self.prepend_bra = False
         if switch_action is not None and isinstance(switch_action, CaseAction):
             self.prepend_bra = True
-            build_address = ParserAST.BinaryOp_Add(program_builder.build_address, ParserAST.Number(2, 'hex', 1)).collapse()
-            switch_action.set_next_case(build_address)
+            switch_action.set_next_case(program_builder.build_address + 2)
             switch_action = switch_action.switch_action
 
         if switch_action is None or not isinstance(switch_action, SwitchAction):
@@ -2438,16 +2923,16 @@ class CaseAction(BuilderAction):
         raise Exception()
 
     def set_next_case(self, build_address):
-        self.next_case_address = build_address.collapse()
+        self.next_case_address = build_address
 
     def _generate_bytes(self, program_builder, listing_fp):
         ret = []
         v = self.immediate.value.collapse()
 
-        build_address = program_builder.build_address.collapse()
+        build_address = program_builder.build_address
         if self.prepend_bra:
             opcode = program_builder.assembler.opcodes.get_instruction_opcode("BRA", Opcodes.OpcodeDatabase.AddressingMode.RELATIVE)
-            distance = self.switch_action.endswitch_address.eval() - (program_builder.build_address.eval() + 2)
+            distance = self.switch_action.endswitch_address - (program_builder.build_address + 2)
             if distance < -128 or distance > 127:
                 raise RelativeBranchOutOfRangeError("Line {}: CASE/ENDSWITCH distance too large".format(self.line.line_number))
             hex_distance = distance & 0xFF
@@ -2456,10 +2941,10 @@ class CaseAction(BuilderAction):
 
             if listing_fp is not None:
                 lb = program_builder.current_segment.listing_buffer
-                dist_str = "BRA 0x{:04X}".format(int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (build_address.eval() & 0xFFFF) + 2)
-                lb.format_with_address_and_bytes(build_address.eval(), ret, dist_str, comment=";; ENDCASE")
+                dist_str = "BRA 0x{:04X}".format(int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (build_address & 0xFFFF) + 2)
+                lb.format_with_address_and_bytes(build_address, ret, dist_str, comment=";; ENDCASE")
             
-            build_address = ParserAST.BinaryOp_Add(build_address, ParserAST.Number(len(addtl), 'hex', 1)).collapse()
+            build_address += len(addtl)
 
         if self.switch_action.condition == "A":
             inst = "CMP"
@@ -2499,20 +2984,20 @@ class CaseAction(BuilderAction):
                 dist_str = "{} #0x{:02X}".format(inst, v & 0xFF)
                 case_str = ";; CASE #0x{:02X}".format(v & 0xFF)
             lb = program_builder.current_segment.listing_buffer
-            lb.format_with_address_and_bytes(build_address.eval(), addtl, dist_str, comment=case_str)
-            build_address = ParserAST.BinaryOp_Add(build_address, ParserAST.Number(len(addtl), 'hex', 1)).collapse()
+            lb.format_with_address_and_bytes(build_address, addtl, dist_str, comment=case_str)
+            build_address += len(addtl)
 
         opcode = program_builder.assembler.opcodes.get_instruction_opcode("BNE", Opcodes.OpcodeDatabase.AddressingMode.RELATIVE)
-        distance = self.next_case_address.eval() - (build_address.eval() + 2)
+        distance = self.next_case_address - (build_address + 2)
         if distance < -128 or distance > 127:
             raise RelativeBranchOutOfRangeError("Line {}: CASE/ENDSWITCH distance too large".format(self.line.line_number))
         hex_distance = distance & 0xFF
         ret = ret + [opcode, hex_distance]
 
         if listing_fp is not None:
-            dist_str = "{} 0x{:04X}".format("BNE", int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (build_address.eval() & 0xFFFF) + 2)
+            dist_str = "{} 0x{:04X}".format("BNE", int.from_bytes(bytes([hex_distance]), 'little', signed=True) + (build_address & 0xFFFF) + 2)
             lb = program_builder.current_segment.listing_buffer
-            lb.format_with_address_and_bytes(build_address.eval(), [opcode, hex_distance], dist_str)
+            lb.format_with_address_and_bytes(build_address, [opcode, hex_distance], dist_str)
 
         return ret
 
@@ -2566,11 +3051,11 @@ class CreateMacroAction(BuilderAction):
         self.actions.append(action)
 
     def call(self):
-        return [copy.deepcopy(a) for a in self.actions]
+        return [a.instantiate() for a in self.actions]
 
     def set_valoop(self, i, v):
         self.valoop_index = ParserAST.Number(i, 'dec', ParserAST.Number.required_bytes(i))
-        self.valoop_value = copy.deepcopy(v)
+        self.valoop_value = v.instantiate({})
 
     def clear_valoop(self):
         self.valoop_index = None
@@ -2616,7 +3101,7 @@ class CreateMacroAction(BuilderAction):
                 for name in names:
                     if program_builder.assembler.verbose >= Assembler.VERBOSE_EVERYTHING:
                         print("=== {}: line {}: replacing {} with {}".format(program_builder.require_current_segment(self.line).name.value, line.line_number, name_str, str(argument)))
-                    name.set_actual_value(copy.deepcopy(argument))
+                    name.set_actual_value(argument.instantiate({}))
 
     def _validate(self, program_builder):
         return 0
@@ -2659,7 +3144,7 @@ class CallMacroAction(BuilderAction):
 
     def _generate_bytes(self, program_builder, listing_fp):
         for action in self.actions:
-            program_builder.generate_action_bytes(action, listing_fp)
+            program_builder.generate_action_bytes(action)
         return bytes()
 
 class CompilerIfAction(BuilderAction):
@@ -2693,7 +3178,7 @@ class CompilerIfAction(BuilderAction):
         try:
             self.result = self.expression.eval()
             if self.result != 0:
-                self.actions = [copy.deepcopy(a) for a in self.if_block]
+                self.actions = [a.instantiate() for a in self.if_block]
                 for action in self.actions:
                     program_builder.validate_one_action(action)
             elif self.else_action is not None:
@@ -2705,7 +3190,7 @@ class CompilerIfAction(BuilderAction):
 
     def _generate_bytes(self, program_builder, listing_fp):
         for action in self.actions:
-            program_builder.generate_action_bytes(action, listing_fp)
+            program_builder.generate_action_bytes(action)
         if self.else_action is not None:
             return self.else_action.generate_bytes(program_builder, listing_fp)
         return bytes()
@@ -2746,7 +3231,7 @@ class CompilerElseIfAction(BuilderAction):
         try:
             self.result = self.expression.eval()
             if self.result != 0:
-                self.actions = [copy.deepcopy(a) for a in self.elif_block]
+                self.actions = [a.instantiate() for a in self.elif_block]
                 for action in self.actions:
                     program_builder.validate_one_action(action)
             elif self.else_action is not None:
@@ -2758,7 +3243,7 @@ class CompilerElseIfAction(BuilderAction):
 
     def _generate_bytes(self, program_builder, listing_fp):
         for action in self.actions:
-            program_builder.generate_action_bytes(action, listing_fp)
+            program_builder.generate_action_bytes(action)
         if self.else_action is not None:
             return self.else_action.generate_bytes(program_builder, listing_fp)
         return bytes()
@@ -2785,7 +3270,7 @@ class CompilerElseAction(BuilderAction):
         self.else_block.append(action)
 
     def _validate(self, program_builder):
-        self.actions = [copy.deepcopy(a) for a in self.else_block]
+        self.actions = [a.instantiate() for a in self.else_block]
         for action in self.actions:
             program_builder.validate_one_action(action)
 
@@ -2793,7 +3278,7 @@ class CompilerElseAction(BuilderAction):
 
     def _generate_bytes(self, program_builder, listing_fp):
         for action in self.actions:
-            program_builder.generate_action_bytes(action, listing_fp)
+            program_builder.generate_action_bytes(action)
         return bytes()
 
 class CompilerEndIfAction(BuilderAction):
@@ -2836,7 +3321,7 @@ class CompilerVALoopAction(BuilderAction):
         for i in range(tp - lp):
             v = current_arguments[i]
             macro_action.set_valoop(i, v)
-            actions = [copy.deepcopy(a) for a in self.loop_block]
+            actions = [a.instantiate() for a in self.loop_block]
             for action in actions:
                 program_builder.validate_one_action(action)
             self.actions = self.actions + actions
@@ -2844,7 +3329,7 @@ class CompilerVALoopAction(BuilderAction):
 
     def _generate_bytes(self, program_builder, listing_fp):
         for action in self.actions:
-            program_builder.generate_action_bytes(action, listing_fp)
+            program_builder.generate_action_bytes(action)
         return bytes()
 
 class CompilerEndVALoopAction(BuilderAction):
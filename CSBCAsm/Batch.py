@@ -0,0 +1,92 @@
+import argparse
+import concurrent.futures
+import contextlib
+import io
+import shlex
+import sys
+import time
+import traceback
+
+def read_manifest(filename):
+    '''The (input, output) file pairs listed in a batch manifest, one pair per line. File names are
+       separated by whitespace and can be quoted like on a shell command line. Blank lines and lines
+       starting with # are skipped'''
+    jobs = []
+    with open(filename, "r") as fp:
+        for line_number, line in enumerate(fp, 1):
+            line = line.strip()
+            if not len(line) or line.startswith("#"):
+                continue
+            names = shlex.split(line)
+            if len(names) != 2:
+                raise Exception("{}:{}: expected an input and an output file, got '{}'".format(filename, line_number, line))
+            jobs.append(tuple(names))
+    return jobs
+
+# The assembler of this process and the options it was created with, see _start_worker()
+_assembler = None
+_args = None
+
+def _start_worker(args, tables=None):
+    from .tools import create_assembler
+    global _assembler, _args
+    _assembler = create_assembler(args, tables=tables)
+    _args = args
+
+def _run_job(job):
+    '''Build one (input, output) pair with the assembler of this process, returning the exit status, the
+       time it took and what it printed'''
+    from .tools import build
+    args = argparse.Namespace(**vars(_args))
+    args.input, args.output = job
+    stdout = io.StringIO()
+    stderr = io.StringIO()
+    status = 0
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+        try:
+            build(_assembler, args)
+        except Exception:
+            traceback.print_exc()
+            status = 1
+    return status, time.perf_counter() - start, stdout.getvalue(), stderr.getvalue()
+
+def run_batch(args, jobs, workers=1, tables=None):
+    '''Assemble each (input, output) pair in jobs with the options in args, as tools.build() does for one.
+       The jobs are shared out to workers processes, and each process keeps one assembler for all of its
+       jobs, so the lexer, parser and opcode tables are built once per process and an include file shared
+       by the sources is only parsed again when it changes. With one worker the jobs run in this process,
+       using tables if given.
+
+       Prints each job with the time it took as it finishes, followed by what the job printed, and a
+       summary at the end. Returns the exit status for the whole batch: 0 if every job succeeded, 1 if
+       any failed'''
+    failed = []
+    reported = []
+    start = time.perf_counter()
+
+    def report(job, result):
+        status, seconds, stdout, stderr = result
+        if status != 0:
+            failed.append(job)
+        print("[{}/{}] {} -> {}: {} {:.1f} ms".format(len(reported) + 1, len(jobs), job[0], job[1], "done in" if status == 0 else "FAILED after", seconds * 1000))
+        reported.append(job)
+        sys.stdout.write(stdout)
+        sys.stderr.write(stderr)
+        sys.stdout.flush()
+
+    if workers == 1 or len(jobs) == 1:
+        _start_worker(args, tables=tables)
+        for job in jobs:
+            report(job, _run_job(job))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(jobs)), initializer=_start_worker, initargs=(args,)) as executor:
+            futures = {executor.submit(_run_job, job): job for job in jobs}
+            for future in concurrent.futures.as_completed(futures):
+                report(futures[future], future.result())
+
+    print("Assembled {} of {} files in {:.2f} s".format(len(jobs) - len(failed), len(jobs), time.perf_counter() - start))
+    if len(failed):
+        print("Failed: {}".format(", ".join(job[0] for job in failed)))
+        return 1
+    return 0
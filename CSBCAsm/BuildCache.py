@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+from . import __version__
+from .ParseCache import evict_least_recently_used
+
+# Bump this whenever the saved form of a build changes in a way __version__ doesn't capture
+BUILD_CACHE_VERSION = 1
+
+DEFAULT_BUILD_CACHE_SIZE = 256 * 1024 * 1024
+
+# Number of different sets of dependencies remembered for one source file and set of options
+BUILD_CACHE_MANIFEST_ENTRIES = 16
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as fp:
+        for block in iter(lambda: fp.read(1024 * 1024), b""):
+            h.update(block)
+    return h.hexdigest()
+
+class BuildCache():
+    '''On-disk cache of whole builds, like ccache's direct mode. Which files a build reads isn't known
+       until it has run, so a build is looked up in two steps:
+
+       - the manifest, keyed by a hash of the top level source, the assembler options and version,
+         lists the dependencies of the earlier builds of that source: the digest of every include and
+         incbin file read, and the include path candidates that didn't exist
+       - if every file in one of those lists still has the same digest, and none of the missing files
+         has appeared, the hash of the manifest key and those digests is the key of the saved build
+
+       A saved build is whatever the assembler passed to put(), pickled. Entries are evicted least
+       recently used first once the cache directory grows past max_size bytes. Hits and misses are
+       counted for this object and, in stats.json in the cache directory, for all builds.'''
+
+    MANIFEST_SUFFIX = ".manifest"
+    SUFFIX = ".build"
+    STATS_FILE = "stats.json"
+
+    def __init__(self, cache_dir, max_size=DEFAULT_BUILD_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def build_key(self, content, options):
+        '''The manifest key for top level source content built with options, a repr()-able value
+           holding every assembler setting that changes the result'''
+        h = hashlib.sha256()
+        h.update("{}:{}:{!r}:".format(__version__, BUILD_CACHE_VERSION, options).encode("utf8"))
+        h.update(content.encode("utf8", "surrogatepass"))
+        return h.hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def _result_key(self, key, digests):
+        h = hashlib.sha256(key.encode("ascii"))
+        for path, digest in digests:
+            h.update("\0{}\0{}".format(path, digest).encode("utf8", "surrogatepass"))
+        return h.hexdigest()
+
+    def _load(self, path):
+        with open(path, "rb") as fp:
+            value = pickle.load(fp)
+        # mark the entry as recently used
+        os.utime(path)
+        return value
+
+    def _dependencies_match(self, digests, missing):
+        for path in missing:
+            if os.path.exists(path):
+                return False
+        for path, digest in digests:
+            try:
+                if file_digest(path) != digest:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def get(self, key):
+        '''Returns the build saved for the manifest key whose dependencies are unchanged, or None'''
+        result = None
+        try:
+            for digests, missing in self._load(self._path(key, self.MANIFEST_SUFFIX)):
+                if self._dependencies_match(digests, missing):
+                    result = self._load(self._path(self._result_key(key, digests), self.SUFFIX))
+                    break
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError, TypeError, ValueError):
+            result = None
+
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        self._count(hits=int(result is not None), misses=int(result is None))
+        return result
+
+    def put(self, key, dependencies, missing_dependencies, build):
+        '''Save build as the result for manifest key with the files in dependencies as they are now'''
+        # A missing or read-only cache directory, or a dependency that has gone away, only costs us the next build
+        try:
+            digests = [(path, file_digest(path)) for path in dependencies]
+            missing = list(missing_dependencies)
+
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            self._write(self._path(self._result_key(key, digests), self.SUFFIX), build)
+
+            manifest_path = self._path(key, self.MANIFEST_SUFFIX)
+            try:
+                with open(manifest_path, "rb") as fp:
+                    manifest = pickle.load(fp)
+            except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError, TypeError, ValueError):
+                manifest = []
+            manifest = [(digests, missing)] + [entry for entry in manifest if entry != (digests, missing)]
+            self._write(manifest_path, manifest[:BUILD_CACHE_MANIFEST_ENTRIES])
+
+            self.evict()
+        except OSError:
+            pass
+
+    def _write(self, path, value):
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, delete=False) as fp:
+            pickle.dump(value, fp, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(fp.name, path)
+
+    def evict(self):
+        '''Remove the least recently used entries until the cache fits in max_size bytes'''
+        evict_least_recently_used(self.cache_dir, (self.SUFFIX, self.MANIFEST_SUFFIX), self.max_size)
+
+    def stats(self):
+        '''The hit and miss counts of all builds that used the cache directory, as a dict'''
+        stats = {'hits': 0, 'misses': 0}
+        try:
+            with open(os.path.join(self.cache_dir, self.STATS_FILE), "r") as fp:
+                stats.update(json.load(fp))
+        except (OSError, ValueError):
+            pass
+        return stats
+
+    def _count(self, hits, misses):
+        stats = self.stats()
+        stats['hits'] += hits
+        stats['misses'] += misses
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=self.cache_dir, delete=False) as fp:
+                json.dump(stats, fp)
+            os.replace(fp.name, os.path.join(self.cache_dir, self.STATS_FILE))
+        except OSError:
+            pass
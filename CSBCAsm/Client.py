@@ -0,0 +1,72 @@
+import json
+import os
+import socket
+import struct
+import sys
+
+# The client only needs the standard library, so it starts as fast as Python does; the assembler is
+# imported when there's no server to send the build to
+
+# The environment variable with the socket path of the assembly server, see csbcasm-server
+SOCKET_ENV = "CSBCASM_SOCKET"
+
+# Requests and responses are JSON objects, each sent as its length and then its UTF-8 text
+MESSAGE_LENGTH = struct.Struct("<I")
+
+def send_message(sock, message):
+    data = json.dumps(message).encode("utf8")
+    sock.sendall(MESSAGE_LENGTH.pack(len(data)) + data)
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        block = sock.recv(size - len(data))
+        if not block:
+            raise ConnectionError("connection closed")
+        data += block
+    return bytes(data)
+
+def recv_message(sock):
+    size, = MESSAGE_LENGTH.unpack(_recv_exactly(sock, MESSAGE_LENGTH.size))
+    return json.loads(_recv_exactly(sock, size).decode("utf8"))
+
+def request(socket_path, argv, cwd=None, timeout=None):
+    '''Have the server at socket_path run csbcasm with the command line arguments argv in directory cwd.
+       Returns the response: {'status': exit status, 'stdout': text, 'stderr': text}'''
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        send_message(sock, {'argv': list(argv), 'cwd': cwd if cwd is not None else os.getcwd()})
+        return recv_message(sock)
+
+def main(argv=None):
+    '''csbcasm-client: takes the same arguments as csbcasm and sends them to the server at --socket, or
+       $CSBCASM_SOCKET. Without a server to connect to, it assembles in this process instead'''
+    argv = list(sys.argv[1:] if argv is None else argv)
+    socket_path = os.environ.get(SOCKET_ENV)
+    timeout = None
+    while len(argv) >= 2 and argv[0] in ("--socket", "--client-timeout"):
+        if argv[0] == "--socket":
+            socket_path = argv[1]
+        else:
+            timeout = float(argv[1])
+        argv = argv[2:]
+
+    if socket_path is not None:
+        try:
+            response = request(socket_path, argv, timeout=timeout)
+        except (FileNotFoundError, ConnectionRefusedError):
+            response = None
+        except socket.timeout:
+            sys.stderr.write("csbcasm-client: no response from {} in {} seconds\n".format(socket_path, timeout))
+            sys.exit(1)
+        if response is not None:
+            sys.stdout.write(response['stdout'])
+            sys.stderr.write(response['stderr'])
+            sys.exit(response['status'])
+
+    from .tools import main as tools_main
+    tools_main(argv)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+import bisect
+import mmap
+import os
+import struct
+
+from .Errors import DebugInfoError
+
+# Symbols and source lines for debuggers and emulators, from ProgramBuilder.get_debug_info(). All
+# integers are little endian. The file is laid out as
+#
+#   header           magic, format version, table sizes
+#   segment table    one entry per segment, see SEGMENT, sorted by start address
+#   file table       one entry per source file, see FILE
+#   symbol table     one entry per label address, see SYMBOL, each segment's entries together and
+#                    sorted by address
+#   name index       the symbol table index of each symbol as a uint32, sorted by name
+#   line table       one entry per run of code generated by a source line, see LINE, each segment's
+#                    entries together and sorted by address
+#   strings          utf-8 names, referred to by offset and length from the start of the strings
+#
+# Every table has fixed width entries at an offset that follows from the counts in the header, so a
+# reader can binary search them in place without reading the rest of the file.
+DEBUG_INFO_MAGIC = b"CSBCDBG\x00"
+DEBUG_INFO_VERSION = 1
+
+HEADER = struct.Struct("<8sHHIIII")   # magic, version, reserved, segment count, file count, symbol count, line count
+SEGMENT = struct.Struct("<IIIIqIIII") # name offset, name length, start, size, file offset, first symbol, symbol count, first line, line count
+FILE = struct.Struct("<II")           # name offset, name length
+SYMBOL = struct.Struct("<IIIHH")      # address, name offset, name length, segment, kind
+NAME_INDEX = struct.Struct("<I")      # symbol table index
+LINE = struct.Struct("<IIIHH")        # address, size, line number, file, segment
+
+SYMBOL_LOCAL = 0
+SYMBOL_GLOBAL = 1
+SYMBOL_TEMPORARY = 2
+
+class _Strings():
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = {}
+
+    def add(self, s):
+        '''Returns (offset, length) of s in the strings, adding it if it isn't there yet'''
+        b = s.encode("utf8")
+        offset = self.offsets.get(b)
+        if offset is None:
+            offset = self.offsets[b] = len(self.data)
+            self.data += b
+        return offset, len(b)
+
+def save_debug_info(debug_info, filename):
+    '''Writes the segments, symbols and lines from ProgramBuilder.get_debug_info() to filename'''
+    strings = _Strings()
+    files = {}
+    segment_entries = []
+    symbol_entries = []
+    line_entries = []
+    names = []
+
+    for segment_index, segment in enumerate(debug_info):
+        first_symbol = len(symbol_entries)
+        for address, name, kind in sorted(segment['symbols']):
+            offset, length = strings.add(name)
+            names.append((name.encode("utf8"), address, len(symbol_entries)))
+            symbol_entries.append(SYMBOL.pack(address, offset, length, segment_index, kind))
+
+        first_line = len(line_entries)
+        for address, size, source_filename, line_number in sorted(segment['lines'], key=lambda l: l[0]):
+            file_index = files.setdefault(source_filename, len(files))
+            line_entries.append(LINE.pack(address, size, line_number, file_index, segment_index))
+
+        offset, length = strings.add(segment['name'])
+        segment_entries.append(SEGMENT.pack(offset, length, segment['start'], segment['size'], segment['file_offset'],
+                                            first_symbol, len(symbol_entries) - first_symbol, first_line, len(line_entries) - first_line))
+
+    file_entries = [FILE.pack(*strings.add(source_filename)) for source_filename in files]
+    names.sort()
+
+    with open(filename, "wb") as fp:
+        fp.write(HEADER.pack(DEBUG_INFO_MAGIC, DEBUG_INFO_VERSION, 0, len(segment_entries), len(file_entries), len(symbol_entries), len(line_entries)))
+        fp.write(b"".join(segment_entries))
+        fp.write(b"".join(file_entries))
+        fp.write(b"".join(symbol_entries))
+        fp.write(b"".join(NAME_INDEX.pack(i) for _, _, i in names))
+        fp.write(b"".join(line_entries))
+        fp.write(strings.data)
+
+class _Column():
+    '''One field of a table in the file as a read-only sequence, so bisect can search the table in place'''
+    def __init__(self, view, offset, entry, field, start, count):
+        self.view = view
+        self.offset = offset + start * entry.size
+        self.entry = entry
+        self.field = field
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return self.entry.unpack_from(self.view, self.offset + i * self.entry.size)[self.field]
+
+class _Names():
+    '''The symbol names in name index order, for bisect'''
+    def __init__(self, debug_info):
+        self.debug_info = debug_info
+
+    def __len__(self):
+        return self.debug_info._symbol_count
+
+    def __getitem__(self, i):
+        return self.debug_info._symbol_name(self.debug_info._name_index(i), encoded=True)
+
+class DebugInfo():
+    '''Reads a file written by save_debug_info(). Only the header and the segment table are read when
+       the file is opened, lookups binary search the tables through an mmap of the file.
+
+       info = DebugInfo("rom.dbg")
+       info.find_symbol(0xC012)       # ('reset', 0xC000, 'code', SYMBOL_GLOBAL), the label at or before the address
+       info.find_line(0xC012)         # ('main.s', 42)
+       info.lookup('reset')           # [(0xC000, 'code')]
+
+       The address lookups use the segment that contains the address, or the segment named with the
+       segment argument when segments share addresses.
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, "rb") as fp:
+            if os.fstat(fp.fileno()).st_size < HEADER.size:
+                raise DebugInfoError("{}: not a debug info file".format(filename))
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        try:
+            magic, version, _, segment_count, file_count, symbol_count, line_count = HEADER.unpack_from(self._view, 0)
+            if magic != DEBUG_INFO_MAGIC:
+                raise DebugInfoError("{}: not a debug info file".format(filename))
+            if version != DEBUG_INFO_VERSION:
+                raise DebugInfoError("{}: debug info version {} is not supported (expected {})".format(filename, version, DEBUG_INFO_VERSION))
+
+            self._file_offset = HEADER.size + SEGMENT.size * segment_count
+            self._symbol_offset = self._file_offset + FILE.size * file_count
+            self._name_index_offset = self._symbol_offset + SYMBOL.size * symbol_count
+            self._line_offset = self._name_index_offset + NAME_INDEX.size * symbol_count
+            self._strings_offset = self._line_offset + LINE.size * line_count
+            self._symbol_count = symbol_count
+            if self._strings_offset > len(self._view):
+                raise DebugInfoError("{}: debug info file is truncated".format(filename))
+
+            self._segments = []
+            for i in range(segment_count):
+                name_offset, name_length, start, size, file_offset, first_symbol, symbol_count, first_line, line_count = \
+                    SEGMENT.unpack_from(self._view, HEADER.size + i * SEGMENT.size)
+                self._segments.append({'name': self._string(name_offset, name_length), 'start': start, 'size': size, 'file_offset': file_offset,
+                                       'symbols': (first_symbol, symbol_count), 'lines': (first_line, line_count)})
+        except struct.error:
+            self.close()
+            raise DebugInfoError("{}: debug info file is truncated".format(filename))
+        except (DebugInfoError, UnicodeDecodeError):
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            self._view.release()
+            self._map.close()
+            self._map = None
+
+    def _string(self, offset, length, encoded=False):
+        offset += self._strings_offset
+        if offset + length > len(self._view):
+            raise DebugInfoError("{}: debug info file is truncated".format(self.filename))
+        s = self._view[offset:offset + length].tobytes()
+        return s if encoded else s.decode("utf8")
+
+    def _symbol(self, i):
+        address, name_offset, name_length, segment, kind = SYMBOL.unpack_from(self._view, self._symbol_offset + i * SYMBOL.size)
+        return (self._string(name_offset, name_length), address, self._segments[segment]['name'], kind)
+
+    def _symbol_name(self, i, encoded=False):
+        _, name_offset, name_length, _, _ = SYMBOL.unpack_from(self._view, self._symbol_offset + i * SYMBOL.size)
+        return self._string(name_offset, name_length, encoded=encoded)
+
+    def _name_index(self, i):
+        return NAME_INDEX.unpack_from(self._view, self._name_index_offset + i * NAME_INDEX.size)[0]
+
+    def _segment_for(self, address, segment):
+        if segment is not None:
+            for s in self._segments:
+                if s['name'] == segment:
+                    return s
+            raise KeyError(segment)
+        for s in self._segments:
+            if s['start'] <= address < s['start'] + s['size']:
+                return s
+        return None
+
+    def segment_names(self):
+        return [s['name'] for s in self._segments]
+
+    def file_names(self):
+        return [self._string(*FILE.unpack_from(self._view, self._file_offset + i * FILE.size))
+                for i in range((self._symbol_offset - self._file_offset) // FILE.size)]
+
+    def symbols_at(self, address, segment=None):
+        '''The symbols declared at address, as (name, address, segment, kind)'''
+        s = self._segment_for(address, segment)
+        if s is None:
+            return []
+        first, count = s['symbols']
+        addresses = _Column(self._view, self._symbol_offset, SYMBOL, 0, first, count)
+        i = bisect.bisect_left(addresses, address)
+        j = bisect.bisect_right(addresses, address, lo=i)
+        return [self._symbol(first + k) for k in range(i, j)]
+
+    def find_symbol(self, address, segment=None):
+        '''The symbol at or closest before address in its segment, as (name, address, segment, kind), or None.
+           Of several symbols at the same address, the first by name is returned'''
+        s = self._segment_for(address, segment)
+        if s is None:
+            return None
+        first, count = s['symbols']
+        addresses = _Column(self._view, self._symbol_offset, SYMBOL, 0, first, count)
+        i = bisect.bisect_right(addresses, address)
+        if i == 0:
+            return None
+        return self._symbol(first + bisect.bisect_left(addresses, addresses[i - 1], hi=i))
+
+    def find_line(self, address, segment=None):
+        '''The source (file name, line number) of the code at address, or None if no code is there'''
+        s = self._segment_for(address, segment)
+        if s is None:
+            return None
+        first, count = s['lines']
+        i = bisect.bisect_right(_Column(self._view, self._line_offset, LINE, 0, first, count), address)
+        if i == 0:
+            return None
+        line_address, size, line_number, file_index, _ = LINE.unpack_from(self._view, self._line_offset + (first + i - 1) * LINE.size)
+        if address >= line_address + size:
+            return None
+        name_offset, name_length = FILE.unpack_from(self._view, self._file_offset + file_index * FILE.size)
+        return (self._string(name_offset, name_length), line_number)
+
+    def lookup(self, name):
+        '''The (address, segment) of each declaration of the symbol name, in address order'''
+        key = name.encode("utf8")
+        names = _Names(self)
+        i = bisect.bisect_left(names, key)
+        j = bisect.bisect_right(names, key, lo=i)
+        return [self._symbol(self._name_index(k))[1:3] for k in range(i, j)]
@@ -88,3 +88,15 @@ class ElipsesNotValidError(Exception):
 class FileNotFoundError(Exception):
     pass
 
+
+class CodeOverlapError(Exception):
+    pass
+
+class ObjectFileError(Exception):
+    pass
+
+class DebugInfoError(Exception):
+    pass
+
+class LinkError(Exception):
+    pass
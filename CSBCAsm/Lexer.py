@@ -1,6 +1,212 @@
-from rply import LexerGenerator
+import re
+
+from rply import LexerGenerator, Token
+from rply.errors import LexingError
+from rply.token import SourcePosition
+
+class BufferLexer():
+    '''Scans a whole buffer with a single regular expression made out of all of the rules of an rply
+       lexer. Rules are tried in the same order rply would try them (ignore rules first), but the regex
+       engine does it in one match() instead of one match() per rule'''
+    def __init__(self, rply_lexer):
+        self.rply_lexer = rply_lexer
+        parts = []
+        self.token_names = {}
+        for i, rule in enumerate(rply_lexer.ignore_rules):
+            parts.append(self._group("i{}".format(i), rule))
+        for i, rule in enumerate(rply_lexer.rules):
+            group = "t{}".format(i)
+            parts.append(self._group(group, rule))
+            self.token_names[group] = rule.name
+        self.regex = re.compile("|".join(parts))
+
+    @staticmethod
+    def _group(group, rule):
+        if rule.re.flags & re.DOTALL:
+            return "(?P<{}>(?s:{}))".format(group, rule.re.pattern)
+        return "(?P<{}>{})".format(group, rule.re.pattern)
+
+    def lex(self, s):
+        match = self.regex.match
+        token_names = self.token_names
+        idx = 0
+        end = len(s)
+        lineno = 1
+        line_start = 0
+        while idx < end:
+            m = match(s, idx)
+            if m is None:
+                raise LexingError(None, SourcePosition(idx, lineno, idx - line_start + 1))
+            name = token_names.get(m.lastgroup, None)
+            start = idx
+            idx = m.end()
+            if name is not None:
+                value = m.group()
+                yield Token(name, value, SourcePosition(start, lineno, start - line_start + 1))
+                newlines = value.count("\n")
+                if newlines:
+                    lineno += newlines
+                    line_start = value.rfind("\n") + start + 1
+
+class FastLexer():
+    """Hand-written replacement for the rply lexer built by CreateLexer(). The first character of
+       every token selects a short, ordered list of candidate rules from a dispatch table, so common
+       tokens don't pay for the ~45 rules in front of them. Token types, values and source positions
+       are identical to the rply lexer for the same whole_buffer setting."""
+
+    _NAME_RE = re.compile(r'[a-zA-Z_\.][a-zA-Z_0-9\$]*')
+    _QUOTED_STRING_RE = re.compile(r'(p)?\"(\\\"|[^\r\n\"])*\"')
+
+    # candidates are tried in order: a str must match literally, a regex must match at the current position
+    _CANDIDATES = {
+        '.' : (('...', 'ELIPSES'), (_NAME_RE, 'NAME')),
+        'p' : ((_QUOTED_STRING_RE, 'QUOTED_STRING'), (_NAME_RE, 'NAME')),
+        '"' : ((_QUOTED_STRING_RE, 'QUOTED_STRING'),),
+        '@' : ((re.compile(r'@[0-9]+(\+|\-)?'), 'NAME'),),
+        '\\': ((re.compile(r'\\([0-9]+|[Liv])'), 'NAME'),),
+        '$' : ((re.compile(r'\$[a-fA-F0-9:]+'), 'HEX_NUMBER'),),
+        '0' : ((re.compile(r'0x[a-fA-F0-9:]+'), 'HEX_NUMBER'),
+               (re.compile(r'0o[0-7]+'), 'OCT_NUMBER'),
+               (re.compile(r'0b[0-1_]+'), 'BIN_NUMBER'),
+               (re.compile(r'[0-9]+'), 'DEC_NUMBER')),
+        '&' : ((re.compile(r'\&[0-7]+'), 'OCT_NUMBER'), ('&&', 'LOGICAL_AND'), ('&', 'AND')),
+        '%' : ((re.compile(r'%[0-1_]+'), 'BIN_NUMBER'), ('%', 'MOD')),
+        '<' : (('<<', 'LEFT_SHIFT'), ('<>', 'NOT_EQUAL_TO'), ('<=', 'LESS_THAN_OR_EQUAL_TO'), ('<', 'LOW_BYTE')),
+        '>' : (('>>', 'RIGHT_SHIFT'), ('>=', 'GREATER_THAN_OR_EQUAL_TO'), ('>', 'HIGH_BYTE')),
+        '=' : (('==', 'EQUAL_TO'), ('=', 'EQUAL')),
+        '!' : (('!=', 'NOT_EQUAL_TO'), ('!', 'LOGICAL_NOT')),
+        '|' : (('||', 'LOGICAL_OR'), ('|', 'OR')),
+        '*' : (('**', 'POWER'), ('*', 'MULTIPLY')),
+        '+' : (('+', 'PLUS'),),
+        '-' : (('-', 'MINUS'),),
+        '^' : (('^', 'XOR'),),
+        '~' : (('~', 'BITNOT'),),
+        '#' : (('#', 'IMMEDIATE'),),
+        '(' : (('(', 'OPEN_PAREN'),),
+        ')' : ((')', 'CLOSE_PAREN'),),
+        '[' : (('[', 'OPEN_BRACKET'),),
+        ']' : ((']', 'CLOSE_BRACKET'),),
+        ',' : ((',', 'EXPRESSION_SEPARATOR'),),
+        ':' : ((':', 'STATEMENT_SEPARATOR'),),
+    }
+    for c in 'abcdefghijklmnoqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ_':
+        _CANDIDATES[c] = ((_NAME_RE, 'NAME'),)
+    for c in '123456789':
+        _CANDIDATES[c] = ((re.compile(r'[0-9]+'), 'DEC_NUMBER'),)
+    del c
+
+    def __init__(self, whole_buffer=False):
+        self.whole_buffer = whole_buffer
+        self.space_re = re.compile(r'[ \t\r\f\v]+' if whole_buffer else r'\s+')
+
+    def lex(self, s):
+        candidates = FastLexer._CANDIDATES
+        space_match = self.space_re.match
+        whole_buffer = self.whole_buffer
+        idx = 0
+        end = len(s)
+        lineno = 1
+        line_start = 0
+
+        if not whole_buffer and end > 0:
+            # MULTILINE_COMMENT_END can only match at the very start of the buffer
+            token = self._multiline_comment_end(s)
+            if token is not None:
+                yield token
+                idx = len(token.getstr())
+
+        while idx < end:
+            c = s[idx]
+            if c == '\n' and whole_buffer:
+                yield Token('NEWLINE', c, SourcePosition(idx, lineno, idx - line_start + 1))
+                idx += 1
+                lineno += 1
+                line_start = idx
+                continue
+
+            m = space_match(s, idx)
+            if m is not None:
+                newlines = s.count("\n", idx, m.end())
+                if newlines:
+                    lineno += newlines
+                    line_start = s.rfind("\n", idx, m.end()) + 1
+                idx = m.end()
+                continue
+
+            if c == ';':
+                idx = self._end_of_line(s, idx)
+                continue
+
+            if c == '/':
+                token_end, name = self._slash(s, idx)
+                if name is None:
+                    idx = token_end
+                    continue
+            else:
+                for pattern, name in candidates.get(c, ()):
+                    if pattern.__class__ is str:
+                        if s.startswith(pattern, idx):
+                            token_end = idx + len(pattern)
+                            break
+                    else:
+                        m = pattern.match(s, idx)
+                        if m is not None:
+                            token_end = m.end()
+                            break
+                else:
+                    raise LexingError(None, SourcePosition(idx, lineno, idx - line_start + 1))
+
+            value = s[idx:token_end]
+            yield Token(name, value, SourcePosition(idx, lineno, idx - line_start + 1))
+            if name == 'MULTILINE_COMMENT':
+                newlines = value.count("\n")
+                if newlines:
+                    lineno += newlines
+                    line_start = value.rfind("\n") + idx + 1
+            idx = token_end
+
+    @staticmethod
+    def _end_of_line(s, idx):
+        j = s.find("\n", idx)
+        return len(s) if j < 0 else j
+
+    def _slash(self, s, idx):
+        """Everything starting with '/'. Returns (end, token name), with a name of None for comments
+           that are ignored"""
+        nxt = s[idx+1:idx+2]
+        line_end = self._end_of_line(s, idx)
+        if nxt == '/':
+            return line_end, None
+        if nxt == '*':
+            j = s.rfind("*/", idx + 2, line_end)
+            if j >= 0:
+                return j + 2, None # the whole comment is on this line
+            if self.whole_buffer:
+                j = s.find("*/", idx + 2)
+                return (len(s) if j < 0 else j + 2), 'MULTILINE_COMMENT'
+            if line_end >= len(s) - 1:
+                return line_end, 'MULTILINE_COMMENT_START'
+        return idx + 1, 'DIVIDE'
+
+    @staticmethod
+    def _multiline_comment_end(s):
+        c = s[0]
+        if c.isspace() or c == ';' or s.startswith("/*") or s.startswith("//"):
+            return None
+        j = s.rfind("*/", 0, FastLexer._end_of_line(s, 0))
+        if j < 0:
+            return None
+        return Token('MULTILINE_COMMENT_END', s[:j+2], SourcePosition(0, 1, 1))
+
+def CreateLexer(whole_buffer=False, backend="rply"):
+    '''With whole_buffer set, the lexer is meant to be run over an entire source file at once:
+       newlines become NEWLINE tokens and a /* ... */ comment spanning several lines is returned
+       as a single MULTILINE_COMMENT token. backend selects the rply lexer ("rply") or FastLexer ("fast")'''
+    if backend == "fast":
+        return FastLexer(whole_buffer=whole_buffer)
+    elif backend != "rply":
+        raise ValueError("Unknown lexer backend '{}'".format(backend))
 
-def CreateLexer():
     # Tokens should be ordered by decreasing length
     # See http://www.dabeaz.com/ply/ply.html
     rply_lexer = LexerGenerator()
@@ -10,8 +216,12 @@ def CreateLexer():
     rply_lexer.ignore(r'//[^\n]*')
     rply_lexer.ignore(r'/\*[^\n]*\*/')
 
-    rply_lexer.add("MULTILINE_COMMENT_START", r'\/\*.*$')
-    rply_lexer.add("MULTILINE_COMMENT_END", r'^.*\*\/')
+    if whole_buffer:
+        rply_lexer.add("MULTILINE_COMMENT", r'\/\*.*?\*\/', flags=re.DOTALL)
+        rply_lexer.add("MULTILINE_COMMENT", r'\/\*.*', flags=re.DOTALL) # unterminated, runs to the end of the file
+    else:
+        rply_lexer.add("MULTILINE_COMMENT_START", r'\/\*.*$')
+        rply_lexer.add("MULTILINE_COMMENT_END", r'^.*\*\/')
 
     rply_lexer.add("QUOTED_STRING", r'(p)?\"(\\\"|[^\r\n\"])*\"')
 
@@ -64,7 +274,13 @@ def CreateLexer():
 
     rply_lexer.add("STATEMENT_SEPARATOR", r':')
 
-    rply_lexer.ignore(r'\s+')
+    if whole_buffer:
+        rply_lexer.add("NEWLINE", r'\n')
+        rply_lexer.ignore(r'[ \t\r\f\v]+')
+    else:
+        rply_lexer.ignore(r'\s+')
 
+    if whole_buffer:
+        return BufferLexer(rply_lexer.build())
     return rply_lexer.build()
 
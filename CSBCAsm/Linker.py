@@ -0,0 +1,119 @@
+from .Assembler import resolve_label_name, relative_branch_offset
+from .Errors import LinkError, ParameterTooLargeError, RelativeBranchOutOfRangeError
+from .ObjectFile import ObjectFile, RELOCATION_ABSOLUTE, RELOCATION_RELATIVE_LONG
+
+class Linker():
+    '''Combines the object files of separately assembled modules into one code object. Segments keep the
+       addresses they were declared with; the code that different modules put in a segment of the same
+       name is merged, and the relocations of each module are filled in with the addresses of the global
+       labels declared by the others.
+
+       linker = Linker()
+       linker.add_object("main.obj")
+       linker.add_object("math.obj")
+       code_object = linker.link()    # as from Assembler.assemble_file(), for write_output()
+    '''
+
+    def __init__(self, verbose=0):
+        self.verbose = verbose
+        self.segments = {}    # name -> {'layout': (start, size, file offset), 'chunks': [(address, bytes, file name)], 'filename'}
+        self.symbols = {}     # name -> (segment, address, address size, file name)
+        self.relocations = [] # (file name, relocation)
+
+    def add_object(self, filename):
+        with ObjectFile(filename) as obj:
+            for name in obj.segment_names():
+                segment = obj[name]
+                layout = (segment['start'], segment['size'], segment['file_offset'])
+                placed = self.segments.get(name)
+                if placed is None:
+                    placed = self.segments[name] = {'layout': layout, 'chunks': [], 'filename': filename}
+                elif placed['layout'] != layout:
+                    raise LinkError("{}: segment \"{}\" is declared differently in {}".format(filename, name, placed['filename']))
+                placed['chunks'].extend((addr, bytes(chunk), filename) for addr, chunk in segment['code'])
+            link_info = obj.link_info()
+
+        if link_info is None:
+            return
+        for name_str, segment, address, address_size in link_info['symbols']:
+            if name_str in self.symbols:
+                raise LinkError("{}: global label \"{}\" is also declared in {}".format(filename, name_str, self.symbols[name_str][3]))
+            self.symbols[name_str] = (segment, address, address_size, filename)
+        self.relocations.extend((filename, relocation) for relocation in link_info['relocations'])
+
+        if self.verbose > 0:
+            print("{}: {} global label(s), {} relocation(s)".format(filename, len(link_info['symbols']), len(link_info['relocations'])))
+
+    def link(self):
+        images = {}
+        for name, segment in self.segments.items():
+            images[name] = self._segment_image(name, segment)
+
+        for filename, relocation in self.relocations:
+            start, image, _, _ = images[relocation['segment']]
+            offset = relocation['address'] - start
+            image[offset:offset + relocation['width']] = self._relocated_bytes(filename, relocation)
+
+        co = {}
+        for name in sorted(self.segments, key=lambda name: self.segments[name]['layout'][0]):
+            start, image, starts, ends = images[name]
+            view = memoryview(image).toreadonly()
+            _, size, file_offset = self.segments[name]['layout']
+            co[name] = {
+                'code': [(start + s, view[s:e]) for s, e in zip(starts, ends)],
+                'size': size,
+                'start': start,
+                'file_offset': file_offset
+            }
+        return co
+
+    def _segment_image(self, name, segment):
+        '''The segment's code from every module in one image, as (start address, image, [start offsets],
+           [end offsets]) with touching chunks merged, like Segment.get_code_chunks()'''
+        start = segment['layout'][0]
+        chunks = sorted(segment['chunks'], key=lambda chunk: chunk[0])
+        image = bytearray()
+        starts = []
+        ends = []
+        last_filename = None
+        for addr, data, filename in chunks:
+            offset = addr - start
+            if len(ends) and ends[-1] > offset:
+                raise LinkError("{}: code at 0x{:06X} overlaps code from {} in segment \"{}\"".format(filename, addr, last_filename, name))
+            if len(ends) and ends[-1] == offset:
+                ends[-1] = offset + len(data)
+            else:
+                starts.append(offset)
+                ends.append(offset + len(data))
+            image.extend(bytes(offset - len(image)))
+            image.extend(data)
+            last_filename = filename
+        return start, image, starts, ends
+
+    def _relocated_bytes(self, filename, relocation):
+        expression = relocation['expression']
+        where = "{}: {} line {}".format(filename, relocation['filename'], relocation['line_number'])
+
+        search_results = expression.find_referenced_names() or {}
+        for name_str, names in search_results.items():
+            names = [name for name in names if name.actual_value is None]
+            if len(names) == 0:
+                continue
+            symbol = self.symbols.get(name_str)
+            if symbol is None:
+                raise LinkError("{}: global label \"{}\" used but not declared in any module".format(where, name_str))
+            for name in names:
+                resolve_label_name(name, symbol[1], symbol[2])
+
+        width = relocation['width']
+        if relocation['kind'] == RELOCATION_ABSOLUTE:
+            v = expression.collapse()
+            if v.stated_byte_size > width:
+                raise ParameterTooLargeError("{}: value 0x{:X} is too large for {} byte(s)".format(where, v.eval(), width))
+        else:
+            try:
+                v = relative_branch_offset(expression.eval(), relocation['build_address'], relocation['kind'] == RELOCATION_RELATIVE_LONG,
+                                           relocation['line_number'])
+            except RelativeBranchOutOfRangeError as e:
+                raise RelativeBranchOutOfRangeError("{}: {} {}".format(filename, relocation['filename'], e))
+        return (v.eval() & ((1 << (8 * width)) - 1)).to_bytes(width, 'little')
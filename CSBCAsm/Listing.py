@@ -0,0 +1,127 @@
+import codecs
+import tempfile
+import zlib
+
+# "{:02X}" of every byte value, so the byte columns of the listing are looked up rather than formatted
+HEX_BYTES = ["{:02X}".format(i) for i in range(256)]
+
+# Columns of the listing lines
+LISTING_SOURCE_COLUMN = 32
+LISTING_COMMENT_COLUMN = 52
+
+# A ListingBuffer keeps about this much text before moving it to the spill file, and the spill file
+# is copied into the listing this much at a time
+LISTING_BLOCK_SIZE = 64 * 1024
+
+class ListingWriter():
+    '''Writes the listing file as the code is generated. Text written straight to the writer goes to the
+       file as it comes. The text for each run of code in a segment goes through a ListingBuffer and is
+       written to a temporary spill file, keeping only a small (build address, order, offset, length)
+       record of where it went, so the text never sits in memory. write_records() then writes a segment's
+       text into the listing sorted by build address, merging from the spill file in bounded blocks;
+       in the usual case of a segment generated in address order that's one sequential copy'''
+
+    def __init__(self, fp):
+        self.fp = fp
+        self._spill = tempfile.TemporaryFile()
+        self._spill_size = 0
+        self._sequence = 0
+
+    def write(self, text):
+        self.fp.write(text)
+
+    def new_buffer(self, records, build_address):
+        '''A ListingBuffer for the code starting at build_address, adding its records to records'''
+        self._sequence += 1
+        return ListingBuffer(self, records, build_address, self._sequence)
+
+    def spill(self, text):
+        '''Appends text to the spill file, returns its (offset, length) there'''
+        data = text.encode("utf8")
+        offset = self._spill_size
+        self._spill.write(data)
+        self._spill_size += len(data)
+        return offset, len(data)
+
+    def write_records(self, records):
+        '''Writes the text of the records to the listing in build address order. The text of records with
+           the same build address stays in the order it was generated'''
+        if not len(records):
+            return
+        self._spill.flush()
+
+        # neighbouring pieces of the spill file are read together
+        ranges = []
+        for _, _, offset, length in sorted(records):
+            if len(ranges) and ranges[-1][1] == offset:
+                ranges[-1][1] = offset + length
+            else:
+                ranges.append([offset, offset + length])
+
+        decoder = codecs.getincrementaldecoder("utf8")()
+        for start, end in ranges:
+            self._spill.seek(start)
+            while start < end:
+                data = self._spill.read(min(LISTING_BLOCK_SIZE, end - start))
+                start += len(data)
+                self.fp.write(decoder.decode(data))
+        self._spill.seek(self._spill_size)
+
+    def close(self):
+        self._spill.close()
+
+class ListingBuffer():
+    '''The listing text for one run of code in a segment, from a segment change or ORG up to the next
+       one. The text is collected up to LISTING_BLOCK_SIZE at a time and then moved to the writer's spill
+       file; flush() moves the rest'''
+
+    def __init__(self, writer, records, build_address, sequence):
+        self.writer = writer
+        self.records = records
+        self.build_address = build_address
+        self.sequence = sequence
+        self._text = []
+        self._size = 0
+
+    def write(self, text):
+        self._text.append(text)
+        self._size += len(text)
+        if self._size >= LISTING_BLOCK_SIZE:
+            self.flush()
+
+    def flush(self):
+        if self._size:
+            offset, length = self.writer.spill("".join(self._text))
+            self.records.append((self.build_address, self.sequence, offset, length))
+            self._text = []
+            self._size = 0
+
+    def format_with_address_and_bytes(self, address, byte_values, inst="", comment=None):
+        # .FILLW lists words in the byte column
+        byte_string = " ".join([HEX_BYTES[i] if 0 <= i < 256 else "{:02X}".format(i) for i in byte_values])
+                                                 # spc       bytes      spc  addr colon bank
+        spacing = LISTING_SOURCE_COLUMN - 1 - len(byte_string) - 1 - 4 - 1 - 2
+
+        bank = address >> 16
+        output = "".join((HEX_BYTES[bank] if bank < 256 else "{:02X}".format(bank), ":", HEX_BYTES[(address >> 8) & 0xFF], HEX_BYTES[address & 0xFF], " ",
+                          byte_string, " " * spacing, inst))
+        if comment is not None:
+            left_over = max(0, LISTING_COMMENT_COLUMN - len(output))
+            self.write("{}{}{}\n".format(output, " " * left_over, comment))
+        else:
+            self.write(output + "\n")
+
+    def format_summary(self, address, byte_values, data, inst):
+        '''One line for bulk data in place of a line for every few bytes: the first few bytes, then the
+           length and CRC-32 of all of data'''
+        self.format_with_address_and_bytes(address, byte_values, inst,
+                                           comment=";; 0x{:04X} bytes, crc32 0x{:08X}".format(len(data), zlib.crc32(data)))
+
+    def format_right_comment(self, comment):
+        spacing = LISTING_COMMENT_COLUMN
+        self.write("{}{}\n".format(" " * spacing, comment))
+
+    def format_single_line_left(self, comment):
+               # bank spc addr spc
+        spacing = 2 + 1 + 4 + 1
+        self.write("{}{}\n".format(" " * spacing, comment))
@@ -0,0 +1,297 @@
+import mmap
+import os
+import struct
+
+from .DebugInfo import _Strings
+from .Errors import ObjectFileError
+from . import ParserAST
+
+# A binary container for the code object from ProgramBuilder.generate_code_object. All integers are
+# little endian. The file is laid out as
+#
+#   header           magic, format version, segment count
+#   segment table    one entry per segment, see SEGMENT
+#   segment names    utf-8, one after another in segment table order
+#   chunk directory  one entry per code chunk, see CHUNK, each segment's chunks together and in order
+#   link info        for relocatable modules only, the symbols and relocations of Assembler.link_info:
+#                    a LINK_INFO header, then the symbol, external, relocation and expression node
+#                    tables one after another, and the strings they refer to by offset and length
+#   payloads         the bytes of each chunk, aligned to PAYLOAD_ALIGNMENT
+#
+# so that a reader only has to look at the header and the segment table to find any one segment, and
+# the payloads can be used straight out of an mmap of the file.
+OBJECT_FILE_MAGIC = b"CSBCOBJ\x00"
+OBJECT_FILE_VERSION = 3
+
+HEADER = struct.Struct("<8sHHIQQ") # magic, version, reserved, segment count, link info offset, link info length
+SEGMENT = struct.Struct("<IIIqII") # name length, start, size, file offset, chunk count, first chunk index
+CHUNK = struct.Struct("<IQI")      # address, payload offset, payload length
+
+LINK_INFO = struct.Struct("<IIIII")         # symbol count, external count, relocation count, expression node count, strings length
+LINK_SYMBOL = struct.Struct("<IIIIIH")      # name offset, name length, segment offset, segment length, address, address size
+LINK_EXTERNAL = struct.Struct("<II")        # name offset, name length
+RELOCATION = struct.Struct("<IIIIIHHIIII")  # segment offset, segment length, address, build address, line number, width, kind,
+                                            # file name offset, file name length, first expression node, expression node count
+EXPRESSION_NODE = struct.Struct("<HBBIq")   # kind, stated byte size or 1 for a long name, number base, name length,
+                                            # number value or name offset
+
+PAYLOAD_ALIGNMENT = 16
+
+# How the relocations of a relocatable module fill in their bytes: the value of the expression, or the
+# distance to it from a branch at the relocation's build address
+RELOCATION_ABSOLUTE = 0
+RELOCATION_RELATIVE = 1
+RELOCATION_RELATIVE_LONG = 2
+
+# A relocation's expression is stored as its nodes in postfix order: numbers, the names of labels from
+# other modules, and operators, which take their operands from the nodes before them. Nothing but these
+# nodes can be stored, so reading an object file never runs anything from it. The kinds are part of the
+# format: add new operators at the end
+EXPRESSION_NUMBER = 0
+EXPRESSION_NAME = 1
+EXPRESSION_FIRST_OPERATOR = 2 # the kind of EXPRESSION_OPERATORS[0]
+EXPRESSION_OPERATORS = (
+    ParserAST.UnaryOp_Negate, ParserAST.UnaryOp_Posigate, ParserAST.UnaryOp_Not, ParserAST.UnaryOp_LowByte,
+    ParserAST.UnaryOp_HighByte, ParserAST.UnaryOp_LogicalNot,
+    ParserAST.BinaryOp_Add, ParserAST.BinaryOp_Sub, ParserAST.BinaryOp_Mul, ParserAST.BinaryOp_Div,
+    ParserAST.BinaryOp_Pow, ParserAST.BinaryOp_Mod, ParserAST.BinaryOp_And, ParserAST.BinaryOp_Xor,
+    ParserAST.BinaryOp_Or, ParserAST.BinaryOp_LeftShift, ParserAST.BinaryOp_RightShift,
+    ParserAST.BinaryOp_EqualTo, ParserAST.BinaryOp_NotEqualTo, ParserAST.BinaryOp_LessThan,
+    ParserAST.BinaryOp_GreaterThan, ParserAST.BinaryOp_GreaterThanOrEqualTo, ParserAST.BinaryOp_LessThanOrEqualTo,
+    ParserAST.BinaryOp_LogicalAnd, ParserAST.BinaryOp_LogicalOr,
+)
+NUMBER_BASES = ('dec', 'hex', 'bin', 'oct')
+
+_OPERATOR_KINDS = {operator: EXPRESSION_FIRST_OPERATOR + i for i, operator in enumerate(EXPRESSION_OPERATORS)}
+
+def _expression_nodes(expression, strings, nodes, where):
+    '''Append the nodes of expression to nodes in postfix order. Names resolved in the module are stored
+       as their value, only the names left to the linker are stored as names'''
+    if isinstance(expression, ParserAST.Name):
+        if expression.actual_value is not None:
+            _expression_nodes(expression.actual_value, strings, nodes, where)
+        else:
+            offset, length = strings.add(expression.value)
+            nodes.append(EXPRESSION_NODE.pack(EXPRESSION_NAME, int(expression.as_long), 0, length, offset))
+    elif isinstance(expression, ParserAST.Number):
+        if not (-(1 << 63) <= expression.value < (1 << 63)) or expression.base not in NUMBER_BASES:
+            raise ObjectFileError("{}: value {} can't be stored in an object file".format(where, expression.value))
+        nodes.append(EXPRESSION_NODE.pack(EXPRESSION_NUMBER, expression.stated_byte_size, NUMBER_BASES.index(expression.base), 0, expression.value))
+    elif isinstance(expression, ParserAST.Immediate):
+        _expression_nodes(expression.value, strings, nodes, where)
+    elif isinstance(expression, ParserAST.ExpressionList) and len(expression.value) == 1:
+        # parentheses
+        _expression_nodes(expression.value[0], strings, nodes, where)
+    elif type(expression) in _OPERATOR_KINDS:
+        if isinstance(expression, ParserAST.UnaryOp):
+            _expression_nodes(expression.value, strings, nodes, where)
+        else:
+            _expression_nodes(expression.left, strings, nodes, where)
+            _expression_nodes(expression.right, strings, nodes, where)
+        nodes.append(EXPRESSION_NODE.pack(_OPERATOR_KINDS[type(expression)], 0, 0, 0, 0))
+    else:
+        raise ObjectFileError("{}: expression can't be stored in an object file".format(where))
+
+def _link_info_data(link_info):
+    strings = _Strings()
+    symbols = []
+    for name, segment, address, address_size in link_info['symbols']:
+        symbols.append(LINK_SYMBOL.pack(*strings.add(name), *strings.add(segment), address, address_size))
+    externals = [LINK_EXTERNAL.pack(*strings.add(name)) for name in link_info['externals']]
+
+    relocations = []
+    nodes = []
+    for relocation in link_info['relocations']:
+        first_node = len(nodes)
+        _expression_nodes(relocation['expression'], strings, nodes, "{} line {}".format(relocation['filename'], relocation['line_number']))
+        relocations.append(RELOCATION.pack(*strings.add(relocation['segment']), relocation['address'], relocation['build_address'],
+                                           relocation['line_number'], relocation['width'], relocation['kind'],
+                                           *strings.add(relocation['filename']), first_node, len(nodes) - first_node))
+
+    return b"".join([LINK_INFO.pack(len(symbols), len(externals), len(relocations), len(nodes), len(strings.data))]
+                    + symbols + externals + relocations + nodes + [bytes(strings.data)])
+
+def save_code_as_object(code_object, filename, link_info=None):
+    '''Writes code_object to filename, and with link_info the symbols and relocations that make it a
+       module for Linker'''
+    names = [name.encode("utf8") for name in code_object.keys()]
+    segments = list(code_object.values())
+    link_data = _link_info_data(link_info) if link_info is not None else b""
+
+    chunk_count = sum(len(segment['code']) for segment in segments)
+    directory_offset = HEADER.size + SEGMENT.size * len(segments) + sum(len(name) for name in names)
+    link_offset = directory_offset + CHUNK.size * chunk_count
+    payload_offset = link_offset + len(link_data)
+
+    with open(filename, "wb") as fp:
+        fp.write(HEADER.pack(OBJECT_FILE_MAGIC, OBJECT_FILE_VERSION, 0, len(segments), link_offset if len(link_data) else 0, len(link_data)))
+
+        first_chunk = 0
+        for name, segment in zip(names, segments):
+            fp.write(SEGMENT.pack(len(name), segment['start'], segment['size'], segment['file_offset'], len(segment['code']), first_chunk))
+            first_chunk += len(segment['code'])
+        for name in names:
+            fp.write(name)
+
+        offset = payload_offset
+        for segment in segments:
+            for addr, chunk in segment['code']:
+                offset += -offset % PAYLOAD_ALIGNMENT
+                fp.write(CHUNK.pack(addr, offset, len(chunk)))
+                offset += len(chunk)
+
+        fp.write(link_data)
+
+        offset = payload_offset
+        for segment in segments:
+            for addr, chunk in segment['code']:
+                padding = -offset % PAYLOAD_ALIGNMENT
+                fp.write(bytes(padding))
+                fp.write(chunk)
+                offset += padding + len(chunk)
+
+class ObjectFile():
+    '''Reads a file written by save_code_as_object(). Only the header and segment table are read when
+       the file is opened; a segment's chunk directory is read the first time the segment is used,
+       and the chunks are memoryviews into an mmap of the file rather than copies. Closing the file
+       releases the chunks, so copy any that are needed afterwards.
+
+       obj = ObjectFile("rom.obj")
+       obj.segment_names()       # ['code', 'vectors']
+       obj["code"]['code']       # [(0xC000, <memory>), ...]
+       obj.code_object()         # the same dict generate_code_object returned
+       obj.link_info()           # the symbols and relocations of a relocatable module, or None
+    '''
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._segments = {}
+        with open(filename, "rb") as fp:
+            if os.fstat(fp.fileno()).st_size < HEADER.size:
+                raise ObjectFileError("{}: not an object file".format(filename))
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        try:
+            magic, version, _, segment_count, self._link_offset, self._link_length = HEADER.unpack_from(self._view, 0)
+            if magic != OBJECT_FILE_MAGIC:
+                raise ObjectFileError("{}: not an object file".format(filename))
+            if version != OBJECT_FILE_VERSION:
+                raise ObjectFileError("{}: object file version {} is not supported (expected {})".format(filename, version, OBJECT_FILE_VERSION))
+
+            entries = [SEGMENT.unpack_from(self._view, HEADER.size + i * SEGMENT.size) for i in range(segment_count)]
+            name_offset = HEADER.size + SEGMENT.size * segment_count
+            chunk_count = 0
+            for name_length, start, size, file_offset, count, first_chunk in entries:
+                name = self._view[name_offset:name_offset + name_length].tobytes().decode("utf8")
+                name_offset += name_length
+                self._segments[name] = {'start': start, 'size': size, 'file_offset': file_offset, 'chunks': (count, first_chunk)}
+                chunk_count += count
+            self._directory_offset = name_offset
+            if self._directory_offset + chunk_count * CHUNK.size > len(self._view) or self._link_offset + self._link_length > len(self._view):
+                raise ObjectFileError("{}: object file is truncated".format(filename))
+        except struct.error:
+            self.close()
+            raise ObjectFileError("{}: object file is truncated".format(filename))
+        except ObjectFileError:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        if self._map is not None:
+            for segment in self._segments.values():
+                for _, chunk in segment.get('code', []):
+                    chunk.release()
+            self._view.release()
+            self._map.close()
+            self._map = None
+
+    def segment_names(self):
+        return list(self._segments.keys())
+
+    def __contains__(self, name):
+        return name in self._segments
+
+    def __getitem__(self, name):
+        segment = self._segments[name]
+        if 'code' not in segment:
+            count, first_chunk = segment['chunks']
+            directory = [CHUNK.unpack_from(self._view, self._directory_offset + i * CHUNK.size) for i in range(first_chunk, first_chunk + count)]
+            if any(offset + length > len(self._view) for _, offset, length in directory):
+                raise ObjectFileError("{}: object file is truncated".format(self.filename))
+            del segment['chunks']
+            segment['code'] = [(addr, self._view[offset:offset + length]) for addr, offset, length in directory]
+        return segment
+
+    def code_object(self):
+        return {name: self[name] for name in self._segments}
+
+    def link_info(self):
+        '''The symbols and relocations saved with a relocatable module, see Assembler.link_info, or None.
+           The expression of each relocation is rebuilt from its nodes, with the names left to the linker
+           unresolved'''
+        if not self._link_length:
+            return None
+        try:
+            return self._read_link_info(self._view[self._link_offset:self._link_offset + self._link_length])
+        except (struct.error, IndexError, UnicodeDecodeError, ValueError):
+            raise ObjectFileError("{}: bad link info in object file".format(self.filename))
+
+    def _read_link_info(self, data):
+        symbol_count, external_count, relocation_count, node_count, strings_length = LINK_INFO.unpack_from(data, 0)
+        offset = LINK_INFO.size
+        tables = []
+        for table, count in ((LINK_SYMBOL, symbol_count), (LINK_EXTERNAL, external_count), (RELOCATION, relocation_count), (EXPRESSION_NODE, node_count)):
+            tables.append([table.unpack_from(data, offset + i * table.size) for i in range(count)])
+            offset += table.size * count
+        symbols, externals, relocations, nodes = tables
+        if offset + strings_length != len(data):
+            raise ValueError("link info size")
+        strings = data[offset:]
+
+        def string(offset, length):
+            if offset + length > strings_length:
+                raise ValueError("string out of range")
+            return strings[offset:offset + length].tobytes().decode("utf8")
+
+        def expression(first_node, count, line_number):
+            if first_node + count > node_count:
+                raise ValueError("expression out of range")
+            stack = []
+            for kind, size, base, length, value in nodes[first_node:first_node + count]:
+                if kind == EXPRESSION_NUMBER:
+                    stack.append(ParserAST.Number(value, NUMBER_BASES[base], size))
+                elif kind == EXPRESSION_NAME:
+                    stack.append(ParserAST.Name(string(value, length), line_number, 0, as_long=bool(size)))
+                else:
+                    operator = EXPRESSION_OPERATORS[kind - EXPRESSION_FIRST_OPERATOR]
+                    if issubclass(operator, ParserAST.UnaryOp):
+                        stack.append(operator(stack.pop()))
+                    else:
+                        right = stack.pop()
+                        stack.append(operator(stack.pop(), right))
+            if len(stack) != 1:
+                raise ValueError("bad expression")
+            return stack[0]
+
+        return {
+            'symbols': [(string(name_offset, name_length), string(segment_offset, segment_length), address, address_size)
+                        for name_offset, name_length, segment_offset, segment_length, address, address_size in symbols],
+            'externals': [string(*external) for external in externals],
+            'relocations': [{
+                'segment': string(segment_offset, segment_length),
+                'address': address,
+                'width': width,
+                'kind': kind,
+                'build_address': build_address,
+                'filename': string(filename_offset, filename_length),
+                'line_number': line_number,
+                'expression': expression(first_node, count, line_number),
+            } for segment_offset, segment_length, address, build_address, line_number, width, kind, filename_offset, filename_length, first_node, count in relocations],
+        }
@@ -542,6 +542,22 @@ class OpcodeDatabase():
     def _block_move(opcode):
         return (opcode, 3, 0, 0)
 
+    def build_dispatch_tables(self, handlers):
+        '''handlers is a sequence of (addressing_mode, checker, encoder) in the order the addressing modes
+           should be tried. Returns a dict of the mnemonics to a tuple of
+           (addressing_mode, checker, encoder, flags, size, opcode) for each mode the instruction
+           supports, in the same order'''
+        tables = {}
+        for opcode_str, modes in self.opcodes.items():
+            table = []
+            for addressing_mode, checker, encoder in handlers:
+                opinfo = modes.get(addressing_mode, None)
+                if opinfo is not None:
+                    table.append((addressing_mode, checker, encoder, opinfo[OpcodeDatabase.OI_FLAGS],
+                                  opinfo[OpcodeDatabase.OI_SIZE], opinfo[OpcodeDatabase.OI_OPCODE]))
+            tables[opcode_str] = tuple(table)
+        return tables
+
     def get_addressing_modes(self, opcode_str):
         opcode_str = opcode_str.upper()
         return self.addressing_modes.get(opcode_str, None)
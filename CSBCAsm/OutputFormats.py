@@ -0,0 +1,538 @@
+import bz2
+import concurrent.futures
+import functools
+import io
+import json
+import lzma
+import mmap
+import os
+import pickle
+import pprint
+import zlib
+
+from .ObjectFile import save_code_as_object
+
+# Sector size for --incremental-output, the usual flash erase size
+DEFAULT_SECTOR_SIZE = 4096
+
+# The output formats, by name, as (writer, description, largest record size). Each writer is called as
+# writer(code_object, filename, options) with the code object from ProgramBuilder.generate_code_object
+# and an OutputOptions, and should work from the code chunks as they are rather than building the whole
+# memory image first. The largest record size is None for formats that aren't written as records
+OUTPUT_FORMATS = {}
+
+def output_format(name, description, max_record_size=None):
+    '''Decorator that adds a writer to OUTPUT_FORMATS'''
+    def register(writer):
+        OUTPUT_FORMATS[name] = (writer, description, max_record_size)
+        return writer
+    return register
+
+# Transforms for the segments output format, by name, as (function, file name suffix). The function
+# gets the bytes of a segment file and returns what to write instead. They're run in worker processes
+# when there's more than one job, so they have to be picklable
+SEGMENT_TRANSFORMS = {
+    'zlib': (zlib.compress, ".z"),
+    'bz2' : (bz2.compress, ".bz2"),
+    'lzma': (lzma.compress, ".xz"),
+}
+
+class OutputOptions():
+    def __init__(self, unused_byte=0x00, strip=False, record_size=None, incremental=False, sector_size=DEFAULT_SECTOR_SIZE, dirty_list=None,
+                 jobs=1, segment_transform=None, link_info=None):
+        self.unused_byte = unused_byte
+        self.strip = strip
+        self.record_size = record_size # None for the format's default
+        self.incremental = incremental # only rewrite what changed in an existing output file
+        self.sector_size = sector_size
+        self.dirty_list = dirty_list   # where to list the rewritten sectors, None for <output>.dirty.json
+        self.jobs = jobs               # number of segments written at once
+        self.segment_transform = segment_transform # name in SEGMENT_TRANSFORMS for the segments format
+        self.link_info = link_info     # symbols and relocations of a relocatable module for the object format, see Assembler.link_info
+
+def write_output(format_name, code_object, filename, options=None):
+    writer = OUTPUT_FORMATS[format_name][0]
+    writer(code_object, filename, options if options is not None else OutputOptions())
+
+def code_object_with_bytes(code_object):
+    '''The code chunks are memoryviews into the segment images, copy them out as bytes for the
+       formats that need to serialize them'''
+    return {name: dict(segment, code=[(addr, bytes(chunk)) for addr, chunk in segment['code']])
+            for name, segment in code_object.items()}
+
+def create_memory(code_object, unused_byte=0x00):
+    segments = list(code_object.keys())
+    segments.sort(key=lambda s: code_object[s]['file_offset'])
+    
+    memory = io.BytesIO()
+
+    last_file_offset = 0
+    for segment in segments:
+        cur_file_offset = code_object[segment]['file_offset']
+        if cur_file_offset < 0:
+            continue
+    
+        if last_file_offset < cur_file_offset:
+            memory.write(bytes([unused_byte] * (cur_file_offset - last_file_offset)))
+    
+        block_offset = code_object[segment]['start']
+        for code_chunk in code_object[segment]['code']: # Code pieces are already sorted
+            if block_offset < code_chunk[0]:
+                memory.write(bytes([unused_byte] * (code_chunk[0] - block_offset)))
+                block_offset = code_chunk[0]
+            memory.write(code_chunk[1])
+            block_offset += len(code_chunk[1])
+
+        last_file_offset = cur_file_offset + (block_offset - code_object[segment]['start'])
+    memory.seek(0)
+    return memory
+
+def memory_layout(code_object):
+    '''Returns (size, [(offset, chunk), ...]) with where each code chunk lands in the memory image
+       create_memory would build, so the image can be streamed without building it. The offsets
+       are increasing and the gaps between the chunks are unused space'''
+    size, segments = memory_segment_layout(code_object)
+    return size, [placement for _, placements in segments for placement in placements]
+
+def memory_segment_layout(code_object):
+    '''memory_layout() with the placements kept apart by segment, as (size, [(segment, [(offset, chunk), ...]), ...])
+       in file order. Segments that aren't in the memory image are left out'''
+    segments = list(code_object.keys())
+    segments.sort(key=lambda s: code_object[s]['file_offset'])
+
+    layout = []
+    position = 0
+    last_file_offset = 0
+    for segment in segments:
+        cur_file_offset = code_object[segment]['file_offset']
+        if cur_file_offset < 0:
+            continue
+
+        if last_file_offset < cur_file_offset:
+            position += cur_file_offset - last_file_offset
+
+        placements = []
+        block_offset = code_object[segment]['start']
+        for addr, chunk in code_object[segment]['code']:
+            if block_offset < addr:
+                position += addr - block_offset
+                block_offset = addr
+            placements.append((position, chunk))
+            position += len(chunk)
+            block_offset += len(chunk)
+        layout.append((segment, placements))
+
+        last_file_offset = cur_file_offset + (block_offset - code_object[segment]['start'])
+    return position, layout
+
+def memory_pages(size, placements, unused_byte, page_size):
+    '''Yields (offset, page, has_code) for each page_size page of the memory image described by
+       memory_layout(). A page that's entirely in one chunk is a slice of the chunk, otherwise the
+       page is assembled from the unused value and the pieces of the chunks that land in it'''
+    empty_page = bytes([unused_byte]) * min(page_size, size)
+    i = 0
+    for page_start in range(0, size, page_size):
+        page_end = min(page_start + page_size, size)
+
+        while i < len(placements) and placements[i][0] + len(placements[i][1]) <= page_start:
+            i += 1
+        j = i
+        while j < len(placements) and placements[j][0] < page_end:
+            j += 1
+
+        if i == j:
+            yield page_start, empty_page[:page_end - page_start], False
+        elif j - i == 1 and placements[i][0] <= page_start and placements[i][0] + len(placements[i][1]) >= page_end:
+            offset, chunk = placements[i]
+            yield page_start, chunk[page_start - offset:page_end - offset], True
+        else:
+            page = bytearray(empty_page[:page_end - page_start])
+            for offset, chunk in placements[i:j]:
+                lo = max(offset, page_start)
+                hi = min(offset + len(chunk), page_end)
+                page[lo - page_start:hi - page_start] = chunk[lo - offset:hi - offset]
+            yield page_start, page, True
+
+MEMORY_FILL_BLOCK_SIZE = 64 * 1024
+
+def _write_at(fp, offset, data):
+    if hasattr(os, "pwrite"):
+        view = memoryview(data)
+        while len(view):
+            n = os.pwrite(fp.fileno(), view, offset)
+            view = view[n:]
+            offset += n
+    else:
+        fp.seek(offset)
+        fp.write(data)
+
+def _unused_ranges(size, placements):
+    '''Yields the [start, end) ranges of a file of size bytes that the placements leave unused'''
+    gap_start = 0
+    for offset, chunk in placements + [(size, b'')]:
+        if gap_start < offset:
+            yield gap_start, offset
+        gap_start = offset + len(chunk)
+
+def _write_fill(fp, start, end, fill):
+    while start < end:
+        n = min(len(fill), end - start)
+        _write_at(fp, start, fill[:n])
+        start += n
+
+def _write_placements(fp, size, placements, unused_byte):
+    '''Writes the (offset, chunk) placements into a file opened unbuffered, sized to size. The file is
+       sized up front so unused space is left as holes when unused_byte is zero, and is otherwise
+       filled from one repeated block, so nothing the size of the whole file is ever built'''
+    fp.truncate(size)
+
+    if unused_byte != 0x00:
+        fill = bytes([unused_byte]) * min(MEMORY_FILL_BLOCK_SIZE, size)
+        for start, end in _unused_ranges(size, placements):
+            _write_fill(fp, start, end, fill)
+
+    _write_chunks(fp, placements)
+
+def _write_chunks(fp, placements):
+    for offset, chunk in placements:
+        _write_at(fp, offset, chunk)
+
+def _thread_map(fn, items, workers):
+    '''list(map(fn, items)), on a pool of threads when there's more than one worker. Writes only go to a
+       pool when os.pwrite is there, since the seek and write fallback in _write_at isn't thread safe'''
+    if workers == 1 or len(items) < 2 or not hasattr(os, "pwrite"):
+        return [fn(item) for item in items]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(fn, items))
+
+def save_code_as_memory(code_object, filename, unused_byte=0x00, workers=1):
+    '''Writes the same image as create_memory, but each code chunk goes straight to its offset in the file.
+       With more than one worker (None for the executor's default) the file is sized first and then the
+       segments and the unused ranges between them are written by a pool of threads. Every write is
+       positional, so the threads never share a file position and the order they finish in doesn't matter'''
+    if workers == 1:
+        size, placements = memory_layout(code_object)
+        with open(filename, "wb", buffering=0) as fp:
+            _write_placements(fp, size, placements, unused_byte)
+        return
+
+    size, segments = memory_segment_layout(code_object)
+    with open(filename, "wb", buffering=0) as fp:
+        fp.truncate(size)
+
+        # one job per segment, and one per unused range when the unused space has to be filled
+        jobs = [functools.partial(_write_chunks, fp, placements) for _, placements in segments if len(placements)]
+        if unused_byte != 0x00:
+            fill = bytes([unused_byte]) * min(MEMORY_FILL_BLOCK_SIZE, size)
+            all_placements = [placement for _, placements in segments for placement in placements]
+            jobs.extend(functools.partial(_write_fill, fp, start, end, fill) for start, end in _unused_ranges(size, all_placements))
+        _thread_map(lambda job: job(), jobs, workers)
+
+def update_memory_file(code_object, filename, unused_byte=0x00, sector_size=DEFAULT_SECTOR_SIZE):
+    '''Brings an existing memory image file up to date in place, comparing it with the new image a sector
+       at a time through mmap and only writing the sectors that changed. The file ends up the same as
+       save_code_as_memory would write it. Returns the sorted list of [start, end) ranges of the image
+       that were rewritten, with neighbouring sectors merged. Anything past the end of the old file
+       counts as changed, and a missing file is created'''
+    size, placements = memory_layout(code_object)
+
+    dirty = []
+    with open(filename, "r+b" if os.path.exists(filename) else "w+b") as fp:
+        old_size = os.fstat(fp.fileno()).st_size
+        if old_size != size:
+            fp.truncate(size)
+        if size == 0:
+            return dirty
+
+        with mmap.mmap(fp.fileno(), size, access=mmap.ACCESS_WRITE) as mm:
+            view = memoryview(mm)
+            try:
+                for start, page, _ in memory_pages(size, placements, unused_byte, sector_size):
+                    end = start + len(page)
+                    if end <= old_size and view[start:end] == page:
+                        continue
+                    view[start:end] = page
+                    if len(dirty) and dirty[-1][1] == start:
+                        dirty[-1][1] = end
+                    else:
+                        dirty.append([start, end])
+            finally:
+                view.release()
+            mm.flush()
+    return dirty
+
+def save_dirty_list(filename, output_filename, size, sector_size, dirty):
+    '''Writes the ranges from update_memory_file or update_intel_hex_file as JSON for flashing tools'''
+    with open(filename, "w") as fp:
+        json.dump({
+            'file': output_filename,
+            'size': size,
+            'sector_size': sector_size,
+            'dirty': [{'start': start, 'end': end} for start, end in dirty],
+        }, fp, indent=1)
+        fp.write("\n")
+
+def segment_filename(filename, segment):
+    base, ext = os.path.splitext(filename)
+    return "{}.{}{}".format(base, segment, ext)
+
+def _segment_image(size, placements, unused_byte):
+    image = bytearray([unused_byte]) * size
+    for offset, chunk in placements:
+        image[offset:offset + len(chunk)] = chunk
+    return image
+
+def save_code_as_segment_files(code_object, filename, unused_byte=0x00, workers=1, transform=None, suffix=""):
+    '''Writes a binary file for each segment in the memory image, named with segment_filename(). Each
+       file holds what the memory image has at the segment's file_offset: the segment from its start
+       address to its last byte of code. Returns the names of the files written.
+
+       The files are written by a pool of threads when workers is more than one (None for the executor's
+       default). transform, when given, is called with the bytes of each file and what it returns is
+       written instead, to a file name ending in suffix; e.g. one of SEGMENT_TRANSFORMS to compress the
+       segments. With more than one worker the transforms run in a pool of processes, so transform has
+       to be picklable'''
+    segments = list(code_object.keys())
+    segments.sort(key=lambda s: code_object[s]['file_offset'])
+
+    jobs = []
+    for segment in segments:
+        if code_object[segment]['file_offset'] < 0:
+            continue
+
+        start = code_object[segment]['start']
+        placements = [(addr - start, chunk) for addr, chunk in code_object[segment]['code']]
+        size = placements[-1][0] + len(placements[-1][1]) if len(placements) else 0
+        jobs.append((segment_filename(filename, segment) + suffix, size, placements))
+
+    if transform is None:
+        def write(job):
+            fn, size, placements = job
+            with open(fn, "wb", buffering=0) as fp:
+                _write_placements(fp, size, placements, unused_byte)
+        _thread_map(write, jobs, workers)
+    elif workers == 1:
+        for fn, size, placements in jobs:
+            with open(fn, "wb") as fp:
+                fp.write(transform(_segment_image(size, placements, unused_byte)))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(transform, _segment_image(size, placements, unused_byte)): fn for fn, size, placements in jobs}
+            for future in concurrent.futures.as_completed(futures):
+                with open(futures[future], "wb") as fp:
+                    fp.write(future.result())
+
+    return [fn for fn, _, _ in jobs]
+
+INTEL_HEX_MAX_RECORD_SIZE = 255
+
+def _intel_hex_header(n, addr):
+    '''The start of a data record and the sum of its header bytes'''
+    return ":{:02X}{:04X}00".format(n, addr), n + (addr >> 8) + (addr & 0xFF)
+
+def save_code_as_intel_hex(code_object, filename, strip=False, unused_byte=0x00, record_size=16):
+    if not (1 <= record_size <= INTEL_HEX_MAX_RECORD_SIZE):
+        raise ValueError("Intel HEX record size must be 1 to {}".format(INTEL_HEX_MAX_RECORD_SIZE))
+
+    size, placements = memory_layout(code_object)
+    unused_hex = "{:02X}".format(unused_byte) * record_size
+
+    # the record headers for a page and the checksum with the line ending are looked up rather than formatted
+    headers = [_intel_hex_header(record_size, start) for start in range(0, 0x10000, record_size)]
+    checksums = ["{:02X}\n".format(cs) for cs in range(256)]
+
+    with open(filename, "wb") as fp:
+        # Work a 64KiB page at a time, since records can't cross into the next extended linear address
+        last_high_addr = 0
+        for page_start, page, has_code in memory_pages(size, placements, unused_byte, 0x10000):
+            if strip and not has_code:
+                continue
+
+            if isinstance(page, memoryview):
+                page = page.tobytes() # summing bytes is faster than summing a memoryview
+            page_hex = page.hex().upper()
+            lines = []
+            for start in range(0, len(page), record_size):
+                end = min(start + record_size, len(page))
+                data_hex = page_hex[2*start:2*end]
+                if strip and data_hex == unused_hex[:2*(end - start)]:
+                    continue
+                if last_high_addr != (page_start >> 16):
+                    last_high_addr = page_start >> 16
+                    cs = -(0x02 + 0x04 + (last_high_addr >> 8) + (last_high_addr & 0xFF)) & 0xFF
+                    lines.append(":02000004{:04X}{:02X}\n".format(last_high_addr, cs))
+                if end - start == record_size:
+                    header, header_sum = headers[start // record_size]
+                else:
+                    header, header_sum = _intel_hex_header(end - start, start)
+                lines.append(header + data_hex + checksums[-(header_sum + sum(page[start:end])) & 0xFF])
+            fp.write("".join(lines).encode("ascii"))
+
+        fp.write(":00000001FF\n".encode("ascii"))
+
+def read_intel_hex_image(filename, unused_byte=0x00):
+    '''The memory image that an Intel HEX file encodes, with the bytes no record covers, like the lines
+       left out by --ihex-strip, set to unused_byte. Raises ValueError if the file isn't valid Intel HEX'''
+    image = bytearray()
+    base = 0
+    with open(filename, "r") as fp:
+        for line_number, line in enumerate(fp, 1):
+            line = line.strip()
+            if not len(line):
+                continue
+            try:
+                if line[0] != ":":
+                    raise ValueError("missing ':'")
+                record = bytes.fromhex(line[1:])
+                if len(record) < 5 or record[0] != len(record) - 5 or sum(record) & 0xFF != 0:
+                    raise ValueError("bad length or checksum")
+            except ValueError as e:
+                raise ValueError("{}:{}: not an Intel HEX record ({})".format(filename, line_number, e))
+
+            record_type, data = record[3], record[4:-1]
+            if record_type == 0x00:
+                address = base + int.from_bytes(record[1:3], "big")
+                if len(image) < address + len(data):
+                    image.extend(bytes([unused_byte]) * (address + len(data) - len(image)))
+                image[address:address + len(data)] = data
+            elif record_type == 0x01:
+                return image
+            elif record_type == 0x02:
+                base = int.from_bytes(data, "big") << 4
+            elif record_type == 0x04:
+                base = int.from_bytes(data, "big") << 16
+    raise ValueError("{}: no end of file record".format(filename))
+
+def update_intel_hex_file(code_object, filename, strip=False, unused_byte=0x00, record_size=16, sector_size=DEFAULT_SECTOR_SIZE):
+    '''update_memory_file() for Intel HEX. Records are text whose place in the file doesn't follow the
+       address they load, so the file is written again, but the dirty ranges returned are the sectors of
+       the memory image that differ from the image the existing file encodes. A missing or invalid file
+       counts as all changed'''
+    size, placements = memory_layout(code_object)
+    try:
+        old_image = read_intel_hex_image(filename, unused_byte)
+    except (OSError, ValueError):
+        old_image = None
+    if old_image is not None and len(old_image) < size:
+        # the records a stripped file leaves out hold the unused value
+        old_image.extend(bytes([unused_byte]) * (size - len(old_image)))
+
+    dirty = []
+    for start, page, _ in memory_pages(size, placements, unused_byte, sector_size):
+        end = start + len(page)
+        if old_image is not None and old_image[start:end] == page:
+            continue
+        if len(dirty) and dirty[-1][1] == start:
+            dirty[-1][1] = end
+        else:
+            dirty.append([start, end])
+
+    save_code_as_intel_hex(code_object, filename, strip=strip, unused_byte=unused_byte, record_size=record_size)
+    return dirty
+
+def _srec(record_type, address, address_size, data_hex, data_sum):
+    count = address_size + len(data_hex) // 2 + 1
+    address_sum = (address & 0xFF) + ((address >> 8) & 0xFF) + ((address >> 16) & 0xFF) + ((address >> 24) & 0xFF)
+    cs = 0xFF - ((count + address_sum + data_sum) & 0xFF)
+    return "S{}{:02X}{:0{}X}{}{:02X}\n".format(record_type, count, address, 2 * address_size, data_hex, cs)
+
+def srec_max_record_size(address_size):
+    '''Data bytes that fit in an S-record, whose count byte also covers the address and checksum'''
+    return 255 - address_size - 1
+
+def save_code_as_srec(code_object, filename, address_size=2, record_size=32, header=b"CSBCAsm"):
+    '''Writes the memory image as Motorola S-records: S19 with address_size 2, S28 with 3 and S37 with 4.
+       Only the code chunks are written, the unused space between them is left out'''
+    if address_size not in (2, 3, 4):
+        raise ValueError("S-record address size must be 2, 3 or 4")
+    max_record_size = srec_max_record_size(address_size)
+    if not (1 <= record_size <= max_record_size):
+        raise ValueError("S{}{} record size must be 1 to {}".format(address_size - 1, 11 - address_size, max_record_size))
+
+    size, placements = memory_layout(code_object)
+    if size > (1 << (8 * address_size)):
+        raise ValueError("memory image of {} bytes doesn't fit in {}-byte S-record addresses".format(size, address_size))
+
+    data_record_type = address_size - 1
+    address_sum_bytes = [(a & 0xFF) + (a >> 8) for a in range(0x10000)]
+    checksums = ["{:02X}\n".format(0xFF - cs) for cs in range(256)]
+    record_prefix = "S{}{:02X}".format(data_record_type, record_size + address_size + 1)
+    address_format = "{{:0{}X}}".format(2 * address_size)
+    block_size = record_size * max(1, MEMORY_FILL_BLOCK_SIZE // record_size)
+
+    with open(filename, "wb") as fp:
+        fp.write(_srec(0, 0, 2, header.hex().upper(), sum(header)).encode("ascii"))
+
+        count = 0
+        for offset, chunk in placements:
+            # records are formatted a block at a time from one hex encoding of the block
+            for block_start in range(0, len(chunk), block_size):
+                block = bytes(chunk[block_start:block_start + block_size])
+                block_hex = block.hex().upper()
+                lines = []
+                for start in range(0, len(block), record_size):
+                    end = min(start + record_size, len(block))
+                    address = offset + block_start + start
+                    if end - start == record_size:
+                        prefix = record_prefix
+                    else:
+                        prefix = "S{}{:02X}".format(data_record_type, end - start + address_size + 1)
+                    cs = (end - start + address_size + 1) + address_sum_bytes[address & 0xFFFF] + address_sum_bytes[address >> 16] + sum(block[start:end])
+                    lines.append(prefix + address_format.format(address) + block_hex[2*start:2*end] + checksums[cs & 0xFF])
+                count += len(lines)
+                fp.write("".join(lines).encode("ascii"))
+
+        if count <= 0xFFFF:
+            fp.write(_srec(5, count, 2, "", 0).encode("ascii"))
+        elif count <= 0xFFFFFF:
+            fp.write(_srec(6, count, 3, "", 0).encode("ascii"))
+        fp.write(_srec(11 - address_size, 0, address_size, "", 0).encode("ascii"))
+
+@output_format("mem", "a flat memory image")
+def _write_memory(code_object, filename, options):
+    if options.incremental:
+        dirty = update_memory_file(code_object, filename, unused_byte=options.unused_byte, sector_size=options.sector_size)
+        dirty_list = options.dirty_list if options.dirty_list is not None else filename + ".dirty.json"
+        save_dirty_list(dirty_list, filename, memory_layout(code_object)[0], options.sector_size, dirty)
+    else:
+        save_code_as_memory(code_object, filename, unused_byte=options.unused_byte, workers=options.jobs)
+
+@output_format("ihex", "Intel HEX of the memory image", max_record_size=INTEL_HEX_MAX_RECORD_SIZE)
+def _write_intel_hex(code_object, filename, options):
+    record_size = options.record_size if options.record_size is not None else 16
+    if options.incremental:
+        dirty = update_intel_hex_file(code_object, filename, strip=options.strip, unused_byte=options.unused_byte,
+                                      record_size=record_size, sector_size=options.sector_size)
+        dirty_list = options.dirty_list if options.dirty_list is not None else filename + ".dirty.json"
+        save_dirty_list(dirty_list, filename, memory_layout(code_object)[0], options.sector_size, dirty)
+    else:
+        save_code_as_intel_hex(code_object, filename, options.strip, unused_byte=options.unused_byte, record_size=record_size)
+
+def _srec_writer(address_size):
+    def write(code_object, filename, options):
+        save_code_as_srec(code_object, filename, address_size=address_size,
+                          record_size=options.record_size if options.record_size is not None else 32)
+    return write
+
+output_format("s19", "Motorola S-records with 16-bit addresses", max_record_size=srec_max_record_size(2))(_srec_writer(2))
+output_format("s28", "Motorola S-records with 24-bit addresses", max_record_size=srec_max_record_size(3))(_srec_writer(3))
+output_format("s37", "Motorola S-records with 32-bit addresses", max_record_size=srec_max_record_size(4))(_srec_writer(4))
+
+@output_format("segments", "a binary file for each segment, named output.<segment>.ext")
+def _write_segment_files(code_object, filename, options):
+    transform, suffix = SEGMENT_TRANSFORMS[options.segment_transform] if options.segment_transform is not None else (None, "")
+    save_code_as_segment_files(code_object, filename, unused_byte=options.unused_byte, workers=options.jobs, transform=transform, suffix=suffix)
+
+@output_format("pickle", "the code object, pickled")
+def _write_pickle(code_object, filename, options):
+    with open(filename, "wb") as fp:
+        pickle.dump(code_object_with_bytes(code_object), fp)
+
+@output_format("pprint", "the code object, pretty printed")
+def _write_pprint(code_object, filename, options):
+    with open(filename, "w") as fp:
+        fp.write(pprint.pformat(code_object_with_bytes(code_object)))
+
+@output_format("object", "the code object in the binary object file format, see ObjectFile")
+def _write_object(code_object, filename, options):
+    save_code_as_object(code_object, filename, link_info=options.link_info)
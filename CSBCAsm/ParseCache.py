@@ -0,0 +1,110 @@
+import hashlib
+import os
+import pickle
+import tempfile
+
+from . import __version__
+
+# Bump this whenever the pickled form of parsed lines changes in a way __version__ doesn't capture
+PARSE_CACHE_VERSION = 1
+
+DEFAULT_PARSE_CACHE_SIZE = 64 * 1024 * 1024
+
+def dump_program(program):
+    '''Serialize a list of lines. filename and included_from change with each use of a file, so they're left out'''
+    saved = [(line.filename, line.included_from) for line in program]
+    try:
+        for line in program:
+            line.filename = None
+            line.included_from = None
+        return pickle.dumps(program, protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        for line, (filename, included_from) in zip(program, saved):
+            line.filename = filename
+            line.included_from = included_from
+
+def load_program(data, fn, included_from):
+    '''Deserialize the lines written by dump_program() as a new copy that belongs to file fn'''
+    program = pickle.loads(data)
+    for line in program:
+        line.filename = fn
+        line.included_from = included_from
+    return program
+
+class ParseCache():
+    '''On-disk cache of parsed source files (lists of ParserAST.Line), keyed by a hash of the file
+       content and the assembler version. Entries are evicted least recently used first once the
+       cache directory grows past max_size bytes.'''
+
+    SUFFIX = ".ast"
+
+    def __init__(self, cache_dir, max_size=DEFAULT_PARSE_CACHE_SIZE):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def cache_file(self, content):
+        h = hashlib.sha256()
+        h.update("{}:{}:".format(__version__, PARSE_CACHE_VERSION).encode("utf8"))
+        h.update(content.encode("utf8", "surrogatepass"))
+        return os.path.join(self.cache_dir, h.hexdigest() + self.SUFFIX)
+
+    def get(self, content):
+        '''Returns the cached list of lines for content, or None. The filename and included_from of the
+           returned lines are not set.'''
+        cache_file = self.cache_file(content)
+        try:
+            with open(cache_file, "rb") as fp:
+                program = pickle.load(fp)
+            # mark the entry as recently used
+            os.utime(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, IndexError, TypeError):
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return program
+
+    def put(self, content, program):
+        data = dump_program(program)
+
+        # A missing or read-only cache directory only costs us the next build
+        try:
+            os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, delete=False) as fp:
+                fp.write(data)
+            os.replace(fp.name, self.cache_file(content))
+            self.evict()
+        except OSError:
+            pass
+
+    def evict(self):
+        '''Remove the least recently used entries until the cache fits in max_size bytes'''
+        evict_least_recently_used(self.cache_dir, (self.SUFFIX,), self.max_size)
+
+def evict_least_recently_used(cache_dir, suffixes, max_size):
+    '''Remove the files in cache_dir ending in one of suffixes, oldest modification time first, until they
+       add up to no more than max_size bytes. Cache hits touch their files to keep them'''
+    entries = []
+    total = 0
+    with os.scandir(cache_dir) as it:
+        for entry in it:
+            if not entry.name.endswith(suffixes):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime_ns, st.st_size, entry.path))
+            total += st.st_size
+
+    entries.sort()
+    for _, size, path in entries:
+        if total <= max_size:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
@@ -1,13 +1,26 @@
+import json
 import math
+import os
+import tempfile
 
+from appdirs import AppDirs
 from rply import ParserGenerator, Token
+from rply.grammar import Grammar
+from rply.parser import LRParser
+from rply.parsergenerator import LRTable
 
 from . import ParserAST
 
+# Bump this whenever the on-disk format of the parser table cache changes
+PARSER_CACHE_VERSION = 1
+
 class ParseError(Exception):
     pass
 
-def CreateParser():
+def default_parser_cache_dir():
+    return AppDirs("CSBCAsm").user_cache_dir
+
+def CreateParser(cache=True, cache_dir=None):
     rply_parser = ParserGenerator(
         [
             'DEC_NUMBER', 'HEX_NUMBER', 'OCT_NUMBER', 'BIN_NUMBER',
@@ -299,5 +312,64 @@ def CreateParser():
             raise ParseError("unexpected eof")
         else:
             raise ParseError("Line {}: unexpected '{}'".format(token.getsourcepos().lineno, token.getstr()))
-        
-    return rply_parser.build()
+
+    if not cache:
+        return rply_parser.build()
+
+    if cache_dir is None:
+        cache_dir = default_parser_cache_dir()
+    return _build_cached_parser(rply_parser, cache_dir)
+
+def _create_grammar(rply_parser):
+    # Same steps ParserGenerator.build() takes before it generates the LALR tables. This part
+    # is cheap, and it's all LRParser needs besides the tables themselves
+    g = Grammar(rply_parser.tokens)
+
+    for level, (assoc, terms) in enumerate(rply_parser.precedence, 1):
+        for term in terms:
+            g.set_precedence(term, assoc, level)
+
+    for prod_name, syms, func, precedence in rply_parser.productions:
+        g.add_production(prod_name, syms, func, precedence)
+
+    g.set_start()
+    return g
+
+def parser_cache_file(rply_parser, cache_dir):
+    '''Cache file name for the tables of rply_parser. The hash covers the tokens, the
+       precedence declarations and every production, so any change to the grammar gets a new file'''
+    g = _create_grammar(rply_parser)
+    return os.path.join(cache_dir, "parser-{}-{}-{}.json".format(PARSER_CACHE_VERSION, ParserGenerator.VERSION, rply_parser.compute_grammar_hash(g)))
+
+def _load_cached_parser(rply_parser, cache_file):
+    g = _create_grammar(rply_parser)
+    try:
+        with open(cache_file, "r") as fp:
+            data = json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+    if not rply_parser.data_is_valid(g, data):
+        return None
+
+    return LRParser(LRTable.from_cache(g, data), rply_parser.error_handler)
+
+def _build_cached_parser(rply_parser, cache_dir):
+    cache_file = parser_cache_file(rply_parser, cache_dir)
+
+    parser = _load_cached_parser(rply_parser, cache_file)
+    if parser is not None:
+        return parser
+
+    parser = rply_parser.build()
+
+    # A missing or read-only cache directory only costs us the next startup
+    try:
+        os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=cache_dir, delete=False, mode="w") as fp:
+            json.dump(rply_parser.serialize_table(parser.lr_table), fp)
+        os.replace(fp.name, cache_file)
+    except OSError:
+        pass
+
+    return parser
@@ -14,6 +14,10 @@ class Number():
         # 0x1234 & 0xFF will result in a 1 byte number
         self.stated_byte_size = stated_byte_size
 
+    def instantiate(self, memo):
+        # Numbers are never modified, so every instance can share them
+        return self
+
     def find_referenced_names(self, search_results=None):
         # No names here, buddy!
         return search_results
@@ -67,6 +71,9 @@ class Immediate():
     def __init__(self, value):
         self.value = value
 
+    def instantiate(self, memo):
+        return Immediate(self.value.instantiate(memo))
+
     def guess_size(self):
         return self.value.guess_size()
 
@@ -90,6 +97,14 @@ class Name():
         self.actual_value = None
         self.as_long = as_long
 
+    def instantiate(self, memo):
+        new = memo.get(id(self))
+        if new is None:
+            new = memo[id(self)] = Name(self.value, self.line, self.column, self.as_long)
+            if self.actual_value is not None:
+                new.actual_value = self.actual_value.instantiate(memo)
+        return new
+
     def guess_size(self):
         if self.actual_value is not None:
             s = self.actual_value.guess_size()
@@ -138,6 +153,9 @@ class QuotedString():
         self.value = value
         self.petscii = petscii
 
+    def instantiate(self, memo):
+        return self
+
     def find_referenced_names(self, search_results=None):
         # No names here, buddy!
         return search_results
@@ -150,6 +168,14 @@ class ExpressionList():
         self.value = []
         self.long = False
 
+    def instantiate(self, memo):
+        new = memo.get(id(self))
+        if new is None:
+            new = memo[id(self)] = ExpressionList()
+            new.value = memo[id(self.value)] = [v.instantiate(memo) for v in self.value]
+            new.long = self.long
+        return new
+
     def guess_size(self):
         if len(self.value) == 1:
             return self.value[0].guess_size()
@@ -183,6 +209,12 @@ class Statement():
         self.operands = operands
         self.has_elipses = has_elipses
 
+    def instantiate(self, memo):
+        new = memo.get(id(self))
+        if new is None:
+            new = memo[id(self)] = Statement(self.name.instantiate(memo), self.operands.instantiate(memo), self.has_elipses)
+        return new
+
     def __str__(self):
         return "<Statement:{} {}>".format(str(self.name), str(self.operands))
 
@@ -225,6 +257,9 @@ class UnaryOp():
     def __init__(self, value):
         self.value = value
 
+    def instantiate(self, memo):
+        return self.__class__(self.value.instantiate(memo))
+
     def find_referenced_names(self, search_results=None):
         return self.value.find_referenced_names(search_results)
 
@@ -305,6 +340,9 @@ class BinaryOp():
         self.left = left
         self.right = right
 
+    def instantiate(self, memo):
+        return self.__class__(self.left.instantiate(memo), self.right.instantiate(memo))
+
     def find_referenced_names(self, search_results=None):
         search_results = self.left.find_referenced_names(search_results)
         return self.right.find_referenced_names(search_results)
@@ -0,0 +1,175 @@
+import contextlib
+import io
+import os
+import signal
+import socket
+import traceback
+
+from .Assembler import AssemblerTables
+from .Client import send_message, recv_message
+
+DEFAULT_SERVER_WORKERS = os.cpu_count() or 1
+DEFAULT_REQUEST_TIMEOUT = 60.0
+
+class RequestTimeoutError(Exception):
+    pass
+
+def _request_timed_out(signum, frame):
+    raise RequestTimeoutError()
+
+class AssemblyServer():
+    '''Runs csbcasm for clients on a Unix domain socket, so a build that runs the assembler many times
+       only pays for starting Python and importing the assembler once. The lexer, parser and opcode tables
+       are built before the worker processes are forked, and every worker accepts connections on the
+       listening socket and handles one request at a time.
+
+       A request is the command line of csbcasm and the directory to run it in, see Client.request().
+       Each one gets its own Assembler, and with it its own ProgramBuilder, sharing only the tables. A
+       request that takes longer than timeout seconds is stopped and answered with an error. The worker
+       then exits, as does one that has handled max_requests requests, and a new worker is forked to
+       replace it, so nothing a request leaves behind can reach later ones.
+
+       server = AssemblyServer("/tmp/csbcasm.sock", workers=4)
+       server.serve_forever()    # until SIGTERM or SIGINT
+    '''
+
+    def __init__(self, socket_path, workers=DEFAULT_SERVER_WORKERS, timeout=DEFAULT_REQUEST_TIMEOUT, max_requests=None, verbose=0):
+        self.socket_path = socket_path
+        self.workers = workers
+        self.timeout = timeout
+        self.max_requests = max_requests
+        self.verbose = verbose
+        self.tables = None
+        self._listener = None
+        self._worker_pids = set()
+        self._stopping = False
+
+    def start(self):
+        self.tables = {backend: AssemblerTables(lexer_backend=backend) for backend in ("rply", "fast")}
+
+        if os.path.exists(self.socket_path):
+            # a socket left behind by a server that didn't stop cleanly; refuse to take over a live one
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                try:
+                    probe.connect(self.socket_path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    os.remove(self.socket_path)
+                else:
+                    raise OSError("a server is already listening on {}".format(self.socket_path))
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(self.socket_path)
+        self._listener.listen(max(16, self.workers * 4))
+
+        for _ in range(self.workers):
+            self._spawn()
+
+    def _spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            status = 0
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_IGN)
+                self._work()
+            except BaseException:
+                traceback.print_exc()
+                status = 1
+            finally:
+                os._exit(status)
+        self._worker_pids.add(pid)
+
+    def serve_forever(self):
+        '''Start the server and keep the workers running until SIGTERM or SIGINT'''
+        def stop(signum, frame):
+            self._stopping = True
+            raise KeyboardInterrupt()
+        signal.signal(signal.SIGTERM, stop)
+
+        self.start()
+        if self.verbose > 0:
+            print("Listening on {} with {} workers".format(self.socket_path, self.workers))
+        try:
+            while len(self._worker_pids):
+                pid, _ = os.wait()
+                self._worker_pids.discard(pid)
+                if not self._stopping:
+                    self._spawn()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+    def stop(self):
+        self._stopping = True
+        for pid in self._worker_pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        for pid in self._worker_pids:
+            try:
+                os.waitpid(pid, 0)
+            except ChildProcessError:
+                pass
+        self._worker_pids = set()
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(self.socket_path)
+
+    def _work(self):
+        signal.signal(signal.SIGALRM, _request_timed_out)
+        handled = 0
+        while self.max_requests is None or handled < self.max_requests:
+            connection, _ = self._listener.accept()
+            with connection:
+                try:
+                    request = recv_message(connection)
+                except (ConnectionError, ValueError):
+                    continue
+                response = self.handle(request)
+                with contextlib.suppress(OSError):
+                    send_message(connection, response)
+            handled += 1
+            if response.get('timed_out'):
+                # whatever the build was doing was cut short, start over in a clean process
+                break
+
+    def handle(self, request):
+        '''Run one request, returning its exit status and what it printed'''
+        from .tools import main
+
+        stdout = io.StringIO()
+        stderr = io.StringIO()
+        status = 0
+        timed_out = False
+        cwd = os.getcwd()
+        try:
+            with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                try:
+                    os.chdir(request['cwd'])
+                    if self.timeout:
+                        signal.setitimer(signal.ITIMER_REAL, self.timeout)
+                    main(request['argv'], tables=self.tables)
+                except SystemExit as e:
+                    # argparse errors and --help
+                    status = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+                    if not isinstance(e.code, (int, type(None))):
+                        print(e.code, file=stderr)
+                except RequestTimeoutError:
+                    print("csbcasm-server: request timed out after {} seconds".format(self.timeout), file=stderr)
+                    status = 1
+                    timed_out = True
+                except Exception:
+                    traceback.print_exc(file=stderr)
+                    status = 1
+                finally:
+                    signal.setitimer(signal.ITIMER_REAL, 0)
+        finally:
+            os.chdir(cwd)
+
+        if self.verbose > 0:
+            print("{} {}: {}".format(request['cwd'], " ".join(request['argv']), status))
+        return {'status': status, 'stdout': stdout.getvalue(), 'stderr': stderr.getvalue(), 'timed_out': timed_out}
@@ -0,0 +1,76 @@
+import os
+import time
+import traceback
+
+DEFAULT_WATCH_INTERVAL = 0.25
+
+def file_state(path):
+    '''(modification time, size) of path, or None if there's no file there'''
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+class DependencyWatcher():
+    '''Polls the files a build read for changes, along with the include path candidates that didn't exist,
+       since a file created at one of them would be included instead. A build only reads a few dozen files,
+       so checking them every interval seconds costs next to nothing and needs nothing outside the
+       standard library'''
+
+    def __init__(self, interval=DEFAULT_WATCH_INTERVAL):
+        self.interval = interval
+        self._states = {}
+
+    def watch(self, paths, since_ns=None):
+        '''Watch paths for changes from now on. A file modified at or after since_ns, the time the build
+           that read it started, may have changed while it was being read and is reported as changed
+           right away. Returns the number of paths watched'''
+        self._states = {}
+        now_ns = time.time_ns()
+        for path in paths:
+            state = file_state(path)
+            if state is not None and since_ns is not None and since_ns <= state[0] <= now_ns:
+                state = (-1, -1)
+            self._states[path] = state
+        return len(self._states)
+
+    def changed(self):
+        '''The watched paths that changed since watch()'''
+        return [path for path, state in self._states.items() if file_state(path) != state]
+
+    def wait(self, timeout=None):
+        '''Block until a watched path changes and return the changed paths, or [] after timeout seconds'''
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            changed = self.changed()
+            if len(changed):
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                return []
+            time.sleep(self.interval)
+
+def watch(build, dependencies, watcher, max_builds=None):
+    '''Run build(), and run it again each time one of the files returned by dependencies() changes, printing
+       how long each build took. A build that fails is reported and its files are watched until they're
+       fixed. Stops after max_builds builds, or on KeyboardInterrupt'''
+    builds = 0
+    try:
+        while max_builds is None or builds < max_builds:
+            since_ns = time.time_ns()
+            start = time.perf_counter()
+            try:
+                build()
+                print("Build done in {:.1f} ms".format((time.perf_counter() - start) * 1000))
+            except Exception:
+                traceback.print_exc()
+                print("Build failed after {:.1f} ms".format((time.perf_counter() - start) * 1000))
+            builds += 1
+            if max_builds is not None and builds >= max_builds:
+                break
+
+            print("Watching {} files for changes".format(watcher.watch(dependencies(), since_ns)))
+            changed = watcher.wait()
+            print("Changed: {}".format(", ".join(changed)))
+    except KeyboardInterrupt:
+        pass
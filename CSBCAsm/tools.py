@@ -1,11 +1,19 @@
-import io
 import os
-import pickle
-import pprint
 import sys
 from .Lexer import CreateLexer
 from .Parser import CreateParser
 from .Assembler import Assembler
+from .ParseCache import DEFAULT_PARSE_CACHE_SIZE
+from .BuildCache import DEFAULT_BUILD_CACHE_SIZE
+from .DebugInfo import save_debug_info
+from .Linker import Linker
+from .Watch import DependencyWatcher, DEFAULT_WATCH_INTERVAL, watch
+from .Batch import read_manifest, run_batch
+from .Server import AssemblyServer, DEFAULT_SERVER_WORKERS, DEFAULT_REQUEST_TIMEOUT
+from .OutputFormats import OUTPUT_FORMATS, OutputOptions, write_output, code_object_with_bytes, create_memory, memory_layout, \
+                           DEFAULT_SECTOR_SIZE, update_memory_file, update_intel_hex_file, save_code_as_memory, save_code_as_segment_files, save_code_as_intel_hex, save_code_as_srec, \
+                           INTEL_HEX_MAX_RECORD_SIZE, SEGMENT_TRANSFORMS
+from . import __version__
 from . import ParserAST
 from . import Opcodes
 import argparse
@@ -21,109 +29,233 @@ def assemble_string(s):
         parse_string.assembler = Assembler(verbose=3, listing_file="./test.lst")
     return parse_string.assembler.assemble_string(s)
 
-def create_memory(code_object, unused_byte=0x00):
-    segments = list(code_object.keys())
-    segments.sort(key=lambda s: code_object[s]['file_offset'])
-    
-    memory = io.BytesIO()
-
-    last_file_offset = 0
-    for segment in segments:
-        cur_file_offset = code_object[segment]['file_offset']
-        if cur_file_offset < 0:
-            continue
-    
-        if last_file_offset < cur_file_offset:
-            memory.write(bytes([unused_byte] * (cur_file_offset - last_file_offset)))
-    
-        block_offset = code_object[segment]['start']
-        for code_chunk in code_object[segment]['code']: # Code pieces are already sorted
-            if block_offset < code_chunk[0]:
-                memory.write(bytes([unused_byte] * (code_chunk[0] - block_offset)))
-                block_offset = code_chunk[0]
-            memory.write(code_chunk[1])
-            block_offset += len(code_chunk[1])
-
-        last_file_offset = cur_file_offset + (block_offset - code_object[segment]['start'])
-    memory.seek(0)
-    return memory
-
-def save_code_as_memory(code_object, filename, unused_byte=0x00):
-    memory = create_memory(code_object, unused_byte=unused_byte)
-    with open(filename, "wb") as fp:
-        fp.write(memory.getbuffer())
-
-def save_code_as_intel_hex(code_object, filename, strip=False, unused_byte=0x00):
-    memory = create_memory(code_object, unused_byte=unused_byte)
-
-    with open(filename, "wb") as fp:
-        file_offset = 0
-        last_high_addr = 0
-        while True:
-            chunk = memory.read(16)
-
-            if len(chunk) == 0:
-                fp.write(":00000001FF\n".encode("ascii"))
-                break
-            else:
-                if not (strip and all([b == unused_byte for b in chunk])):
-                    if last_high_addr != ((file_offset & 0xFFFF0000) >> 16):
-                        last_high_addr = ((file_offset & 0xFFFF0000) >> 16)
-                        cs = (~((0x02 + 0x00 + 0x00 + 0x04 + ((last_high_addr >> 16) & 0xFF) + (last_high_addr & 0xFF)) & 0xFF) + 1) & 0xFF
-                        fp.write(":02000004{:02X}{:02X}{:02X}\n"
-                                    .format((last_high_addr >> 8) & 0xFF, last_high_addr & 0xFF, cs).encode("ascii"))
-                    record_type = 0x00
-                    bs = [len(chunk), (file_offset >> 8) & 0xFF, file_offset & 0xFF, record_type] + list(chunk)
-                    cs = (~(sum(bs) & 0xFF) + 1) & 0xFF
-                    bs.append(cs)
-                    fp.write(":{}\n".format("".join(["{:02X}".format(b) for b in bs])).encode("ascii"))
-                file_offset += len(chunk)
-
-def main():
+def main(argv=None, tables=None):
+    '''csbcasm. argv are the command line arguments, sys.argv[1:] if not given, and tables maps a --lexer
+       choice to the AssemblerTables to use for it, so the assembly server doesn't build them per request'''
     def is_dir(s):
         if os.path.isdir(s):
             return s
         raise Exception("Specified include path '{}' isn't valid".format(s))
 
-    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
-    parser.add_argument("input", help="the input source file")
-    parser.add_argument("output", help="the output file")
+    parser = argparse.ArgumentParser(prog="csbcasm", formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("input", help="the input source file", nargs="?")
+    parser.add_argument("output", help="the output file", nargs="?")
+    parser.add_argument("more", help="more input and output files, assembled as a batch with the same options", nargs="*", metavar="INPUT OUTPUT")
     parser.add_argument("-v", "--verbose", help="increase the verbosity level (up to 3)", default=0, action="count")
-    parser.add_argument("-f", "--format", help="set the output file format", choices=["pickle", "pprint", "mem", "ihex"], default="mem")
+    parser.add_argument("-f", "--format", help="set the output file format ({})".format("; ".join("{}: {}".format(name, OUTPUT_FORMATS[name][1]) for name in sorted(OUTPUT_FORMATS))),
+                        choices=sorted(OUTPUT_FORMATS), default=None)
+    parser.add_argument("-c", "--relocatable", help="assemble one module for csbcasm-link: labels named with .global that the module doesn't declare are left for the linker, and the output is a relocatable object file", action="store_true")
     parser.add_argument("-l", "--listing", help="set output listing file name")
-    parser.add_argument("-u", "--unused", help="set the value used to fill in empty areas for memory and Intel Hex file formats", type=lambda v: int(v, 0), default=0)
+    parser.add_argument("-g", "--debug-info", help="write the symbols and the source line of each address to a debug info file, see CSBCAsm.DebugInfo", metavar="FILE")
+    parser.add_argument("--listing-summary", help="list each .FILL, .FILLW, .INCBIN and .DB as one line with the length and CRC-32 of its data", action="store_true")
+    parser.add_argument("-u", "--unused", help="set the value used to fill in empty areas for the memory, segment and Intel Hex file formats", type=lambda v: int(v, 0), default=0)
     parser.add_argument("-I", "--include", help="add an include directory to the search path", action="append", type=is_dir)
+    parser.add_argument("--lexer", help="select the lexer implementation", choices=["rply", "fast"], default="rply")
+    parser.add_argument("--include-cache", help="directory for the cache of parsed include files, in the user cache directory if not given", metavar="DIR")
+    parser.add_argument("--include-cache-size", help="size limit of the include cache in MiB, least recently used files are removed first", type=int, default=DEFAULT_PARSE_CACHE_SIZE // (1024 * 1024), metavar="MIB")
+    parser.add_argument("--no-include-cache", help="don't cache parsed include files", action="store_true")
+    parser.add_argument("--build-cache", help="reuse the output of an earlier build of the same input with the same options when none of its include and incbin files have changed", action="store_true")
+    parser.add_argument("--build-cache-dir", help="directory for the build cache (implies --build-cache), in the user cache directory if not given", metavar="DIR")
+    parser.add_argument("--build-cache-size", help="size limit of the build cache in MiB, least recently used builds are removed first", type=int, default=DEFAULT_BUILD_CACHE_SIZE // (1024 * 1024), metavar="MIB")
+    parser.add_argument("--build-cache-stats", help="print the build cache hit and miss counts after the build", action="store_true")
     parser.add_argument("--ihex-strip", help="don't include empty lines in the ihex format (an empty line is one with all values equal to the unused value)", action="store_true")
+    parser.add_argument("--record-size", "--ihex-record-size", help="number of data bytes in each ihex or S-record record (up to {} for ihex, 16 if not given; up to 250 to 252 for S-records, 32 if not given)".format(INTEL_HEX_MAX_RECORD_SIZE), type=int, metavar="BYTES")
+    parser.add_argument("--incremental-output", help="update an existing mem output file in place, only rewriting the sectors that changed, and list the changed sectors in a JSON file; ihex output is written again, listing the sectors of its image that changed", action="store_true")
+    parser.add_argument("--sector-size", help="sector size for --incremental-output", type=lambda v: int(v, 0), default=DEFAULT_SECTOR_SIZE, metavar="BYTES")
+    parser.add_argument("--dirty-list", help="where --incremental-output lists the rewritten sectors, OUTPUT.dirty.json if not given", metavar="FILE")
+    parser.add_argument("--output-jobs", help="number of segments the mem and segments formats write at once", type=int, default=1, metavar="N")
+    parser.add_argument("--segment-transform", help="compress each file of the segments output format, adding the matching extension to the file names", choices=sorted(SEGMENT_TRANSFORMS))
+    parser.add_argument("-MD", help="write a make style dependency file listing the source, include and incbin files read, OUTPUT.d if -MF isn't given", dest="dependency_file_enabled", action="store_true")
+    parser.add_argument("-MF", help="write the dependency file to FILE (implies -MD)", dest="dependency_file", metavar="FILE")
+    parser.add_argument("-MT", help="target to name in the dependency file instead of the output file, may be given more than once", dest="dependency_targets", action="append", metavar="TARGET")
+    parser.add_argument("-MP", help="add an empty rule for each dependency, so make doesn't fail when one is removed", dest="dependency_phony", action="store_true")
+    parser.add_argument("--deps-missing", help="also list the include path locations searched before each include was found, so creating a file that would be included instead causes a rebuild", action="store_true")
+    parser.add_argument("--watch", help="stay running and build again each time the input or one of its include or incbin files changes, keeping what is unchanged parsed", action="store_true")
+    parser.add_argument("--watch-interval", help="how often --watch checks the files for changes, in seconds", type=float, default=DEFAULT_WATCH_INTERVAL, metavar="SECONDS")
+    parser.add_argument("--manifest", help="assemble the input and output file pairs listed in FILE, one pair per line, as a batch", metavar="FILE")
+    parser.add_argument("-j", "--jobs", help="number of processes assembling a batch, each keeping its assembler and the include files it has parsed for its next files", type=int, default=1, metavar="N")
     parser.add_argument("--version", help="display version information", action="store_true")
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    files = ([args.input, args.output] if args.output is not None else [args.input] if args.input is not None else []) + args.more
+    if len(files) % 2 != 0:
+        parser.error("each input file needs an output file")
+    jobs = list(zip(files[::2], files[1::2]))
+    if args.manifest is not None:
+        jobs.extend(read_manifest(args.manifest))
+    if not len(jobs):
+        parser.error("the following arguments are required: input, output")
+    batch = args.manifest is not None or len(jobs) > 1
 
     if args.version:
-        print("CSBCAsm version 0.1.0-beta")
+        print("CSBCAsm version {}".format(__version__))
+
+    if args.relocatable and args.format not in (None, "object"):
+        raise Exception("-c/--relocatable only works with the object output format")
+    if args.format is None:
+        args.format = "object" if args.relocatable else "mem"
 
     if args.unused < 0 or args.unused > 255:
         raise Exception("Invalid argument to -u/--unused: {}. Value must be 0 to 255 (0xFF).".format(args.unused))
 
-    assembler = Assembler(verbose=args.verbose,
-                          include_path=args.include,
-                          listing_file=args.listing)
+    check_record_size(args)
+
+    if args.incremental_output and args.format not in ("mem", "ihex"):
+        raise Exception("--incremental-output only works with the mem and ihex output formats")
+
+    if args.sector_size < 1:
+        raise Exception("Invalid argument to --sector-size: {}".format(args.sector_size))
+
+    if args.output_jobs < 1:
+        raise Exception("Invalid argument to --output-jobs: {}".format(args.output_jobs))
+
+    if args.segment_transform is not None and args.format != "segments":
+        raise Exception("--segment-transform only works with the segments output format")
+
+    if args.jobs < 1:
+        raise Exception("Invalid argument to -j/--jobs: {}".format(args.jobs))
+
+    if batch:
+        for option, value in (("-l/--listing", args.listing), ("-g/--debug-info", args.debug_info), ("-MF", args.dependency_file),
+                              ("-MT", args.dependency_targets), ("--dirty-list", args.dirty_list), ("--watch", args.watch)):
+            if value:
+                raise Exception("{} can't be used with a batch of inputs".format(option))
+        sys.exit(run_batch(args, jobs, args.jobs, tables=(tables or {}).get(args.lexer)))
 
+    assembler = create_assembler(args, tables=(tables or {}).get(args.lexer))
+
+    if args.watch:
+        # the input is watched even when the build fails before it's recorded as a dependency
+        watch(lambda: build(assembler, args),
+              lambda: [args.input] + assembler.dependencies + assembler.missing_dependencies,
+              DependencyWatcher(interval=args.watch_interval))
+    else:
+        build(assembler, args)
+
+def check_record_size(args):
+    '''Check --record-size against the largest record of the output format'''
+    if args.record_size is None:
+        return
+    max_record_size = OUTPUT_FORMATS[args.format][2]
+    if max_record_size is None:
+        # the other formats ignore it
+        max_record_size = INTEL_HEX_MAX_RECORD_SIZE
+    if args.record_size < 1 or args.record_size > max_record_size:
+        raise Exception("Invalid argument to --record-size: {}. Value must be 1 to {} for the {} format.".format(args.record_size, max_record_size, args.format))
+
+def create_assembler(args, tables=None):
+    return Assembler(verbose=args.verbose,
+                     include_path=args.include,
+                     listing_file=args.listing,
+                     listing_summary=args.listing_summary,
+                     collect_debug_info=args.debug_info is not None,
+                     lexer_backend=args.lexer,
+                     include_cache=not args.no_include_cache,
+                     include_cache_dir=args.include_cache,
+                     include_cache_size=args.include_cache_size * 1024 * 1024,
+                     build_cache=args.build_cache or args.build_cache_dir is not None,
+                     build_cache_dir=args.build_cache_dir,
+                     build_cache_size=args.build_cache_size * 1024 * 1024,
+                     relocatable=args.relocatable,
+                     keep_source_parse=args.watch,
+                     tables=tables)
+
+def build(assembler, args):
     if args.verbose > 0:
         print("Parsing input file {}".format(args.input))
     result = assembler.assemble_file(args.input)
 
-    if args.format == "pickle":
-        pickle.dump(result, open(args.output, "wb"))
-    elif args.format == "pprint":
-        with open(args.output, "w") as fp:
-            fp.write(pprint.pformat(result))
-    elif args.format == "mem":
-        save_code_as_memory(result, args.output, unused_byte=args.unused)
-    elif args.format == "ihex":
-        save_code_as_intel_hex(result, args.output, args.ihex_strip, unused_byte=args.unused)
+    write_output(args.format, result, args.output, OutputOptions(unused_byte=args.unused, strip=args.ihex_strip, record_size=args.record_size,
+                                                                 incremental=args.incremental_output, sector_size=args.sector_size,
+                                                                 dirty_list=args.dirty_list, jobs=args.output_jobs,
+                                                                 segment_transform=args.segment_transform, link_info=assembler.link_info))
+
+    if args.verbose > 0:
+        print("Output saved to {}".format(args.output))
+
+    if args.debug_info is not None:
+        save_debug_info(assembler.debug_info, args.debug_info)
+        if args.verbose > 0:
+            print("Debug info saved to {}".format(args.debug_info))
+
+    if args.dependency_file_enabled or args.dependency_file is not None:
+        dependency_file = args.dependency_file if args.dependency_file is not None else args.output + ".d"
+        dependencies = assembler.dependencies + (assembler.missing_dependencies if args.deps_missing else [])
+        save_dependency_file(dependency_file, args.dependency_targets or [args.output], dependencies, phony=args.dependency_phony)
+        if args.verbose > 0:
+            print("Dependencies saved to {}".format(dependency_file))
+
+    if args.build_cache_stats and assembler.build_cache is not None:
+        stats = assembler.build_cache.stats()
+        print("Build cache {}: {} hits, {} misses".format(assembler.build_cache.cache_dir, stats['hits'], stats['misses']))
+
+def _make_escape(path):
+    return path.replace("$", "$$").replace("#", "\\#").replace(" ", "\\ ")
+
+def save_dependency_file(filename, targets, dependencies, phony=False):
+    '''Writes a make style dependency file, like a C compiler's -MD, saying targets depend on each of
+       dependencies. With phony set an empty rule is added for each dependency, so make doesn't stop
+       when one of them is deleted or, for missing dependencies, doesn't exist yet'''
+    with open(filename, "w") as fp:
+        fp.write(" ".join(_make_escape(target) for target in targets) + ":")
+        for dependency in dependencies:
+            fp.write(" \\\n  " + _make_escape(dependency))
+        fp.write("\n")
+        if phony:
+            for dependency in dependencies:
+                fp.write("\n{}:\n".format(_make_escape(dependency)))
+
+def link_main():
+    parser = argparse.ArgumentParser(prog="csbcasm-link", description="link the relocatable object files written by csbcasm -c",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("objects", help="the object files to link", nargs="+")
+    parser.add_argument("-o", "--output", help="the output file", required=True)
+    parser.add_argument("-v", "--verbose", help="increase the verbosity level", default=0, action="count")
+    parser.add_argument("-f", "--format", help="set the output file format ({})".format("; ".join("{}: {}".format(name, OUTPUT_FORMATS[name][1]) for name in sorted(OUTPUT_FORMATS))),
+                        choices=sorted(OUTPUT_FORMATS), default="mem")
+    parser.add_argument("-u", "--unused", help="set the value used to fill in empty areas for the memory, segment and Intel Hex file formats", type=lambda v: int(v, 0), default=0)
+    parser.add_argument("--ihex-strip", help="don't include empty lines in the ihex format (an empty line is one with all values equal to the unused value)", action="store_true")
+    parser.add_argument("--record-size", "--ihex-record-size", help="number of data bytes in each ihex or S-record record", type=int, metavar="BYTES")
+    parser.add_argument("--output-jobs", help="number of segments the mem and segments formats write at once", type=int, default=1, metavar="N")
+    args = parser.parse_args()
+
+    if args.unused < 0 or args.unused > 255:
+        raise Exception("Invalid argument to -u/--unused: {}. Value must be 0 to 255 (0xFF).".format(args.unused))
+
+    check_record_size(args)
+
+    if args.output_jobs < 1:
+        raise Exception("Invalid argument to --output-jobs: {}".format(args.output_jobs))
+
+    linker = Linker(verbose=args.verbose)
+    for filename in args.objects:
+        linker.add_object(filename)
+    result = linker.link()
+
+    write_output(args.format, result, args.output, OutputOptions(unused_byte=args.unused, strip=args.ihex_strip, record_size=args.record_size,
+                                                                 jobs=args.output_jobs))
 
     if args.verbose > 0:
         print("Output saved to {}".format(args.output))
 
+def server_main():
+    parser = argparse.ArgumentParser(prog="csbcasm-server", description="run csbcasm builds sent by csbcasm-client over a Unix domain socket",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("socket", help="the socket path to listen on")
+    parser.add_argument("-j", "--workers", help="number of worker processes, each handling one build at a time", type=int, default=DEFAULT_SERVER_WORKERS, metavar="N")
+    parser.add_argument("--timeout", help="seconds a build may take before it's stopped and answered with an error, 0 for no limit", type=float, default=DEFAULT_REQUEST_TIMEOUT, metavar="SECONDS")
+    parser.add_argument("--max-requests", help="replace a worker with a new process after it handles this many builds", type=int, metavar="N")
+    parser.add_argument("-v", "--verbose", help="print each build and its exit status", default=0, action="count")
+    args = parser.parse_args()
+
+    if args.workers < 1:
+        raise Exception("Invalid argument to -j/--workers: {}".format(args.workers))
+
+    if args.max_requests is not None and args.max_requests < 1:
+        raise Exception("Invalid argument to --max-requests: {}".format(args.max_requests))
+
+    AssemblyServer(args.socket, workers=args.workers, timeout=args.timeout, max_requests=args.max_requests, verbose=args.verbose).serve_forever()
+
 def AsciiToPetscii(sbytes):
     raise FeatureNotImplementedError("Currently don't know where to get or information to make a proper conversion map")
     #return list(map(lambda b: table[b], sbytes))
@@ -0,0 +1,78 @@
+'''Time assembling many small programs that include the same library: one csbcasm process per program,
+against a single csbcasm run with all of them as a batch.
+
+usage: python benchmarks/bench_batch.py [-n PROGRAMS] [-l LIBRARY_LINES] [-j JOBS]
+'''
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BLOCK = '''
+lib_loop{0}:
+            lda #$12
+            sta $0200, x
+            inx
+            cpx #$40
+            bne lib_loop{0}
+'''
+
+PROGRAM = '''
+        .segment "code", 0xC000, 0x3FE0, 0
+        .code
+        .org start
+main:   lda #{0}
+        jsr lib_loop0
+        jmp main
+        .include "lib.s"
+'''
+
+def csbcasm(argv, env, cwd):
+    subprocess.run([sys.executable, "-c", "from CSBCAsm.tools import main; main()"] + argv, env=env, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--programs", type=int, default=20)
+    parser.add_argument("-l", "--library-lines", type=int, default=1200)
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    d = tempfile.mkdtemp()
+    env = dict(os.environ, PYTHONPATH=REPO)
+    try:
+        with open(os.path.join(d, "lib.s"), "w") as fp:
+            fp.write("".join(BLOCK.format(i) for i in range(args.library_lines // 6)))
+        with open(os.path.join(d, "roms.txt"), "w") as fp:
+            for i in range(args.programs):
+                with open(os.path.join(d, "rom{}.s".format(i)), "w") as src:
+                    src.write(PROGRAM.format(i))
+                fp.write("rom{0}.s rom{0}.batch\n".format(i))
+
+        t = time.perf_counter()
+        for i in range(args.programs):
+            csbcasm(["--no-include-cache", "rom{}.s".format(i), "rom{}.bin".format(i)], env, d)
+        separate = time.perf_counter() - t
+
+        results = []
+        for jobs in sorted({1, args.jobs}):
+            t = time.perf_counter()
+            csbcasm(["--no-include-cache", "-j", str(jobs), "--manifest", "roms.txt"], env, d)
+            results.append((jobs, time.perf_counter() - t))
+
+        for i in range(args.programs):
+            with open(os.path.join(d, "rom{}.bin".format(i)), "rb") as a, open(os.path.join(d, "rom{}.batch".format(i)), "rb") as b:
+                assert a.read() == b.read()
+
+        print("{} programs, {} library lines: one process each {:.2f}s".format(args.programs, args.library_lines, separate))
+        for jobs, seconds in results:
+            print("  batch -j {}: {:.2f}s ({:.1f}x faster)".format(jobs, seconds, separate / seconds))
+    finally:
+        shutil.rmtree(d)
+
+if __name__ == "__main__":
+    main()
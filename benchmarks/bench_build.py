@@ -0,0 +1,74 @@
+'''Time per instruction of the build passes (create actions, validate, finalize labels, generate code).
+
+usage: python benchmarks/bench_build.py [-l LINES] [-n ITERATIONS]
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.Assembler import Assembler, ProgramBuilder
+
+HEADER = '''
+        .segment "code", 0x010000, 0x100000, 0
+        .code
+        .org start
+'''
+
+BLOCK = '''
+loop{0}:    lda #$12
+            sta $0200, x
+            inx
+            cpx #$40
+            bne loop{0}
+            jsr far{0}
+            lda ($10), y
+            bra @1+
+@1:         rep #$30
+far{0}:     rtl
+'''
+
+def make_source(nlines):
+    blocks = [HEADER]
+    n = 0
+    i = 0
+    while n < nlines:
+        b = BLOCK.format(i)
+        blocks.append(b)
+        n += b.count("\n") - 1
+        i += 1
+    return "".join(blocks), n
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-l", "--lines", type=int, default=20000)
+    parser.add_argument("-n", "--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    source, ninstructions = make_source(args.lines)
+    assembler = Assembler()
+
+    passes = ("build_code_actions", "validate_actions", "finalize_labels", "generate_code_object")
+    best = {}
+    for _ in range(args.iterations):
+        # the passes fill in the parsed lines, so each run starts from a fresh parse
+        pb = ProgramBuilder(assembler, assembler.parse_string(source, fn="bench.s"))
+        for name in passes:
+            t = time.perf_counter()
+            if name == "generate_code_object":
+                getattr(pb, name)(None)
+            else:
+                getattr(pb, name)()
+            t = time.perf_counter() - t
+            best[name] = min(best.get(name, t), t)
+
+    print("{} instructions".format(ninstructions))
+    for name in passes:
+        print("{:22s} {:8.3f}s {:8.2f} us/instruction".format(name, best[name], best[name] * 1e6 / ninstructions))
+    total = sum(best.values())
+    print("{:22s} {:8.3f}s {:8.2f} us/instruction".format("total", total, total * 1e6 / ninstructions))
+
+if __name__ == "__main__":
+    main()
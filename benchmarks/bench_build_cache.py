@@ -0,0 +1,60 @@
+'''Time to assemble a program split over include files without the build cache, on a cache miss
+(build and save) and on a cache hit, with a listing.
+
+usage: python benchmarks/bench_build_cache.py [-f FILES] [-l LINES]
+'''
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.Assembler import Assembler
+
+BLOCK = '''
+file{0}_loop{1}:
+            lda #$12
+            sta $0200, x
+            inx
+            cpx #$40
+            bne file{0}_loop{1}
+'''
+
+def make_sources(d, nfiles, nlines):
+    main = ['''
+        .segment "code", 0x010000, 0x100000, 0
+        .code
+        .org start
+''']
+    for f in range(nfiles):
+        fname = os.path.join(d, "file{}.s".format(f))
+        with open(fname, "w") as fp:
+            fp.write("".join(BLOCK.format(f, i) for i in range(nlines // 6)))
+        main.append('        .include "{}"\n'.format(fname))
+    return "".join(main)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--files", type=int, default=10)
+    parser.add_argument("-l", "--lines", type=int, default=2000, help="lines per include file")
+    args = parser.parse_args()
+
+    d = tempfile.mkdtemp()
+    try:
+        source = make_sources(d, args.files, args.lines)
+        listing_file = os.path.join(d, "out.lst")
+        cache_dir = os.path.join(d, "cache")
+
+        for name, build_cache in (("no cache", False), ("miss", True), ("hit", True)):
+            assembler = Assembler(listing_file=listing_file, build_cache=build_cache, build_cache_dir=cache_dir)
+            t = time.perf_counter()
+            assembler.assemble_string(source)
+            print("{:10s} {:7.3f}s".format(name, time.perf_counter() - t))
+    finally:
+        shutil.rmtree(d)
+
+if __name__ == "__main__":
+    main()
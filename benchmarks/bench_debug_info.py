@@ -0,0 +1,88 @@
+'''Time to open a debug info file for a large ROM and look up symbols and source lines by address and
+by name, against unpickling the same tables and searching them in memory.
+
+usage: python benchmarks/bench_debug_info.py [-b BANKS] [-n LOOKUPS]
+'''
+import argparse
+import bisect
+import os
+import pickle
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.DebugInfo import DebugInfo, save_debug_info, SYMBOL_LOCAL
+
+def make_debug_info(banks):
+    # 64KiB banks with a label every 32 bytes and a source line every 3 bytes
+    debug_info = []
+    for bank in range(banks):
+        start = bank << 16
+        symbols = [(address, "bank{}_label{}".format(bank, address & 0xFFFF), SYMBOL_LOCAL) for address in range(start, start + 0x10000, 32)]
+        lines = [(address, 3, "bank{}.s".format(bank), (address & 0xFFFF) // 3 + 1) for address in range(start, start + 0x10000 - 2, 3)]
+        debug_info.append({'name': "bank{}".format(bank), 'start': start, 'size': 0x10000, 'file_offset': start, 'symbols': symbols, 'lines': lines})
+    return debug_info
+
+def through_pickle(filename, addresses, names):
+    with open(filename, "rb") as fp:
+        debug_info = pickle.load(fp)
+    by_name = {}
+    for segment in debug_info:
+        segment['symbol_addresses'] = [s[0] for s in segment['symbols']]
+        segment['line_addresses'] = [l[0] for l in segment['lines']]
+        for s in segment['symbols']:
+            by_name.setdefault(s[1], []).append(s[0])
+    for address in addresses:
+        segment = debug_info[address >> 16]
+        segment['symbols'][bisect.bisect_right(segment['symbol_addresses'], address) - 1]
+        segment['lines'][bisect.bisect_right(segment['line_addresses'], address) - 1]
+    for name in names:
+        by_name[name]
+
+def through_debug_info(filename, addresses, names):
+    with DebugInfo(filename) as info:
+        for address in addresses:
+            info.find_symbol(address)
+            info.find_line(address)
+        for name in names:
+            info.lookup(name)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--banks", type=int, default=32)
+    parser.add_argument("-n", "--lookups", type=int, default=1000)
+    args = parser.parse_args()
+
+    debug_info = make_debug_info(args.banks)
+    rnd = random.Random(65816)
+    addresses = [rnd.randrange(args.banks << 16) for _ in range(args.lookups)]
+    names = ["bank{}_label{}".format(address >> 16, address & 0xFFE0) for address in addresses]
+
+    d = tempfile.mkdtemp()
+    dbg = os.path.join(d, "rom.dbg")
+    pkl = os.path.join(d, "rom.pkl")
+    try:
+        t = time.perf_counter()
+        save_debug_info(debug_info, dbg)
+        print("save_debug_info {:7.3f}s, {:.2f} MiB".format(time.perf_counter() - t, os.path.getsize(dbg) / (1024 * 1024)))
+        with open(pkl, "wb") as fp:
+            pickle.dump(debug_info, fp)
+
+        for name, fn, filename in (("pickle", through_pickle, pkl), ("DebugInfo", through_debug_info, dbg)):
+            t = time.perf_counter()
+            fn(filename, [], [])
+            t_open = time.perf_counter() - t
+            t = time.perf_counter()
+            fn(filename, addresses, names)
+            t = time.perf_counter() - t
+            print("{:10s} open {:7.3f}s, open and {} lookups {:7.3f}s".format(name, t_open, args.lookups, t))
+    finally:
+        os.remove(dbg)
+        os.remove(pkl)
+        os.rmdir(d)
+
+if __name__ == "__main__":
+    main()
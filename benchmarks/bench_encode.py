@@ -0,0 +1,92 @@
+'''Instructions encoded per second (addressing mode selection and code generation) over a mix
+of every addressing mode.
+
+usage: python benchmarks/bench_encode.py [-l LINES] [-n ITERATIONS]
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.Assembler import Assembler, ProgramBuilder
+
+HEADER = '''
+        .segment "code", 0x010000, 0x100000, 0
+        .code
+        .org start
+'''
+
+# no labels, so that the time is spent choosing addressing modes and encoding
+BLOCK = '''
+            nop
+            asl a
+            brk
+            pha
+            lda #$12
+            mvn #$01, #$02
+            lda $03, s
+            lda ($03, s), y
+            lda $10
+            lda ($10)
+            lda [$10]
+            lda $10, x
+            ldx $10, y
+            lda ($10, x)
+            lda ($10), y
+            lda [$10], y
+            lda $1234
+            lda $1234, x
+            lda $1234, y
+            jmp ($1234, x)
+            lda $123456
+            lda $123456, x
+            jmp ($1234)
+            jmp [$1234]
+            rep #$30
+'''
+
+def make_source(nlines):
+    blocks = [HEADER]
+    n = 0
+    while n < nlines:
+        blocks.append(BLOCK)
+        n += BLOCK.count("\n") - 1
+    return "".join(blocks), n
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-l", "--lines", type=int, default=50000)
+    parser.add_argument("-n", "--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    source, ninstructions = make_source(args.lines)
+    assembler = Assembler()
+
+    best_validate = best_generate = None
+    for _ in range(args.iterations):
+        # the passes fill in the parsed lines, so each run starts from a fresh parse
+        pb = ProgramBuilder(assembler, assembler.parse_string(source, fn="bench.s"))
+        pb.build_code_actions()
+
+        t = time.perf_counter()
+        pb.validate_actions()
+        validate = time.perf_counter() - t
+
+        pb.finalize_labels()
+
+        t = time.perf_counter()
+        pb.generate_code_object(None)
+        generate = time.perf_counter() - t
+
+        best_validate = validate if best_validate is None else min(best_validate, validate)
+        best_generate = generate if best_generate is None else min(best_generate, generate)
+
+    total = best_validate + best_generate
+    print("{} instructions".format(ninstructions))
+    for name, t in (("select mode", best_validate), ("encode", best_generate), ("total", total)):
+        print("{:12s} {:8.3f}s {:10.0f} instructions/s".format(name, t, ninstructions / t))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+'''Output throughput of each registered output format, in MB/s of code, for a banked ROM image.
+
+usage: python benchmarks/bench_formats.py [-s MIB] [-n ITERATIONS] [FORMAT ...]
+'''
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.OutputFormats import OUTPUT_FORMATS, OutputOptions, write_output
+from bench_ihex import make_code_object
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("formats", nargs="*", default=sorted(OUTPUT_FORMATS))
+    parser.add_argument("-s", "--size", type=int, default=4, help="image size in MiB")
+    parser.add_argument("-n", "--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    co = make_code_object(args.size * 1024 * 1024)
+    if "s19" in args.formats:
+        # 16-bit addresses only reach the first bank
+        s19_co = {'bank0': co['bank0']}
+    code_bytes = lambda co: sum(len(chunk) for segment in co.values() for _, chunk in segment['code'])
+
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "out.bin")
+        for name in args.formats:
+            fco = s19_co if name == "s19" else co
+            best = None
+            for _ in range(args.iterations):
+                t = time.perf_counter()
+                write_output(name, fco, filename, OutputOptions(unused_byte=0xFF))
+                t = time.perf_counter() - t
+                best = t if best is None else min(best, t)
+            size = sum(os.path.getsize(fn) for fn in glob.glob(os.path.join(d, "*")))
+            mb = code_bytes(fco) / (1024 * 1024)
+            print("{:10s} {:7.3f}s {:8.2f} MB/s of code, {:8.2f} MiB written".format(name, best, mb / best, size / (1024 * 1024)))
+            for fn in glob.glob(os.path.join(d, "*")):
+                os.remove(fn)
+
+if __name__ == "__main__":
+    main()
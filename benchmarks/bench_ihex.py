@@ -0,0 +1,57 @@
+'''Intel HEX output throughput (MB/s of memory image) for a banked ROM image.
+
+usage: python benchmarks/bench_ihex.py [-s MIB] [-n ITERATIONS]
+'''
+import argparse
+import inspect
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.tools import save_code_as_intel_hex
+
+def make_code_object(size):
+    # 64KiB banks that are three quarters full, with an empty bank every so often
+    rnd = random.Random(65816)
+    co = {}
+    for bank in range(size // 0x10000):
+        start = bank << 16
+        code = []
+        if bank % 5 != 4:
+            code.append((start, rnd.randbytes(0xC000)))
+        co["bank{}".format(bank)] = {'code': code, 'size': 0x10000, 'start': start, 'file_offset': start}
+    return co
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--size", type=int, default=4, help="image size in MiB")
+    parser.add_argument("-n", "--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    co = make_code_object(args.size * 1024 * 1024)
+    fd, filename = tempfile.mkstemp(suffix=".hex")
+    os.close(fd)
+
+    runs = [("16 byte records", {}), ("16 byte records, strip", {'strip': True})]
+    if 'record_size' in inspect.signature(save_code_as_intel_hex).parameters:
+        runs.append(("255 byte records", {'record_size': 255}))
+        runs.append(("255 byte records, strip", {'strip': True, 'record_size': 255}))
+
+    try:
+        for name, kwargs in runs:
+            best = None
+            for _ in range(args.iterations):
+                t = time.perf_counter()
+                save_code_as_intel_hex(co, filename, **kwargs)
+                t = time.perf_counter() - t
+                best = t if best is None else min(best, t)
+            print("{:24s} {:7.3f}s {:8.2f} MB/s".format(name, best, args.size / best))
+    finally:
+        os.remove(filename)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+'''Tokens per second of the rply lexer, the single-regex buffer lexer and FastLexer.
+
+usage: python benchmarks/bench_lexer.py [-l LINES] [-n ITERATIONS]
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.Lexer import CreateLexer
+from bench_parse import make_source
+
+def count_tokens(lexer, lines):
+    n = 0
+    for line in lines:
+        for _ in lexer.lex(line):
+            n += 1
+    return n
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-l", "--lines", type=int, default=50000)
+    parser.add_argument("-n", "--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    s = make_source(args.lines)
+    lines = s.split("\n")
+
+    runs = (
+        ("rply, by line",      CreateLexer(), lines),
+        ("fast, by line",      CreateLexer(backend="fast"), lines),
+        ("rply, whole buffer", CreateLexer(whole_buffer=True).rply_lexer, [s]),
+        ("regex, whole buffer", CreateLexer(whole_buffer=True), [s]),
+        ("fast, whole buffer", CreateLexer(whole_buffer=True, backend="fast"), [s]),
+    )
+
+    for name, lexer, inputs in runs:
+        best = None
+        for _ in range(args.iterations):
+            t = time.perf_counter()
+            n = count_tokens(lexer, inputs)
+            t = time.perf_counter() - t
+            best = t if best is None else min(best, t)
+        print("{:20s} {:8d} tokens in {:7.3f}s: {:10.0f} tokens/s".format(name, n, best, n / best))
+
+if __name__ == "__main__":
+    main()
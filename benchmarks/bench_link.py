@@ -0,0 +1,83 @@
+'''Time to rebuild a program of several modules after one of them changes: assembling everything as one
+file with .include, against assembling only the changed module with -c and linking the object files.
+
+usage: python benchmarks/bench_link.py [-m MODULES] [-l LINES]
+'''
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.Assembler import Assembler
+from CSBCAsm.Linker import Linker
+from CSBCAsm.OutputFormats import OutputOptions, write_output, code_object_with_bytes
+
+SEGMENTS = '''
+        .segment "code", 0x010000, 0x100000, 0
+'''
+
+BLOCK = '''
+module{0}_loop{1}:
+            lda #$12
+            sta $0200, x
+            inx
+            cpx #$40
+            bne module{0}_loop{1}
+            jsl &module{2}_entry
+'''
+
+def make_module(m, nmodules, nlines, bank):
+    lines = ["        .code\n", "        .global module{}_entry\n".format(m), "        .global module{}_entry\n".format((m + 1) % nmodules),
+             "        .org ${:06X}\nmodule{}_entry:\n".format(bank << 16, m)]
+    lines.extend(BLOCK.format(m, i, (m + 1) % nmodules) for i in range(nlines // 7))
+    return "".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-m", "--modules", type=int, default=8)
+    parser.add_argument("-l", "--lines", type=int, default=3000, help="lines per module")
+    args = parser.parse_args()
+
+    d = tempfile.mkdtemp()
+    try:
+        modules = []
+        for m in range(args.modules):
+            fname = os.path.join(d, "module{}.s".format(m))
+            with open(fname, "w") as fp:
+                fp.write(SEGMENTS + make_module(m, args.modules, args.lines, m + 1))
+            modules.append(fname)
+
+        # every module declares the segment, the single file only once
+        whole = SEGMENTS + "".join(open(fname).read().replace(SEGMENTS, "") for fname in modules)
+        t = time.perf_counter()
+        single = Assembler().assemble_string(whole)
+        print("single file      {:7.3f}s".format(time.perf_counter() - t))
+
+        objects = []
+        t = time.perf_counter()
+        for fname in modules:
+            assembler = Assembler(relocatable=True)
+            code_object = assembler.assemble_file(fname)
+            objects.append(fname + ".obj")
+            write_output("object", code_object, objects[-1], OutputOptions(link_info=assembler.link_info))
+        print("all modules      {:7.3f}s".format(time.perf_counter() - t))
+
+        t = time.perf_counter()
+        assembler = Assembler(relocatable=True)
+        write_output("object", assembler.assemble_file(modules[0]), objects[0], OutputOptions(link_info=assembler.link_info))
+        linker = Linker()
+        for fname in objects:
+            linker.add_object(fname)
+        linked = linker.link()
+        print("one module, link {:7.3f}s".format(time.perf_counter() - t))
+
+        assert code_object_with_bytes(linked) == code_object_with_bytes(single)
+    finally:
+        shutil.rmtree(d)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+'''Time and peak Python memory of assembling with and without a listing file, for a program with many
+ORGs of straight line code and large fills, and with the bulk data summarized.
+
+usage: python benchmarks/bench_listing.py [-n BLOCKS]
+'''
+import argparse
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.Assembler import Assembler
+
+def make_program(blocks):
+    lines = ['        .segment "code", 0x10000, 0x400000, 0', '        .code']
+    for block in range(blocks):
+        # blocks are placed out of order, so the listing has to be sorted
+        lines.append("        .org ${:06X}".format(0x10000 + ((block * 7) % blocks) * 0x1000))
+        lines.extend(["        lda #${:02X}\n        sta $2000,x".format(i) for i in range(64)])
+        lines.append("        .fill 0xD00, ${:02X}".format(block & 0xFF))
+    return "\n".join(lines) + "\n"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--blocks", type=int, default=256)
+    args = parser.parse_args()
+
+    program = make_program(args.blocks)
+    fd, filename = tempfile.mkstemp(suffix=".lst")
+    os.close(fd)
+
+    try:
+        for name, listing_file, summary in (("no listing", None, False), ("listing", filename, False), ("summary", filename, True)):
+            assembler = Assembler(listing_file=listing_file, listing_summary=summary)
+            tracemalloc.start()
+            t = time.perf_counter()
+            assembler.assemble_string(program)
+            t = time.perf_counter() - t
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            size = os.path.getsize(filename) if listing_file is not None else 0
+            print("{:12s} {:7.3f}s peak {:8.2f} MiB, listing {:8.2f} MiB".format(name, t, peak / (1024 * 1024), size / (1024 * 1024)))
+    finally:
+        os.remove(filename)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+'''Macro expansion cost: instantiating captured actions from their templates against copy.deepcopy,
+and the time to assemble a program with 10k macro calls.
+
+usage: python benchmarks/bench_macros.py [-c CALLS] [-n ITERATIONS]
+'''
+import argparse
+import copy
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.Assembler import Assembler, ProgramBuilder
+
+MACRO = '''
+        .segment "code", 0x0000, 0x1000000, 0
+        .code
+        .org start
+
+store:  .macro dest, value
+        lda #(value + 1) & $FF
+        sta dest, x
+        lda #<(value << 2)
+        sta dest + 1, x
+        inx
+        .endmacro
+
+'''
+
+def make_source(calls):
+    lines = [MACRO]
+    for i in range(calls):
+        lines.append("        store ${:04X}, {}\n".format(i & 0xFFFF, i & 0x7F))
+    return "".join(lines)
+
+def time_it(fn, iterations):
+    best = None
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        t = time.perf_counter() - t
+        best = t if best is None else min(best, t)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-c", "--calls", type=int, default=10000)
+    parser.add_argument("-n", "--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    source = make_source(args.calls)
+    assembler = Assembler()
+    program = assembler.parse_string(source, fn="bench.s")
+
+    # The captured actions of the macro are the templates that every call copies
+    pb = ProgramBuilder(assembler, program)
+    pb.build_code_actions()
+    macro = pb.get_macro("store")
+
+    deepcopy_t = time_it(lambda: [[copy.deepcopy(a) for a in macro.actions] for _ in range(args.calls)], args.iterations)
+    instantiate_t = time_it(lambda: [macro.call() for _ in range(args.calls)], args.iterations)
+
+    # assembling fills in the parsed lines, so every run needs its own copy of the program
+    assemble_t = None
+    for _ in range(args.iterations):
+        program = assembler.parse_string(source, fn="bench.s")
+        t = time_it(lambda: assembler.assemble(program, "bench.s"), 1)
+        assemble_t = t if assemble_t is None else min(assemble_t, t)
+
+    print("{} macro calls".format(args.calls))
+    print("copy.deepcopy:  {:8.3f}s".format(deepcopy_t))
+    print("instantiate:    {:8.3f}s ({:.1f}x)".format(instantiate_t, deepcopy_t / instantiate_t))
+    print("assemble:       {:8.3f}s".format(assemble_t))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+'''Time, peak Python memory and disk usage of writing a mostly empty banked ROM as a memory image,
+through create_memory and through save_code_as_memory.
+
+usage: python benchmarks/bench_memory.py [-s MIB] [-u UNUSED]
+'''
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.tools import create_memory, save_code_as_memory
+
+def make_code_object(size):
+    # 64KiB banks where only every eighth one has 16KiB of code
+    rnd = random.Random(65816)
+    co = {}
+    for bank in range(size // 0x10000):
+        start = bank << 16
+        code = []
+        if bank % 8 == 0:
+            code.append((start + 0x8000, rnd.randbytes(0x4000)))
+        co["bank{}".format(bank)] = {'code': code, 'size': 0x10000, 'start': start, 'file_offset': start}
+    return co
+
+def through_create_memory(co, filename, unused_byte):
+    memory = create_memory(co, unused_byte=unused_byte)
+    with open(filename, "wb") as fp:
+        fp.write(memory.getbuffer())
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--size", type=int, default=16, help="image size in MiB")
+    parser.add_argument("-u", "--unused", type=lambda v: int(v, 0), default=0)
+    args = parser.parse_args()
+
+    co = make_code_object(args.size * 1024 * 1024)
+    fd, filename = tempfile.mkstemp(suffix=".bin")
+    os.close(fd)
+
+    try:
+        for name, fn in (("create_memory", through_create_memory), ("save_code_as_memory", save_code_as_memory)):
+            tracemalloc.start()
+            t = time.perf_counter()
+            fn(co, filename, args.unused)
+            t = time.perf_counter() - t
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            st = os.stat(filename)
+            disk = st.st_blocks * 512 if hasattr(st, "st_blocks") else st.st_size
+            print("{:20s} {:7.3f}s peak {:8.2f} MiB, {:8.2f} MiB on disk".format(name, t, peak / (1024 * 1024), disk / (1024 * 1024)))
+    finally:
+        os.remove(filename)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+'''Load time of a banked ROM's code object from pickle and from the binary object file format, both
+for the whole code object and for a single segment.
+
+usage: python benchmarks/bench_object.py [-s MIB] [-n ITERATIONS]
+'''
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.ObjectFile import ObjectFile, save_code_as_object
+from CSBCAsm.OutputFormats import code_object_with_bytes
+from bench_ihex import make_code_object
+
+def time_it(fn, iterations):
+    best = None
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        t = time.perf_counter() - t
+        best = t if best is None else min(best, t)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-s", "--size", type=int, default=16, help="image size in MiB")
+    parser.add_argument("-n", "--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    co = code_object_with_bytes(make_code_object(args.size * 1024 * 1024))
+    last = sorted(co.keys())[-1]
+
+    with tempfile.TemporaryDirectory() as d:
+        pickle_file = os.path.join(d, "out.pickle")
+        object_file = os.path.join(d, "out.obj")
+
+        def write_pickle():
+            with open(pickle_file, "wb") as fp:
+                pickle.dump(co, fp)
+
+        def load_pickle():
+            with open(pickle_file, "rb") as fp:
+                return pickle.load(fp)
+
+        def load_pickle_segment():
+            return load_pickle()[last]['code']
+
+        def load_object():
+            with ObjectFile(object_file) as obj:
+                # touch every byte, since the mmap only reads what's used
+                return sum(len(bytes(chunk)) for segment in obj.code_object().values() for _, chunk in segment['code'])
+
+        def load_object_segment():
+            with ObjectFile(object_file) as obj:
+                return [bytes(chunk) for _, chunk in obj[last]['code']]
+
+        runs = (
+            ("write pickle", write_pickle),
+            ("write object", lambda: save_code_as_object(co, object_file)),
+            ("load pickle", load_pickle),
+            ("load object", load_object),
+            ("one segment, pickle", load_pickle_segment),
+            ("one segment, object", load_object_segment),
+        )
+        for name, fn in runs:
+            print("{:22s} {:8.2f} ms".format(name, time_it(fn, args.iterations) * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+'''Time to write a ROM of full 64KiB segments as a memory image and as compressed segment files, with
+one writer and with a pool of them, for an increasing number of segments.
+
+usage: python benchmarks/bench_parallel_output.py [-j JOBS] [-n SEGMENTS ...] [-t {zlib,bz2,lzma}]
+'''
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.OutputFormats import SEGMENT_TRANSFORMS, save_code_as_memory, save_code_as_segment_files
+
+def make_code_object(segments):
+    # 64KiB banks, half random data and half repeating instructions so the compression has some work to do
+    rnd = random.Random(65816)
+    co = {}
+    for bank in range(segments):
+        start = bank << 16
+        code = [(start, rnd.randbytes(0x8000)), (start + 0x8000, bytes([0xA9, 0x01, 0x8D, 0x00, 0x20]) * 0x1999)]
+        co["bank{}".format(bank)] = {'code': code, 'size': 0x10000, 'start': start, 'file_offset': start}
+    return co
+
+def best_of(iterations, fn):
+    best = None
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        t = time.perf_counter() - t
+        best = t if best is None else min(best, t)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count())
+    parser.add_argument("-n", "--segments", type=int, nargs="+", default=[4, 16, 64, 256])
+    parser.add_argument("-t", "--transform", choices=sorted(SEGMENT_TRANSFORMS), default="zlib")
+    parser.add_argument("-i", "--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    transform, suffix = SEGMENT_TRANSFORMS[args.transform]
+    d = tempfile.mkdtemp()
+    filename = os.path.join(d, "out.bin")
+    print("{} jobs".format(args.jobs))
+    try:
+        for segments in args.segments:
+            co = make_code_object(segments)
+            for name, fn in (
+                ("mem", lambda workers: save_code_as_memory(co, filename, unused_byte=0xFF, workers=workers)),
+                ("segments", lambda workers: save_code_as_segment_files(co, filename, workers=workers)),
+                ("segments " + args.transform, lambda workers: save_code_as_segment_files(co, filename, workers=workers, transform=transform, suffix=suffix)),
+            ):
+                serial = best_of(args.iterations, lambda: fn(1))
+                parallel = best_of(args.iterations, lambda: fn(args.jobs))
+                print("{:4d} segments {:15s} {:7.3f}s  {:7.3f}s with {} jobs ({:.2f}x)".format(segments, name, serial, parallel, args.jobs, serial / parallel))
+    finally:
+        shutil.rmtree(d)
+
+if __name__ == "__main__":
+    main()
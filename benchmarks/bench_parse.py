@@ -0,0 +1,57 @@
+'''Parse throughput (lines per second) of the line-at-a-time and the streaming parser.
+
+usage: python benchmarks/bench_parse.py [-l LINES] [-n ITERATIONS]
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.Assembler import Assembler
+
+BLOCK = '''
+loop{0}:    lda #$12         ; load something
+            sta $0200, x
+            inx
+            cpx #(COUNT + 1) & $FF
+            bne loop{0}
+            /* a multi-line
+               comment */
+            jsr &far_away{0}
+data{0}:    .db "hello", 0, 1, 2, 3
+'''
+
+def make_source(nlines):
+    blocks = []
+    n = 0
+    i = 0
+    while n < nlines:
+        b = BLOCK.format(i)
+        blocks.append(b)
+        n += b.count("\n")
+        i += 1
+    return "".join(blocks)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-l", "--lines", type=int, default=50000)
+    parser.add_argument("-n", "--iterations", type=int, default=3)
+    args = parser.parse_args()
+
+    s = make_source(args.lines)
+    nlines = s.count("\n")
+    assembler = Assembler()
+
+    for name, fn in (("by line", assembler.parse_string_by_line), ("streaming", assembler.parse_string_streaming)):
+        best = None
+        for _ in range(args.iterations):
+            t = time.perf_counter()
+            fn(s, fn="bench.s")
+            t = time.perf_counter() - t
+            best = t if best is None else min(best, t)
+        print("{:10s} {:8d} lines in {:7.3f}s: {:10.0f} lines/s".format(name, nlines, best, nlines / best))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+'''Time assembling a small file N times by starting csbcasm for each one, against sending each build to
+csbcasm-server with csbcasm-client.
+
+usage: python benchmarks/bench_server.py [-n BUILDS] [-j WORKERS]
+'''
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO)
+
+SOURCE = '''
+        .segment "code", 0xC000, 0x3FE0, 0
+        .code
+        .org start
+main:   lda #$12
+        sta $0200, x
+        inx
+        bne main
+        rts
+'''
+
+def run(argv, env):
+    subprocess.run([sys.executable, "-c"] + argv, env=env, check=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--builds", type=int, default=20)
+    parser.add_argument("-j", "--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    d = tempfile.mkdtemp()
+    env = dict(os.environ, PYTHONPATH=REPO)
+    server = None
+    try:
+        socket_path = os.path.join(d, "csbcasm.sock")
+        with open(os.path.join(d, "main.s"), "w") as fp:
+            fp.write(SOURCE)
+
+        server = subprocess.Popen([sys.executable, "-c", "import sys; from CSBCAsm.tools import server_main; sys.argv[0] = 'csbcasm-server'; server_main()",
+                                   socket_path, "-j", str(args.workers)], env=env)
+        while not os.path.exists(socket_path):
+            time.sleep(0.05)
+
+        t = time.perf_counter()
+        for i in range(args.builds):
+            run(["from CSBCAsm.tools import main; main()", os.path.join(d, "main.s"), os.path.join(d, "out{}.bin".format(i))], env)
+        direct = time.perf_counter() - t
+
+        t = time.perf_counter()
+        for i in range(args.builds):
+            run(["from CSBCAsm.Client import main; main()", "--socket", socket_path, os.path.join(d, "main.s"), os.path.join(d, "client{}.bin".format(i))], env)
+        client = time.perf_counter() - t
+
+        for i in range(args.builds):
+            with open(os.path.join(d, "out{}.bin".format(i)), "rb") as a, open(os.path.join(d, "client{}.bin".format(i)), "rb") as b:
+                assert a.read() == b.read()
+
+        print("{} builds: csbcasm {:.2f}s ({:.1f} ms each), csbcasm-client {:.2f}s ({:.1f} ms each), {:.1f}x faster".format(
+              args.builds, direct, direct * 1000 / args.builds, client, client * 1000 / args.builds, direct / client))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+        shutil.rmtree(d)
+
+if __name__ == "__main__":
+    main()
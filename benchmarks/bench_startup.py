@@ -0,0 +1,52 @@
+'''Time Assembler() construction with a cold and a warm parser table cache.
+
+usage: python benchmarks/bench_startup.py [-n ITERATIONS]
+'''
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.Assembler import Assembler
+
+def time_it(fn, iterations):
+    best = None
+    for _ in range(iterations):
+        t = time.perf_counter()
+        fn()
+        t = time.perf_counter() - t
+        best = t if best is None else min(best, t)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-n", "--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    cache_dir = tempfile.mkdtemp()
+    try:
+        def cold():
+            shutil.rmtree(cache_dir, ignore_errors=True)
+            Assembler(parser_cache_dir=cache_dir)
+
+        def warm():
+            Assembler(parser_cache_dir=cache_dir)
+
+        uncached = time_it(lambda: Assembler(parser_cache=False), args.iterations)
+        cold_t = time_it(cold, args.iterations)
+        Assembler(parser_cache_dir=cache_dir)
+        warm_t = time_it(warm, args.iterations)
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+
+    print("Assembler() no cache:   {:8.2f} ms".format(uncached * 1000))
+    print("Assembler() cold cache: {:8.2f} ms".format(cold_t * 1000))
+    print("Assembler() warm cache: {:8.2f} ms".format(warm_t * 1000))
+    print("speedup (warm vs none): {:8.2f}x".format(uncached / warm_t))
+
+if __name__ == "__main__":
+    main()
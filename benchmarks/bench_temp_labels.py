@@ -0,0 +1,58 @@
+'''Scaling of temporary label declaration and resolution: N declarations of the same @1 label,
+each referenced once with @1- and once with @1+.
+
+usage: python benchmarks/bench_temp_labels.py [COUNT ...]
+'''
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.Assembler import Assembler, ProgramBuilder
+from CSBCAsm import ParserAST
+
+HEADER = '''
+        .segment "code", 0x000000, 0x1000000, 0
+        .code
+        .org start
+'''
+
+def run(assembler, count):
+    pb = ProgramBuilder(assembler, assembler.parse_string(HEADER, fn="bench.s"))
+    pb.build_code_actions()
+    pb.validate_actions()
+    segment = pb.current_segment
+    line = pb.program[-1]
+
+    # the labels are declared out of order every so often, as .org would do
+    t = time.perf_counter()
+    for i in range(count):
+        addr = 4 * (i ^ 7)
+        pb.set_build_address(addr, 3)
+        pb.declare_label_here("@1", line)
+    declare = time.perf_counter() - t
+
+    for i in range(count):
+        addr = 4 * i + 2
+        segment.make_label_references(line, ParserAST.Name("@1-", 0, 0), None, addr)
+        segment.make_label_references(line, ParserAST.Name("@1+", 0, 0), None, addr)
+
+    t = time.perf_counter()
+    segment.finalize_labels(pb)
+    resolve = time.perf_counter() - t
+    return declare, resolve
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("counts", type=int, nargs="*", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+
+    assembler = Assembler()
+    for count in args.counts:
+        declare, resolve = run(assembler, count)
+        print("{:8d} labels: declare {:8.3f}s, resolve {:8.3f}s ({:.2f} us/reference)".format(count, declare, resolve, resolve * 1e6 / (2 * count)))
+
+if __name__ == "__main__":
+    main()
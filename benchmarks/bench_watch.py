@@ -0,0 +1,66 @@
+'''Time to rebuild a program split over include files after one include changes: with a new Assembler,
+as a new csbcasm process would, against the warm Assembler that --watch keeps.
+
+usage: python benchmarks/bench_watch.py [-f FILES] [-l LINES]
+'''
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CSBCAsm.Assembler import Assembler
+
+BLOCK = '''
+file{0}_loop{1}:
+            lda #$12
+            sta $0200, x
+            inx
+            cpx #$40
+            bne file{0}_loop{1}
+'''
+
+def write_include(d, f, nlines, extra=""):
+    with open(os.path.join(d, "file{}.s".format(f)), "w") as fp:
+        fp.write("".join(BLOCK.format(f, i) for i in range(nlines // 6)) + extra)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--files", type=int, default=10)
+    parser.add_argument("-l", "--lines", type=int, default=2000, help="lines per include file")
+    args = parser.parse_args()
+
+    d = tempfile.mkdtemp()
+    try:
+        main_file = os.path.join(d, "main.s")
+        with open(main_file, "w") as fp:
+            fp.write('''
+        .segment "code", 0x010000, 0x100000, 0
+        .code
+        .org start
+''')
+            for f in range(args.files):
+                write_include(d, f, args.lines)
+                fp.write('        .include "{}"\n'.format(os.path.join(d, "file{}.s".format(f))))
+
+        warm = Assembler(keep_source_parse=True)
+        warm.assemble_file(main_file)
+
+        for i in range(3):
+            write_include(d, 0, args.lines, "            nop\n" * (i + 1))
+
+            t = time.perf_counter()
+            Assembler().assemble_file(main_file)
+            cold = time.perf_counter() - t
+
+            t = time.perf_counter()
+            warm.assemble_file(main_file)
+            print("rebuild {}: new Assembler {:7.3f}s, warm Assembler {:7.3f}s".format(i + 1, cold, time.perf_counter() - t))
+    finally:
+        shutil.rmtree(d)
+
+if __name__ == "__main__":
+    main()
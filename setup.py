@@ -24,11 +24,15 @@ setuptools.setup(
     ],
     python_requires='>=3.5',
     install_requires=[
-        "rply==0.7.7"
+        "rply==0.7.7",
+        "appdirs",
     ],
     entry_points={
         'console_scripts': [
             'csbcasm = CSBCAsm.tools:main',
+            'csbcasm-link = CSBCAsm.tools:link_main',
+            'csbcasm-server = CSBCAsm.tools:server_main',
+            'csbcasm-client = CSBCAsm.Client:main',
         ],
     },
     test_suite="tests",
@@ -0,0 +1,7 @@
+def write(fname, content):
+    with open(fname, "w") as fp:
+        fp.write(content)
+
+def read(fname):
+    with open(fname, "rb") as fp:
+        return fp.read()
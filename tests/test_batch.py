@@ -0,0 +1,81 @@
+import os
+import sys
+
+import pytest
+
+from CSBCAsm.Batch import read_manifest
+from CSBCAsm.tools import main
+
+from conftest import read, write
+
+program = '''
+        .segment "code", 0xC000, 0x3FE0, 0
+        .code
+        .org start
+main:   .include "lib.s"
+        {}
+        jmp main
+'''
+
+@pytest.fixture
+def sources(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write("lib.s", "        inc a\n")
+    for name, instruction in (("a", "dey"), ("b", "inx"), ("c", "iny")):
+        write(name + ".s", program.format(instruction))
+    return tmp_path
+
+def run(monkeypatch, *argv):
+    monkeypatch.setattr(sys, "argv", ["csbcasm"] + list(argv))
+    with pytest.raises(SystemExit) as e:
+        main()
+    return e.value.code
+
+def test_read_manifest(tmp_path):
+    manifest = tmp_path / "roms.txt"
+    write(manifest, "# test roms\na.s a.bin\n\n  'with space.s'   \"out dir/b.bin\"\n")
+    assert read_manifest(manifest) == [("a.s", "a.bin"), ("with space.s", "out dir/b.bin")]
+
+    write(manifest, "a.s\n")
+    with pytest.raises(Exception):
+        read_manifest(manifest)
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_batch(sources, monkeypatch, capsys, jobs):
+    write("roms.txt", "b.s b\nc.s c\n")
+    assert run(monkeypatch, "-j", jobs, "-f", "segments", "a.s", "a", "--manifest", "roms.txt", "-MD") == 0
+    assert read("a.code") == bytes([0x1A, 0x88, 0x4C, 0x00, 0xC0])
+    assert read("b.code") == bytes([0x1A, 0xE8, 0x4C, 0x00, 0xC0])
+    assert read("c.code") == bytes([0x1A, 0xC8, 0x4C, 0x00, 0xC0])
+    assert read("b.d").decode() == "b: \\\n  b.s \\\n  lib.s\n"
+
+    output = capsys.readouterr().out
+    for job in ("a.s -> a:", "b.s -> b:", "c.s -> c:"):
+        assert job in output
+    assert "Assembled 3 of 3 files" in output
+
+def test_batch_matches_single_builds(sources, monkeypatch):
+    assert run(monkeypatch, "a.s", "a.bin", "b.s", "b.bin") == 0
+    monkeypatch.setattr(sys, "argv", ["csbcasm", "a.s", "single.bin"])
+    main()
+    assert read("a.bin") == read("single.bin")
+    assert read("a.bin") != read("b.bin")
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_failed_jobs(sources, monkeypatch, capsys, jobs):
+    write("bad.s", program.format("bogus"))
+    assert run(monkeypatch, "-j", jobs, "a.s", "a.bin", "bad.s", "bad.bin", "b.s", "b.bin") == 1
+    assert os.path.exists("a.bin") and os.path.exists("b.bin")
+    assert not os.path.exists("bad.bin")
+
+    captured = capsys.readouterr()
+    assert "bad.s -> bad.bin: FAILED" in captured.out
+    assert "Assembled 2 of 3 files" in captured.out
+    assert "unknown opcode 'bogus'" in captured.err
+
+def test_batch_options(sources, monkeypatch):
+    assert run(monkeypatch, "a.s", "a.bin", "b.s") == 2
+    for option in (["-l", "a.lst"], ["-g", "a.dbg"], ["-MF", "a.d"], ["--watch"]):
+        monkeypatch.setattr(sys, "argv", ["csbcasm"] + option + ["a.s", "a.bin", "b.s", "b.bin"])
+        with pytest.raises(Exception):
+            main()
@@ -0,0 +1,116 @@
+import os
+
+from CSBCAsm.Assembler import Assembler
+from CSBCAsm.BuildCache import BuildCache
+
+from conftest import write
+
+def program(include):
+    return '''
+        .segment "code", 0xC000, 0x3FE0, 0
+        .code
+        .org start
+main:   .include "{}"
+        jmp main
+'''.format(include)
+
+def build(d, source, **kwargs):
+    assembler = Assembler(include_path=[d], build_cache=True, build_cache_dir=os.path.join(d, "cache"), **kwargs)
+    return assembler, assembler.assemble_string(source)
+
+def code_bytes(co):
+    return b"".join(bytes(chunk) for _, chunk in co['code']['code'])
+
+def test_build_cache_hit(tmp_path):
+    d = str(tmp_path)
+    fname = os.path.join(d, "inc.s")
+    write(fname, "        inc a\n")
+
+    assembler, co = build(d, program(fname))
+    assert (assembler.build_cache.hits, assembler.build_cache.misses) == (0, 1)
+
+    # a hit doesn't parse or build anything
+    assembler = Assembler(include_path=[d], build_cache=True, build_cache_dir=os.path.join(d, "cache"))
+    assembler.parse_string = None
+    cached = assembler.assemble_string(program(fname))
+    assert (assembler.build_cache.hits, assembler.build_cache.misses) == (1, 0)
+    assert code_bytes(cached) == code_bytes(co) == bytes([0x1A, 0x4C, 0x00, 0xC0])
+    assert cached['code']['start'] == co['code']['start']
+    assert assembler.dependencies == [fname]
+
+    assert assembler.build_cache.stats() == {'hits': 1, 'misses': 1}
+
+def test_build_cache_changed_include(tmp_path):
+    d = str(tmp_path)
+    fname = os.path.join(d, "inc.s")
+    write(fname, "        inc a\n")
+    build(d, program(fname))
+
+    write(fname, "        dey\n")
+    assembler, co = build(d, program(fname))
+    assert (assembler.build_cache.hits, assembler.build_cache.misses) == (0, 1)
+    assert code_bytes(co) == bytes([0x88, 0x4C, 0x00, 0xC0])
+
+    # both versions of the include are remembered
+    write(fname, "        inc a\n")
+    assembler, co = build(d, program(fname))
+    assert (assembler.build_cache.hits, assembler.build_cache.misses) == (1, 0)
+    assert code_bytes(co) == bytes([0x1A, 0x4C, 0x00, 0xC0])
+
+def test_build_cache_new_include_in_search_path(tmp_path, monkeypatch):
+    d = str(tmp_path / "lib")
+    os.mkdir(d)
+    write(os.path.join(d, "inc.s"), "        inc a\n")
+    # inc.s is searched for in the current directory, then sub, then d
+    os.mkdir(tmp_path / "work")
+    monkeypatch.chdir(tmp_path / "work")
+    os.mkdir("sub")
+    assembler = Assembler(include_path=["sub", d], build_cache=True, build_cache_dir=os.path.join(d, "cache"))
+    assembler.assemble_string(program("inc.s"))
+
+    write(os.path.join("sub", "inc.s"), "        dey\n")
+    assembler = Assembler(include_path=["sub", d], build_cache=True, build_cache_dir=os.path.join(d, "cache"))
+    co = assembler.assemble_string(program("inc.s"))
+    assert (assembler.build_cache.hits, assembler.build_cache.misses) == (0, 1)
+    assert code_bytes(co) == bytes([0x88, 0x4C, 0x00, 0xC0])
+
+def test_build_cache_listing_and_options(tmp_path):
+    d = str(tmp_path)
+    fname = os.path.join(d, "inc.s")
+    write(fname, "        inc a\n")
+    listing_file = os.path.join(d, "out.lst")
+
+    build(d, program(fname), listing_file=listing_file)
+    with open(listing_file, "r") as fp:
+        listing = fp.read()
+    os.remove(listing_file)
+
+    assembler, _ = build(d, program(fname), listing_file=listing_file)
+    assert assembler.build_cache.hits == 1
+    with open(listing_file, "r") as fp:
+        assert fp.read() == listing
+
+    # a build with different options isn't reused
+    assembler, _ = build(d, program(fname), listing_file=listing_file, collect_debug_info=True)
+    assert assembler.build_cache.misses == 1
+    assert assembler.debug_info[0]['symbols'] == [(0xC000, 'main', 0)]
+
+def test_build_cache_eviction(tmp_path):
+    d = str(tmp_path)
+    cache_dir = os.path.join(d, "cache")
+    def source(i):
+        return program("/dev/null").replace(".include \"/dev/null\"", ".db {}".format(i))
+    def cache_size():
+        return sum(os.path.getsize(os.path.join(cache_dir, f)) for f in os.listdir(cache_dir) if f != BuildCache.STATS_FILE)
+
+    Assembler(build_cache=True, build_cache_dir=cache_dir).assemble_string(source(0))
+    max_size = cache_size() * 3 // 2
+    for i in range(1, 4):
+        Assembler(build_cache=True, build_cache_dir=cache_dir, build_cache_size=max_size).assemble_string(source(i))
+        assert cache_size() <= max_size
+
+    # only the last build fits
+    assembler = Assembler(build_cache=True, build_cache_dir=cache_dir, build_cache_size=max_size)
+    assembler.assemble_string(source(3))
+    assembler.assemble_string(source(0))
+    assert (assembler.build_cache.hits, assembler.build_cache.misses) == (1, 1)
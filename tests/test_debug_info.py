@@ -0,0 +1,108 @@
+import os
+import random
+import sys
+import tempfile
+
+import pytest
+
+from CSBCAsm.Assembler import Assembler
+from CSBCAsm.DebugInfo import DebugInfo, save_debug_info, SYMBOL_LOCAL, SYMBOL_GLOBAL, SYMBOL_TEMPORARY
+from CSBCAsm.Errors import DebugInfoError
+from CSBCAsm.tools import main
+
+program_string = '''
+        .segment "code", 0x8000, 0x8000, 0
+        .segment "bank1", 0x18000, 0x8000, 0x8000
+        .segment "overlay", 0x9000, 0x1000, -1
+        .code
+        .global reset
+reset:  lda #$01
+@1:     dex
+        bne @1-
+        .org $9000
+data:   .fill 16, 0
+@1:     nop
+        .bank1
+        .org $18000
+far:    .db 1, 2, 3
+        .overlay
+other:  rts
+'''
+
+@pytest.fixture
+def debug_file():
+    fd, filename = tempfile.mkstemp(suffix=".dbg")
+    os.close(fd)
+    yield filename
+    os.remove(filename)
+
+def assemble_debug_info(s, filename):
+    assembler = Assembler(collect_debug_info=True)
+    assembler.assemble_string(s, "main.s")
+    save_debug_info(assembler.debug_info, filename)
+    return DebugInfo(filename)
+
+def test_symbols(debug_file):
+    with assemble_debug_info(program_string, debug_file) as info:
+        assert info.segment_names() == ["code", "overlay", "bank1"]
+        assert info.symbols_at(0x8000) == [("reset", 0x8000, "code", SYMBOL_GLOBAL)]
+        assert info.find_symbol(0x8004) == ("@1", 0x8002, "code", SYMBOL_TEMPORARY)
+        assert info.find_symbol(0x8FFF) == ("@1", 0x8002, "code", SYMBOL_TEMPORARY)
+        assert info.find_symbol(0x9005) == ("data", 0x9000, "code", SYMBOL_LOCAL)
+        assert info.find_symbol(0x9005, segment="overlay") == ("other", 0x9000, "overlay", SYMBOL_LOCAL)
+        assert info.find_symbol(0x18002) == ("far", 0x18000, "bank1", SYMBOL_LOCAL)
+        assert info.find_symbol(0x7FFF) is None
+        assert info.symbols_at(0x8001) == []
+
+        assert info.lookup("@1") == [(0x8002, "code"), (0x9010, "code")]
+        assert info.lookup("far") == [(0x18000, "bank1")]
+        assert info.lookup("missing") == []
+
+def test_lines(debug_file):
+    with assemble_debug_info(program_string, debug_file) as info:
+        assert info.file_names() == ["main.s"]
+        assert info.find_line(0x8000) == ("main.s", 7)
+        assert info.find_line(0x8001) == ("main.s", 7)
+        assert info.find_line(0x8004) == ("main.s", 9)
+        assert info.find_line(0x8005) is None
+        assert info.find_line(0x900F) == ("main.s", 11)
+        assert info.find_line(0x9000, segment="overlay") == ("main.s", 17)
+        assert info.find_line(0x18003) is None
+        assert info.find_line(0x30000) is None
+
+def test_many_symbols(debug_file):
+    rnd = random.Random(65816)
+    addresses = sorted(rnd.sample(range(0x10000, 0x20000), 2000))
+    symbols = [(address, "label{}".format(i), SYMBOL_LOCAL) for i, address in enumerate(addresses)]
+    rnd.shuffle(symbols)
+    lines = [(address, 1, "file{}.s".format(address % 7), address) for address in addresses]
+    save_debug_info([{'name': 'rom', 'start': 0x10000, 'size': 0x10000, 'file_offset': 0, 'symbols': symbols, 'lines': lines}], debug_file)
+
+    with DebugInfo(debug_file) as info:
+        for i in range(0, len(addresses) - 1, 37):
+            assert info.find_symbol(addresses[i]) == ("label{}".format(i), addresses[i], "rom", SYMBOL_LOCAL)
+            assert info.find_symbol(addresses[i + 1] - 1)[0] == "label{}".format(i)
+            assert info.lookup("label{}".format(i)) == [(addresses[i], "rom")]
+            assert info.find_line(addresses[i]) == ("file{}.s".format(addresses[i] % 7), addresses[i])
+
+def test_bad_files(debug_file):
+    with open(debug_file, "wb") as fp:
+        fp.write(b"not debug info at all, just some text")
+    with pytest.raises(DebugInfoError):
+        DebugInfo(debug_file)
+
+    assemble_debug_info(program_string, debug_file).close()
+    with open(debug_file, "r+b") as fp:
+        fp.truncate(64)
+    with pytest.raises(DebugInfoError):
+        DebugInfo(debug_file)
+
+def test_command_line(debug_file, monkeypatch):
+    with tempfile.TemporaryDirectory() as d:
+        source = os.path.join(d, "main.s")
+        with open(source, "w") as fp:
+            fp.write(program_string)
+        monkeypatch.setattr(sys, "argv", ["csbcasm", "-g", debug_file, source, os.path.join(d, "out.bin")])
+        main()
+    with DebugInfo(debug_file) as info:
+        assert info.find_line(0x8000) == (source, 7)
@@ -0,0 +1,65 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+from CSBCAsm.Assembler import Assembler
+from CSBCAsm.tools import main
+
+def write(dirname, name, content, mode="w"):
+    fname = os.path.join(dirname, name)
+    with open(fname, mode) as fp:
+        fp.write(content)
+    return fname
+
+@pytest.fixture
+def project(monkeypatch):
+    with tempfile.TemporaryDirectory() as d:
+        monkeypatch.chdir(d)
+        os.mkdir("lib")
+        os.mkdir("vendor")
+        write("lib", "macros.s", "        .once\n        inx\n")
+        write("vendor", "hw regs.s", "        .include \"macros.s\"\n        dey\n")
+        write(".", "data.bin", bytes([1, 2, 3]), mode="wb")
+        write(".", "main.s", '''
+        .segment "code", 0x8000, 0x8000, 0
+        .code
+        .include "macros.s"
+        .include "hw regs.s"
+        .incbin "data.bin"
+        .include "macros.s"
+''')
+        yield d
+
+def test_dependencies(project):
+    assembler = Assembler(include_path=["lib", "vendor"])
+    co = assembler.assemble_file("main.s")
+    assert bytes(co['code']['code'][0][1]) == bytes([0xE8, 0x88, 1, 2, 3])
+    assert assembler.dependencies == ["main.s", os.path.join("lib", "macros.s"), os.path.join("vendor", "hw regs.s"), "data.bin"]
+    assert assembler.missing_dependencies == ["macros.s", "hw regs.s", os.path.join("lib", "hw regs.s")]
+
+    # a new assembly starts a new list
+    assembler.assemble_string('''
+        .segment "code", 0x8000, 0x8000, 0
+        .code
+        nop
+''')
+    assert assembler.dependencies == []
+
+def run(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["csbcasm", "-I", "lib", "-I", "vendor"] + list(args) + ["main.s", "out.bin"])
+    main()
+
+def test_command_line(project, monkeypatch):
+    run(monkeypatch, "-MD")
+    with open("out.bin.d", "r") as fp:
+        assert fp.read() == "out.bin: \\\n  main.s \\\n  lib/macros.s \\\n  vendor/hw\\ regs.s \\\n  data.bin\n"
+
+    run(monkeypatch, "-MF", "out.d", "-MT", "rom", "-MT", "rom.lst", "-MP", "--deps-missing")
+    with open("out.d", "r") as fp:
+        lines = fp.read().splitlines()
+    assert lines[0] == "rom rom.lst: \\"
+    assert lines[-1] == "lib/hw\\ regs.s:"
+    assert "  macros.s \\" in lines
+    assert "data.bin:" in lines
@@ -0,0 +1,96 @@
+import ast
+import glob
+import os
+import random
+
+import pytest
+
+from CSBCAsm.Assembler import Assembler
+from CSBCAsm.Lexer import CreateLexer, FastLexer
+from CSBCAsm.tools import assemble_string
+
+from rply.errors import LexingError
+
+def corpus():
+    '''Every string constant in the test suite, which is mostly assembly source'''
+    sources = []
+    for fn in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "test_*.py"))):
+        with open(fn, "r") as fp:
+            tree = ast.parse(fp.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str):
+                sources.append(node.value)
+    return sources
+
+def tokens(lexer, s):
+    ret = []
+    try:
+        for t in lexer.lex(s):
+            p = t.getsourcepos()
+            ret.append((t.gettokentype(), t.getstr(), p.idx, p.lineno, p.colno))
+    except LexingError as e:
+        ret.append(('LexingError', e.getsourcepos().idx))
+    return ret
+
+rply_line_lexer = CreateLexer()
+rply_buffer_lexer = CreateLexer(whole_buffer=True).rply_lexer
+fast_line_lexer = CreateLexer(backend="fast")
+fast_buffer_lexer = CreateLexer(whole_buffer=True, backend="fast")
+
+def assert_same(s):
+    for line in s.split("\n"):
+        assert tokens(fast_line_lexer, line) == tokens(rply_line_lexer, line), line
+    assert tokens(fast_buffer_lexer, s) == tokens(rply_buffer_lexer, s)
+
+def test_corpus():
+    sources = corpus()
+    assert len(sources) > 100
+    for s in sources:
+        assert_same(s)
+
+@pytest.mark.parametrize("s", [
+    '    lda #$12, x ; comment',
+    'p"petscii" p "abc\\"def" "a\\"',
+    '&data &10 &&1 %101 % 3 %',
+    '<<>>==!=<><=>=<>!||&&**+-*/&^|~%=#<>()[],:',
+    '0x12 0x 0xg 0o17 0o8 0b101 0b 0bad $1234 $12:3456 $',
+    '@1 @1+ @12- @ \\1 \\L \\i \\v \\x',
+    '... .. . .code .a16 _x1$',
+    'nop /* one line */ nop /* two */ x',
+    'lda /* begins here',
+    '*/ ends here',
+    'end */ here',
+    '   */ not at the start',
+    '/* a\n b */ c\n/* unterminated\n\n',
+    'a // line comment\n\tb\r\n\x0bc',
+    'lda #1 \xa0',
+    '\'bad',
+])
+def test_tricky(s):
+    assert_same(s)
+
+def test_random():
+    alphabet = ['a', 'p', 'x', '0', '1', '7', '9', '.', '@', '\\', '$', '&', '%', '<', '>', '=', '!', '|',
+                '*', '/', '+', '-', '^', '~', '#', '(', ')', '[', ']', ',', ':', ';', '"', ' ', '\t', '\n',
+                'L', 'b', 'o', '_', '?']
+    rnd = random.Random(65816)
+    for _ in range(3000):
+        s = "".join(rnd.choice(alphabet) for _ in range(rnd.randint(0, 24)))
+        assert_same(s)
+
+def test_assembler_option():
+    program_string = '''
+        .segment "code", 0x0000, 0x10000, 0
+        .code
+        .org start
+main:   lda #$12 /* multi
+        line */ sta $0200, x
+        bra main
+'''
+    fast = Assembler(lexer_backend="fast").assemble_string(program_string)
+    assert fast == assemble_string(program_string)
+    assert fast['code']['code'][0][1] == bytes([0xA9, 0x12, 0x9D, 0x00, 0x02, 0x80, 0xF9])
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        Assembler(lexer_backend="flex")
@@ -0,0 +1,91 @@
+import os
+import tempfile
+
+import pytest
+
+from CSBCAsm.Assembler import Assembler
+from CSBCAsm.Errors import *
+
+def write(dirname, name, content):
+    fname = os.path.join(dirname, name)
+    with open(fname, "w") as fp:
+        fp.write(content)
+    return fname
+
+def test_repeated_include_is_parsed_once():
+    with tempfile.TemporaryDirectory() as d:
+        write(d, "inc.s", "        inx\n        dey\n")
+        program_string = '''
+        .segment "code", 0x0000, 0x10000, 0
+        .code
+        .org start
+        .include "inc.s"
+        nop
+        .include "inc.s"
+'''
+        assembler = Assembler(include_path=[d])
+        parsed = []
+        parse_include = assembler.parse_include
+        def counting_parse_include(s, fn, included_from):
+            parsed.append(fn)
+            return parse_include(s, fn, included_from)
+        assembler.parse_include = counting_parse_include
+
+        co = assembler.assemble_string(program_string)
+        assert co['code']['code'][0][1] == bytes([0xE8, 0x88, 0xEA, 0xE8, 0x88])
+        assert parsed == ["inc.s"]
+
+def test_each_use_has_its_own_lines():
+    with tempfile.TemporaryDirectory() as d:
+        fname = write(d, "inc.s", "        inx\n")
+        assembler = Assembler()
+        first_parent, second_parent = assembler.parse_string("    nop\n    nop\n", fn="main.s")
+        first = assembler.parse_include_file(fname, "inc.s", first_parent)
+        second = assembler.parse_include_file(fname, "inc.s", second_parent)
+        assert first[0] is not second[0]
+        assert first[0].statement_list is not second[0].statement_list
+        assert first[0].included_from is first_parent
+        assert second[0].included_from is second_parent
+        assert [l.line_number for l in second] == [l.line_number for l in first] == [1]
+        assert str(first[0]) == str(second[0])
+
+def test_changed_file_is_reparsed():
+    with tempfile.TemporaryDirectory() as d:
+        fname = write(d, "inc.s", "        inx\n")
+        assembler = Assembler()
+        first = assembler.parse_include_file(fname, "inc.s", None)
+        write(d, "inc.s", "        inx\n        iny\n")
+        second = assembler.parse_include_file(fname, "inc.s", None)
+        assert (len(first), len(second)) == (1, 2)
+
+def test_once():
+    with tempfile.TemporaryDirectory() as d:
+        write(d, "header.s", "        .once\nVALUE = 5\n        lda #VALUE\n")
+        write(d, "other.s", "        .include \"header.s\"\n        inx\n")
+        program_string = '''
+        .segment "code", 0x0000, 0x10000, 0
+        .code
+        .org start
+        .include "header.s"
+        .include "other.s"
+        .include "header.s"
+        .once
+'''
+        co = Assembler(include_path=[d]).assemble_string(program_string)
+        assert co['code']['code'][0][1] == bytes([0xA9, 0x05, 0xE8])
+
+def test_without_once_equates_are_redefined():
+    with tempfile.TemporaryDirectory() as d:
+        write(d, "header.s", "VALUE = 5\n")
+        program_string = '''
+        .include "header.s"
+        .include "header.s"
+'''
+        with pytest.raises(LabelRedefinitionError):
+            Assembler(include_path=[d]).assemble_string(program_string)
+
+def test_once_parameters():
+    with tempfile.TemporaryDirectory() as d:
+        write(d, "header.s", "        .once 1\n")
+        with pytest.raises(IncorrectParameterCountError):
+            Assembler(include_path=[d]).assemble_string('    .include "header.s"\n')
@@ -0,0 +1,114 @@
+import json
+import os
+import sys
+
+import pytest
+
+from CSBCAsm.OutputFormats import read_intel_hex_image
+from CSBCAsm.tools import assemble_string, create_memory, update_memory_file, update_intel_hex_file, save_code_as_intel_hex, main
+
+from conftest import read
+
+def program(value, extra=""):
+    return '''
+        .segment "code", 0x8000, 0x8000, 0
+        .code
+        .org start
+        lda #${:02X}
+        .org $9800
+        .fill 0x2000, 0xAA
+        .org $C000
+        nop
+{}
+'''.format(value, extra)
+
+@pytest.fixture
+def output_file(tmp_path):
+    return str(tmp_path / "out.bin")
+
+def test_new_file(output_file):
+    code_object = assemble_string(program(1))
+    size = len(create_memory(code_object).getvalue())
+    assert update_memory_file(code_object, output_file, unused_byte=0xFF) == [[0, size]]
+    assert read(output_file) == create_memory(code_object, unused_byte=0xFF).getvalue()
+
+def test_only_changed_sectors(output_file):
+    update_memory_file(assemble_string(program(1)), output_file)
+    assert update_memory_file(assemble_string(program(1)), output_file) == []
+
+    code_object = assemble_string(program(2))
+    assert update_memory_file(code_object, output_file, sector_size=0x400) == [[0, 0x400]]
+    assert read(output_file) == create_memory(code_object).getvalue()
+
+    # the old code in the sector has to be replaced by the unused value
+    code_object = assemble_string(program(2).replace(".fill 0x2000", ".fill 0x1F00"))
+    assert update_memory_file(code_object, output_file, sector_size=0x400) == [[0x1800 + 0x1C00, 0x1800 + 0x2000]]
+    assert read(output_file) == create_memory(code_object).getvalue()
+
+def test_size_changes(output_file):
+    update_memory_file(assemble_string(program(1)), output_file)
+
+    code_object = assemble_string(program(1, "        .fill 0x1800, 0x11"))
+    assert update_memory_file(code_object, output_file) == [[0x4000, 0x5801]]
+    assert read(output_file) == create_memory(code_object).getvalue()
+
+    code_object = assemble_string(program(1))
+    assert update_memory_file(code_object, output_file) == []
+    assert read(output_file) == create_memory(code_object).getvalue()
+
+def test_command_line(output_file, monkeypatch):
+    source = output_file + ".s"
+    with open(source, "w") as fp:
+        fp.write(program(1))
+    args = ["csbcasm", "--incremental-output", "--sector-size", "0x1000", source, output_file]
+    monkeypatch.setattr(sys, "argv", args)
+    main()
+    with open(source, "w") as fp:
+        fp.write(program(3))
+    main()
+
+    with open(output_file + ".dirty.json", "r") as fp:
+        dirty_list = json.load(fp)
+    assert dirty_list == {'file': output_file, 'size': 0x4001, 'sector_size': 0x1000, 'dirty': [{'start': 0, 'end': 0x1000}]}
+
+@pytest.mark.parametrize("strip", [False, True])
+def test_intel_hex(output_file, strip):
+    hex_file = output_file + ".hex"
+    code_object = assemble_string(program(1))
+    size = len(create_memory(code_object).getvalue())
+    assert update_intel_hex_file(code_object, hex_file, strip=strip, sector_size=0x400) == [[0, size]]
+    assert read_intel_hex_image(hex_file) == create_memory(code_object).getvalue()
+    assert update_intel_hex_file(code_object, hex_file, strip=strip, sector_size=0x400) == []
+
+    code_object = assemble_string(program(2).replace(".fill 0x2000", ".fill 0x1F00"))
+    assert update_intel_hex_file(code_object, hex_file, strip=strip, sector_size=0x400) == [[0, 0x400], [0x1800 + 0x1C00, 0x1800 + 0x2000]]
+    written = read(hex_file)
+    save_code_as_intel_hex(code_object, hex_file, strip=strip)
+    assert read(hex_file) == written
+
+def test_intel_hex_invalid_file(output_file):
+    with open(output_file, "w") as fp:
+        fp.write(":0100000001FF\n")
+    with pytest.raises(ValueError):
+        read_intel_hex_image(output_file)
+
+    code_object = assemble_string(program(1))
+    assert update_intel_hex_file(code_object, output_file) == [[0, 0x4001]]
+    assert read_intel_hex_image(output_file) == create_memory(code_object).getvalue()
+
+def test_intel_hex_command_line(output_file, monkeypatch):
+    source = output_file + ".s"
+    with open(source, "w") as fp:
+        fp.write(program(1))
+    monkeypatch.setattr(sys, "argv", ["csbcasm", "-f", "ihex", "--incremental-output", "--sector-size", "0x1000", source, output_file])
+    main()
+    with open(source, "w") as fp:
+        fp.write(program(3))
+    main()
+
+    with open(output_file + ".dirty.json", "r") as fp:
+        assert json.load(fp)['dirty'] == [{'start': 0, 'end': 0x1000}]
+
+    monkeypatch.setattr(sys, "argv", ["csbcasm", "-f", "s19", "--incremental-output", source, output_file])
+    with pytest.raises(Exception):
+        main()
@@ -0,0 +1,72 @@
+import os
+import tempfile
+
+import pytest
+
+from CSBCAsm.tools import assemble_string, create_memory, save_code_as_intel_hex
+
+def read_intel_hex(filename, unused_byte=0x00):
+    '''Returns the memory image in the file and the length of each data record'''
+    memory = bytearray()
+    record_sizes = []
+    high_addr = 0
+    with open(filename, "r") as fp:
+        for line in fp:
+            assert line[0] == ":"
+            record = bytes.fromhex(line[1:].strip())
+            assert sum(record) & 0xFF == 0
+            n, addr, record_type, data = record[0], int.from_bytes(record[1:3], 'big'), record[3], record[4:-1]
+            assert n == len(data)
+            if record_type == 0x00:
+                addr += high_addr << 16
+                if len(memory) < addr + n:
+                    memory.extend(bytes([unused_byte]) * (addr + n - len(memory)))
+                memory[addr:addr + n] = data
+                record_sizes.append(n)
+                assert (addr & 0xFFFF) + n <= 0x10000
+            elif record_type == 0x04:
+                high_addr = int.from_bytes(data, 'big')
+            else:
+                assert record_type == 0x01
+                return memory, record_sizes
+    assert False, "no end of file record"
+
+def hex_file(code_object, **kwargs):
+    fd, filename = tempfile.mkstemp(suffix=".hex")
+    os.close(fd)
+    try:
+        save_code_as_intel_hex(code_object, filename, **kwargs)
+        return read_intel_hex(filename, kwargs.get('unused_byte', 0x00))
+    finally:
+        os.remove(filename)
+
+program_string = '''
+        .segment "code", 0x8000, 0x8000, 0
+        .segment "high", 0x10000, 0x20000, 0x8000
+        .code
+        .org start
+        .fill 0x1234, 0x55
+        .org $A000
+        .fill 0x8, 0xAA
+        .high
+        .org $17FF0
+        .fill 0x40, 0x12
+'''
+
+@pytest.mark.parametrize("record_size", [1, 16, 32, 100, 255])
+def test_records(record_size):
+    code_object = assemble_string(program_string)
+    memory, record_sizes = hex_file(code_object, record_size=record_size)
+    assert memory == create_memory(code_object).getvalue()
+    assert max(record_sizes) == record_size
+
+@pytest.mark.parametrize("unused_byte", [0x00, 0xFF])
+def test_strip(unused_byte):
+    code_object = assemble_string(program_string)
+    memory, record_sizes = hex_file(code_object, strip=True, unused_byte=unused_byte, record_size=255)
+    assert memory == create_memory(code_object, unused_byte=unused_byte).getvalue()
+    assert sum(record_sizes) < 0x1234 + 0x8 + 0x40 + 255 * 4
+
+def test_bad_record_size():
+    with pytest.raises(ValueError):
+        hex_file({}, record_size=256)
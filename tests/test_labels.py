@@ -171,3 +171,21 @@ main:   bra @1
     print(co)
     assert co['code']['code'][0][1] == bytes([0x80, 0x03, 0x4C, 0x00, 0xC0, 0x80, 0x00, 0x80, 0xFE, 0xEA])
 
+
+def test_tmp_label_out_of_order():
+    program_string = '''
+        .segment "code", 0xC000, 0x3FE0, 0
+        .code
+        .org $C010
+@1:     nop
+        bra @1-
+        .org $C000
+@1:     nop
+        bra @1+
+'''
+
+    co = assemble_string(program_string)
+    assert [(addr, bytes(chunk)) for addr, chunk in co['code']['code']] == [
+        (0xC000, bytes([0xEA, 0x80, 0x0D])),
+        (0xC010, bytes([0xEA, 0x80, 0xFD])),
+    ]
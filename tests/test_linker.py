@@ -0,0 +1,165 @@
+import os
+import pickle
+import sys
+import tempfile
+
+import pytest
+
+from CSBCAsm.Assembler import Assembler
+from CSBCAsm.Errors import LinkError, ObjectFileError, RelativeBranchOutOfRangeError, UndefinedLabelError
+from CSBCAsm.Linker import Linker
+from CSBCAsm.ObjectFile import ObjectFile
+from CSBCAsm.OutputFormats import OutputOptions, write_output, code_object_with_bytes, create_memory
+from CSBCAsm.tools import main, link_main
+
+segments = '''
+        .segment "code", 0xC000, 0x3FE0, 0
+        .segment "vectors", 0xFFE0, 0x20, 0x3FE0
+'''
+
+main_module = segments + '''
+        .code
+        .global add_one
+        .global table
+        .global main
+        .org start
+main:   lda #<table
+        ldx #>table
+        jsr add_one
+        jsl &add_one
+        bra add_one
+        brl add_one
+        .dw add_one, table+2
+        .db "AB", <add_one, >table
+        .dl &add_one
+        .vectors
+        .org $FFFC
+        .dw main
+'''
+
+lib_module = segments + '''
+        .code
+        .global add_one
+        .global table
+        .org $C030
+add_one: inc a
+        rts
+table:  .db 1, 2, 3
+'''
+
+@pytest.fixture
+def objects():
+    with tempfile.TemporaryDirectory() as d:
+        def assemble(name, source):
+            assembler = Assembler(relocatable=True)
+            code_object = assembler.assemble_string(source, name + ".s")
+            filename = os.path.join(d, name + ".obj")
+            write_output("object", code_object, filename, OutputOptions(link_info=assembler.link_info))
+            return filename
+        yield assemble
+
+def link(*filenames):
+    linker = Linker()
+    for filename in filenames:
+        linker.add_object(filename)
+    return code_object_with_bytes(linker.link())
+
+def whole_program():
+    # the two modules assembled as one file
+    return main_module.replace("        .global add_one\n        .global table\n", "") + lib_module.replace(segments, "")
+
+def test_link_matches_single_assembly(objects):
+    linked = link(objects("main", main_module), objects("lib", lib_module))
+    assert linked == code_object_with_bytes(Assembler().assemble_string(whole_program()))
+
+def test_link_info(objects):
+    with ObjectFile(objects("main", main_module)) as obj:
+        link_info = obj.link_info()
+    assert link_info['symbols'] == [('main', 'code', 0xC000, 2)]
+    assert link_info['externals'] == ['add_one', 'table']
+    assert [(r['address'], r['width']) for r in link_info['relocations']] == \
+        [(0xC001, 1), (0xC003, 1), (0xC005, 2), (0xC008, 3), (0xC00C, 1), (0xC00E, 2), (0xC010, 2), (0xC012, 2), (0xC016, 1), (0xC017, 1), (0xC018, 3)]
+
+    with ObjectFile(objects("lib", lib_module)) as obj:
+        assert obj.link_info()['symbols'] == [('add_one', 'code', 0xC030, 2), ('table', 'code', 0xC032, 2)]
+
+def test_undeclared_labels(objects):
+    # only labels named with .global can come from another module
+    with pytest.raises(UndefinedLabelError):
+        objects("main", main_module.replace("        .global table\n", ""))
+
+    main_object = objects("main", main_module)
+    with pytest.raises(LinkError):
+        link(main_object)
+    with pytest.raises(LinkError):
+        link(main_object, objects("lib", lib_module), objects("lib2", lib_module.replace("$C030", "$D000")))
+
+def test_link_errors(objects):
+    with pytest.raises(LinkError):
+        link(objects("lib", lib_module), objects("lib2", lib_module.replace(".global add_one\n", "").replace("add_one", "sub_one")))
+    with pytest.raises(LinkError):
+        link(objects("main", main_module), objects("lib", lib_module.replace("0x3FE0, 0\n", "0x3FE0, 0x10\n", 1)))
+
+    far = lib_module.replace("$C030", "$D000")
+    with pytest.raises(RelativeBranchOutOfRangeError):
+        link(objects("main", main_module), objects("lib", far))
+
+    with pytest.raises(UndefinedLabelError):
+        objects("fill", segments + '''
+        .code
+        .global value
+        .org start
+        .fillw 4, value
+''')
+
+def test_absolute_objects(objects):
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "vectors.obj")
+        write_output("object", Assembler().assemble_string(segments + "        .vectors\n        .org $FFFE\n        .dw $C000\n"), filename)
+        linked = link(filename, objects("lib", lib_module))
+    assert linked['vectors']['code'] == [(0xFFFE, bytes([0x00, 0xC0]))]
+    assert linked['code']['code'] == [(0xC030, bytes([0x1A, 0x60, 1, 2, 3]))]
+
+def test_command_line(monkeypatch):
+    with tempfile.TemporaryDirectory() as d:
+        for name, source in (("main", main_module), ("lib", lib_module)):
+            with open(os.path.join(d, name + ".s"), "w") as fp:
+                fp.write(source)
+            monkeypatch.setattr(sys, "argv", ["csbcasm", "-c", os.path.join(d, name + ".s"), os.path.join(d, name + ".obj")])
+            main()
+
+        output = os.path.join(d, "rom.bin")
+        monkeypatch.setattr(sys, "argv", ["csbcasm-link", "-o", output, os.path.join(d, "main.obj"), os.path.join(d, "lib.obj")])
+        link_main()
+        with open(output, "rb") as fp:
+            assert fp.read() == create_memory(Assembler().assemble_string(whole_program())).getvalue()
+
+def test_expressions(objects):
+    # names from the module are stored as their values, the external ones as names, with the operators between
+    module = segments + '''
+        .code
+        .global table
+        .org start
+here:   lda #((table + 2) * 2 - <here) & $FF
+        ldx #>(table - here) | 1
+        .dw -(table >> 1), table == $C032, ~table
+'''
+    linked = link(objects("expr", module), objects("lib", lib_module))
+    single = Assembler().assemble_string(module.replace("        .global table\n", "") + lib_module.replace(segments, "").replace("        .global add_one\n        .global table\n", ""))
+    assert linked == code_object_with_bytes(single)
+
+def test_bad_link_info(objects):
+    filename = objects("main", main_module)
+    with open(filename, "rb") as fp:
+        data = bytearray(fp.read())
+    with ObjectFile(filename) as obj:
+        start, length = obj._link_offset, obj._link_length
+
+    # a link info section that isn't made of the tables is rejected, whatever it holds
+    for bad in (data[:start] + pickle.dumps({'symbols': []}).ljust(length, b"\0") + data[start + length:],
+                data[:start] + bytes([0xFF]) * length + data[start + length:]):
+        with open(filename, "wb") as fp:
+            fp.write(bad)
+        with ObjectFile(filename) as obj:
+            with pytest.raises(ObjectFileError):
+                obj.link_info()
@@ -0,0 +1,162 @@
+import os
+import tempfile
+import zlib
+
+import pytest
+
+from CSBCAsm import Listing
+from CSBCAsm.Assembler import Assembler
+from CSBCAsm.Errors import IncorrectParameterCountError
+
+program_string = '''
+        .segment "high", 0xC000, 0x4000, 0x4000
+        .segment "code", 0x8000, 0x4000, 0
+        .code
+        .org $9000
+        lda #$12
+        .high
+        .org $C000
+        .dw $ABCD
+        .code
+        .org $8000
+        ldx #$34
+        .fill 0x20, 0x55
+        .org $9000 + 2
+        nop
+'''
+
+def assemble_with_listing(s):
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "out.lst")
+        Assembler(listing_file=filename).assemble_string(s)
+        with open(filename, "r") as fp:
+            return fp.read()
+
+def addresses(listing):
+    return [int(line[:2] + line[3:7], 16) for line in listing.splitlines() if len(line) > 7 and line[2] == ":"]
+
+def test_sorted_by_address():
+    listing = assemble_with_listing(program_string)
+    lines = listing.splitlines()
+
+    # the segment declarations come first, then each segment by start address with its code in address order
+    assert lines[0].startswith("\t\t;; segment \"high\"") and lines[1].startswith("\t\t;; segment \"code\"")
+    assert addresses(listing) == [0x8000] + list(range(0x8002, 0x8022, 4)) + [0x9000, 0x9002, 0xC000]
+    assert lines.index("00:8000 A2 34                  LDX #0x34") < lines.index("00:9000 A9 12                  LDA #0x12")
+
+def test_spilled_in_pieces(monkeypatch):
+    listing = assemble_with_listing(program_string)
+    monkeypatch.setattr(Listing, "LISTING_BLOCK_SIZE", 7)
+    assert assemble_with_listing(program_string) == listing
+
+@pytest.mark.parametrize("byte_values, expected", [([], ""), ([0x00, 0x7F, 0xFF], "00 7F FF"), ([0xAA55], "AA55")])
+def test_hex_columns(byte_values, expected):
+    class Writer():
+        def spill(self, text):
+            self.text = text
+            return 0, len(text)
+    writer = Writer()
+    lb = Listing.ListingBuffer(writer, [], 0, 1)
+    lb.format_with_address_and_bytes(0x12ABCD, byte_values, "NOP")
+    lb.flush()
+    assert writer.text.startswith("12:ABCD " + expected + " ")
+    assert writer.text.endswith(" NOP\n")
+    assert writer.text.index("NOP") == Listing.LISTING_SOURCE_COLUMN - 1
+
+def test_nolist():
+    listing = assemble_with_listing('''
+        .segment "code", 0x8000, 0x4000, 0
+        .code
+        lda #$12
+        .nolist
+        ldx #$34
+        .org $8100
+        .fill 0x100, 0x55
+        .list
+        ldy #$56
+        .nolist
+        .list
+        nop
+''')
+    assert "LDA #0x12" in listing and "LDY #0x56" in listing and "NOP" in listing
+    assert "LDX" not in listing and ".FILL" not in listing and "0x8100" not in listing
+    assert addresses(listing) == [0x8000, 0x8200, 0x8202]
+
+def test_nolist_in_macro():
+    listing = assemble_with_listing('''
+        .segment "code", 0x8000, 0x4000, 0
+        .code
+quiet:  .macro
+        .nolist
+        .db 1, 2, 3
+        .list
+        .db 4
+        .endmacro
+        quiet
+        .db 5
+''')
+    assert ".DB 0x01" not in listing
+    assert ".DB 0x04" in listing and ".DB 0x05" in listing
+    assert addresses(listing) == [0x8003, 0x8004]
+
+def test_nolist_in_if():
+    listing = assemble_with_listing('''
+        .segment "code", 0x8000, 0x4000, 0
+        .code
+        .if 1
+        .nolist
+        .db 5
+        .endif
+        .db 6
+        .list
+        .if 0
+        .db 7
+        .else
+        .nolist
+        .db 8
+        .endif
+''')
+    assert ".DB" not in listing
+    assert addresses(listing) == []
+
+def test_nolist_whole_program():
+    listing = assemble_with_listing('''
+        .nolist
+        .segment "code", 0x8000, 0x4000, 0
+        .code
+        lda #$12
+''')
+    assert listing == ""
+
+def test_list_parameters():
+    with pytest.raises(IncorrectParameterCountError):
+        assemble_with_listing('''
+        .segment "code", 0x8000, 0x4000, 0
+        .code
+        .nolist 1
+''')
+
+def test_summary():
+    program = '''
+        .segment "code", 0x8000, 0x4000, 0
+        .code
+        .fill 0x1000, 0x55
+        .fill 3, 0x66
+        .fillw 0x10, $1234
+        .db "hello", 1, 2
+        .db 1
+        lda #$12
+'''
+    with tempfile.TemporaryDirectory() as d:
+        filename = os.path.join(d, "out.lst")
+        Assembler(listing_file=filename, listing_summary=True).assemble_string(program)
+        with open(filename, "r") as fp:
+            lines = fp.read().splitlines()
+
+    assert addresses("\n".join(lines)) == [0x8000, 0x9000, 0x9003, 0x9023, 0x902A, 0x902B]
+    assert lines[-6].startswith("00:8000 55 55 55 55            .FILL 0x1000, 0x55")
+    assert lines[-6].endswith(";; 0x1000 bytes, crc32 0x{:08X}".format(zlib.crc32(bytes([0x55]) * 0x1000)))
+    assert lines[-5] == "00:9000 66 66 66               .FILL 0x0003, 0x66"
+    assert lines[-4].endswith(";; 0x0020 bytes, crc32 0x{:08X}".format(zlib.crc32(bytes([0x34, 0x12]) * 0x10)))
+    assert lines[-3].startswith("00:9023 68 65 6C 6C            .DB")
+    assert lines[-3].endswith(";; 0x0007 bytes, crc32 0x{:08X}".format(zlib.crc32(b"hello\x01\x02")))
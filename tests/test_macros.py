@@ -324,3 +324,34 @@ main:
                                                 0xB1, 0x02, 0xE6, 0x33,
                                                 0xB1, 0x03, 0xE6, 0x44])
 
+
+def test_macro_template_instantiation():
+    program_string = '''
+    .segment "code", 0x0000, 0x10000, 0
+    .code
+    .org start
+store: .macro dest, value
+        lda #value
+        sta dest, x
+    .endmacro
+main:
+    store $1234, 1
+    store $5678, 2
+'''
+    assembler = Assembler.Assembler()
+    pb = Assembler.ProgramBuilder(assembler, assembler.parse_string(program_string))
+    pb.build_code_actions()
+    pb.validate_actions()
+    pb.finalize_labels()
+    co = pb.generate_code_object(None)
+    assert co['code']['code'][0][1] == bytes([0xA9, 0x01, 0x9D, 0x34, 0x12, 0xA9, 0x02, 0x9D, 0x78, 0x56])
+
+    # the captured actions are left untouched, and each call has its own expressions but shares the source lines
+    macro = pb.get_macro("store")
+    template = macro.actions[1]
+    assert template.statement.operands.value[0].actual_value is None
+    first, second = [a for a in pb.actions if isinstance(a, Assembler.CallMacroAction)]
+    assert first.actions[1].line is second.actions[1].line is template.line
+    assert first.actions[1].statement.operands.value[0] is not second.actions[1].statement.operands.value[0]
+    assert first.actions[1].statement.operands.value[0].eval() == 0x1234
+    assert second.actions[1].statement.operands.value[0].eval() == 0x5678
@@ -0,0 +1,40 @@
+import os
+import tempfile
+
+import pytest
+
+from CSBCAsm.tools import assemble_string, create_memory, save_code_as_memory
+
+program_string = '''
+        .segment "code", 0x8000, 0x8000, 0
+        .segment "empty", 0x10000, 0x10000, 0x8000
+        .segment "high", 0x20000, 0x20000, 0x28000
+        .code
+        .org start
+        lda #$01
+        .org $A000
+        .fill 0x100, 0xAA
+        .high
+        .org $30000
+        .fill 0x40, 0x12
+'''
+
+def memory_file(code_object, unused_byte):
+    fd, filename = tempfile.mkstemp(suffix=".bin")
+    os.close(fd)
+    try:
+        save_code_as_memory(code_object, filename, unused_byte=unused_byte)
+        with open(filename, "rb") as fp:
+            return fp.read()
+    finally:
+        os.remove(filename)
+
+@pytest.mark.parametrize("unused_byte", [0x00, 0xEA])
+def test_same_as_create_memory(unused_byte):
+    code_object = assemble_string(program_string)
+    memory = memory_file(code_object, unused_byte)
+    assert len(memory) == 0x28000 + 0x10040
+    assert memory == create_memory(code_object, unused_byte=unused_byte).getvalue()
+
+def test_empty():
+    assert memory_file({}, 0xFF) == b''
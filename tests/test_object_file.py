@@ -0,0 +1,81 @@
+import os
+import pickle
+import struct
+import tempfile
+
+import pytest
+
+from CSBCAsm.Errors import ObjectFileError
+from CSBCAsm.ObjectFile import ObjectFile, save_code_as_object, OBJECT_FILE_VERSION
+from CSBCAsm.tools import assemble_string, code_object_with_bytes
+
+program_string = '''
+        .segment "code", 0xC000, 0x3FE0, 0
+        .segment "vectors", 0xFFE0, 0x20, 0x3FE0
+        .segment "ram", 0x0000, 0x2000, -1
+        .segment "empty", 0x10000, 0x10000, 0x4000
+        .code
+        .org start
+main:   lda #$01
+        bra main
+        .org $D000
+        .fill 0x33, 0xAA
+        .vectors
+        .org $FFFC
+        .dw $C000
+        .ram
+        .fill 0x10, 0x34
+'''
+
+@pytest.fixture
+def object_file():
+    fd, filename = tempfile.mkstemp(suffix=".obj")
+    os.close(fd)
+    yield filename
+    os.remove(filename)
+
+def test_round_trip(object_file):
+    code_object = assemble_string(program_string)
+    save_code_as_object(code_object, object_file)
+    with ObjectFile(object_file) as obj:
+        assert obj.segment_names() == list(code_object.keys())
+        assert code_object_with_bytes(obj.code_object()) == code_object_with_bytes(code_object)
+        chunk = obj["code"]['code'][1][1]
+        assert isinstance(chunk, memoryview)
+        assert chunk == bytes([0xAA] * 0x33)
+        assert obj["ram"]['file_offset'] == -1
+        assert obj["empty"]['code'] == []
+        del chunk
+
+def test_lazy_segments(object_file):
+    save_code_as_object(assemble_string(program_string), object_file)
+    with ObjectFile(object_file) as obj:
+        assert "vectors" in obj
+        assert "code" not in obj._segments["vectors"]
+        assert obj["vectors"]['code'][0][0] == 0xFFFC
+        assert "code" not in obj._segments["code"]
+
+def test_empty(object_file):
+    save_code_as_object({}, object_file)
+    with ObjectFile(object_file) as obj:
+        assert obj.code_object() == {}
+
+def test_bad_files(object_file):
+    with open(object_file, "wb") as fp:
+        pickle.dump({}, fp)
+    with pytest.raises(ObjectFileError):
+        ObjectFile(object_file)
+
+    save_code_as_object(assemble_string(program_string), object_file)
+    with open(object_file, "r+b") as fp:
+        fp.seek(8)
+        fp.write(struct.pack("<H", OBJECT_FILE_VERSION + 1))
+    with pytest.raises(ObjectFileError):
+        ObjectFile(object_file)
+
+    save_code_as_object(assemble_string(program_string), object_file)
+    with open(object_file, "r+b") as fp:
+        fp.truncate(os.path.getsize(object_file) - 1)
+    with ObjectFile(object_file) as obj:
+        with pytest.raises(ObjectFileError):
+            obj.code_object()
@@ -0,0 +1,111 @@
+import os
+import pickle
+import sys
+
+import pytest
+
+from CSBCAsm.OutputFormats import OUTPUT_FORMATS, OutputOptions, write_output, segment_filename
+from CSBCAsm.tools import assemble_string, create_memory, main, save_code_as_srec, save_code_as_segment_files
+
+program_string = '''
+        .segment "code", 0x8000, 0x8000, 0
+        .segment "empty", 0x10000, 0x10000, 0x8000
+        .segment "high", 0x20000, 0x20000, 0x18000
+        .segment "ram", 0x0000, 0x2000, -1
+        .code
+        .org start
+        lda #$01
+        .org $A000
+        .fill 0x1000, 0xAA
+        .high
+        .org $2FFF0
+        .fill 0x40, 0x12
+        .ram
+        .fill 0x10, 0x34
+'''
+
+def read_srec(filename):
+    '''Returns the records in the file as a list of (type, address, data)'''
+    records = []
+    with open(filename, "r") as fp:
+        for line in fp:
+            assert line[0] == "S"
+            record_type = int(line[1])
+            record = bytes.fromhex(line[2:].strip())
+            assert record[0] == len(record) - 1
+            assert sum(record) & 0xFF == 0xFF
+            address_size = {0: 2, 1: 2, 2: 3, 3: 4, 5: 2, 6: 3, 7: 4, 8: 3, 9: 2}[record_type]
+            records.append((record_type, int.from_bytes(record[1:1 + address_size], 'big'), record[1 + address_size:-1]))
+    return records
+
+@pytest.mark.parametrize("address_size, record_size", [(3, 32), (4, 16), (3, 251), (4, 1)])
+def test_srec(tmp_path, address_size, record_size):
+    code_object = assemble_string(program_string)
+    filename = os.path.join(tmp_path, "out.s")
+    save_code_as_srec(code_object, filename, address_size=address_size, record_size=record_size)
+    records = read_srec(filename)
+
+    assert records[0] == (0, 0, b"CSBCAsm")
+    data_records = [r for r in records if r[0] == address_size - 1]
+    assert len(records) == len(data_records) + 3
+    assert records[-2] == (5, len(data_records), b"")
+    assert records[-1] == (11 - address_size, 0, b"")
+    assert max(len(r[2]) for r in data_records) == record_size
+
+    memory = create_memory(code_object, unused_byte=0x55).getvalue()
+    image = bytearray([0x55]) * len(memory)
+    for _, address, data in data_records:
+        image[address:address + len(data)] = data
+    assert image == memory
+
+def test_srec_address_range(tmp_path):
+    code_object = assemble_string(program_string)
+    with pytest.raises(ValueError):
+        save_code_as_srec(code_object, os.path.join(tmp_path, "out.s19"), address_size=2)
+    with pytest.raises(ValueError):
+        save_code_as_srec(code_object, os.path.join(tmp_path, "out.s28"), address_size=3, record_size=252)
+
+@pytest.mark.parametrize("unused_byte", [0x00, 0xFF])
+def test_segment_files(tmp_path, unused_byte):
+    code_object = assemble_string(program_string)
+    filename = os.path.join(tmp_path, "out.bin")
+    filenames = save_code_as_segment_files(code_object, filename, unused_byte=unused_byte)
+    assert filenames == [segment_filename(filename, s) for s in ("code", "empty", "high")]
+    assert os.path.basename(filenames[0]) == "out.code.bin"
+
+    memory = create_memory(code_object, unused_byte=unused_byte).getvalue()
+    image = bytearray([unused_byte]) * len(memory)
+    for segment, fn in zip(("code", "empty", "high"), filenames):
+        with open(fn, "rb") as fp:
+            data = fp.read()
+        offset = code_object[segment]['file_offset']
+        image[offset:offset + len(data)] = data
+    assert image == memory
+    assert os.path.getsize(filenames[1]) == 0
+
+@pytest.mark.parametrize("format_name", sorted(OUTPUT_FORMATS))
+def test_registry(tmp_path, format_name):
+    code_object = assemble_string(program_string)
+    filename = os.path.join(tmp_path, "out")
+    if format_name == "s19":
+        code_object = {'code': code_object['code']}
+    write_output(format_name, code_object, filename, OutputOptions(unused_byte=0xFF))
+    if format_name == "segments":
+        assert os.path.exists(segment_filename(filename, "code"))
+    else:
+        assert os.path.getsize(filename) > 0
+    if format_name == "pickle":
+        with open(filename, "rb") as fp:
+            assert pickle.load(fp)['code']['code'][0] == (0x8000, bytes([0xA9, 0x01]))
+
+@pytest.mark.parametrize("format_name, record_size, valid", [("s37", 250, True), ("s37", 251, False), ("s19", 252, True), ("s19", 253, False), ("ihex", 255, True), ("ihex", 256, False)])
+def test_record_size_argument(tmp_path, monkeypatch, format_name, record_size, valid):
+    source = os.path.join(tmp_path, "in.s")
+    with open(source, "w") as fp:
+        fp.write('        .segment "code", 0x8000, 0x8000, 0\n        .code\n        .org start\n        lda #$01\n')
+    monkeypatch.setattr(sys, "argv", ["csbcasm", "-f", format_name, "--record-size", str(record_size), source, os.path.join(tmp_path, "out")])
+    if valid:
+        main()
+    else:
+        with pytest.raises(Exception, match="--record-size: {}. Value must be 1 to {} for the {} format".format(record_size, record_size - 1, format_name)):
+            main()
@@ -0,0 +1,76 @@
+import os
+import sys
+import zlib
+
+import pytest
+
+from CSBCAsm.OutputFormats import OutputOptions, write_output, segment_filename
+from CSBCAsm.tools import assemble_string, create_memory, save_code_as_memory, save_code_as_segment_files, main
+
+from conftest import read
+
+program_string = '''
+        .segment "code", 0x8000, 0x8000, 0
+        .segment "empty", 0x10000, 0x10000, 0x8000
+        .segment "bank2", 0x20000, 0x10000, 0x18000
+        .segment "bank3", 0x30000, 0x10000, 0x28000
+        .segment "ram", 0x0000, 0x2000, -1
+        .code
+        .org start
+        lda #$01
+        .org $A000
+        .fill 0x1000, 0xAA
+        .bank2
+        .org $2FFF0
+        .fill 0x10, 0x12
+        .bank3
+        .fill 0x100, 0x56
+        .org $38000
+        .fill 0x100, 0x78
+        .ram
+        .fill 0x10, 0x34
+'''
+
+@pytest.mark.parametrize("unused_byte", [0x00, 0xFF])
+@pytest.mark.parametrize("workers", [2, 8, None])
+def test_memory(tmp_path, unused_byte, workers):
+    code_object = assemble_string(program_string)
+    filename = os.path.join(tmp_path, "out.bin")
+    save_code_as_memory(code_object, filename, unused_byte=unused_byte, workers=workers)
+    assert read(filename) == create_memory(code_object, unused_byte=unused_byte).getvalue()
+
+@pytest.mark.parametrize("unused_byte", [0x00, 0xFF])
+def test_segment_files(tmp_path, unused_byte):
+    code_object = assemble_string(program_string)
+    serial = save_code_as_segment_files(code_object, os.path.join(tmp_path, "serial.bin"), unused_byte=unused_byte)
+    parallel = save_code_as_segment_files(code_object, os.path.join(tmp_path, "parallel.bin"), unused_byte=unused_byte, workers=4)
+    assert [os.path.basename(fn).split(".")[1] for fn in parallel] == ["code", "empty", "bank2", "bank3"]
+    assert [read(fn) for fn in parallel] == [read(fn) for fn in serial]
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_segment_transform(tmp_path, workers):
+    code_object = assemble_string(program_string)
+    filename = os.path.join(tmp_path, "out.bin")
+    serial = save_code_as_segment_files(code_object, filename, unused_byte=0xFF)
+    compressed = save_code_as_segment_files(code_object, filename, unused_byte=0xFF, workers=workers, transform=zlib.compress, suffix=".z")
+    assert compressed == [fn + ".z" for fn in serial]
+    assert [zlib.decompress(read(fn)) for fn in compressed] == [read(fn) for fn in serial]
+
+def test_registry(tmp_path):
+    code_object = assemble_string(program_string)
+    filename = os.path.join(tmp_path, "out.bin")
+    write_output("segments", code_object, filename, OutputOptions(jobs=2, segment_transform="lzma"))
+    assert os.path.exists(segment_filename(filename, "bank3") + ".xz")
+
+def test_command_line(tmp_path, monkeypatch):
+    source = os.path.join(tmp_path, "in.s")
+    with open(source, "w") as fp:
+        fp.write(program_string)
+    output = os.path.join(tmp_path, "out.bin")
+    monkeypatch.setattr(sys, "argv", ["csbcasm", "--output-jobs", "3", "-u", "0xEA", source, output])
+    main()
+    assert read(output) == create_memory(assemble_string(program_string), unused_byte=0xEA).getvalue()
+
+    monkeypatch.setattr(sys, "argv", ["csbcasm", "--segment-transform", "zlib", source, output])
+    with pytest.raises(Exception):
+        main()
@@ -0,0 +1,95 @@
+import os
+import tempfile
+
+from CSBCAsm.Assembler import Assembler
+from CSBCAsm.ParseCache import ParseCache
+
+include_source = '''
+        inc a   /* a comment
+                   over two lines */
+        dey
+        jmp main
+'''
+
+def write_include(dirname, content=include_source):
+    fname = os.path.join(dirname, "inc.s")
+    with open(fname, "w") as fp:
+        fp.write(content)
+    return fname
+
+def program(fname):
+    return '''
+        .segment "code", 0xC000, 0x3FE0, 0
+        .code
+        .org start
+main:   .include "{}"
+'''.format(fname)
+
+def cache_entries(cache_dir):
+    return [f for f in os.listdir(cache_dir) if f.endswith(ParseCache.SUFFIX)]
+
+def test_include_cache_hit():
+    with tempfile.TemporaryDirectory() as d:
+        cache_dir = os.path.join(d, "cache")
+        fname = write_include(d)
+
+        assembler = Assembler(include_cache=True, include_cache_dir=cache_dir)
+        co = assembler.assemble_string(program(fname))
+        assert co['code']['code'][0][1] == bytes([0x1A, 0x88, 0x4C, 0x00, 0xC0])
+        assert (assembler.include_cache.hits, assembler.include_cache.misses) == (0, 1)
+        assert len(cache_entries(cache_dir)) == 1
+
+        assembler = Assembler(include_cache=True, include_cache_dir=cache_dir)
+        assert assembler.assemble_string(program(fname)) == co
+        assert (assembler.include_cache.hits, assembler.include_cache.misses) == (1, 0)
+
+def test_cached_lines_match_parse():
+    with tempfile.TemporaryDirectory() as d:
+        assembler = Assembler(include_cache=True, include_cache_dir=d)
+        parent = assembler.parse_string("main: nop", fn="main.s")[0]
+        first = assembler.parse_include(include_source, "inc.s", parent)
+        cached = assembler.parse_include(include_source, "other.s", None)
+        assert assembler.include_cache.hits == 1
+        assert [l.line_number for l in cached] == [l.line_number for l in first] == [2, 3, 4, 5]
+        assert all(l.filename == "inc.s" and l.included_from is parent for l in first)
+        assert all(l.filename == "other.s" and l.included_from is None for l in cached)
+        assert [str(l) for l in cached] == [str(l) for l in first]
+
+def test_changed_include_is_reparsed():
+    with tempfile.TemporaryDirectory() as d:
+        cache_dir = os.path.join(d, "cache")
+        fname = write_include(d)
+        Assembler(include_cache=True, include_cache_dir=cache_dir).assemble_string(program(fname))
+
+        write_include(d, include_source.replace("dey", "iny"))
+        assembler = Assembler(include_cache=True, include_cache_dir=cache_dir)
+        co = assembler.assemble_string(program(fname))
+        assert co['code']['code'][0][1] == bytes([0x1A, 0xC8, 0x4C, 0x00, 0xC0])
+        assert assembler.include_cache.misses == 1
+        assert len(cache_entries(cache_dir)) == 2
+
+def test_corrupt_entry_is_a_miss():
+    with tempfile.TemporaryDirectory() as d:
+        cache = ParseCache(d)
+        with open(cache.cache_file(include_source), "wb") as fp:
+            fp.write(b"not a pickle")
+        assert cache.get(include_source) is None
+        assert cache.misses == 1
+
+def test_lru_eviction():
+    with tempfile.TemporaryDirectory() as d:
+        assembler = Assembler()
+        sources = ["    lda #{}\n".format(i) for i in range(3)]
+        cache = ParseCache(d)
+        for i, s in enumerate(sources):
+            cache.put(s, assembler.parse_string(s))
+            os.utime(cache.cache_file(s), ns=(i * 10**9, i * 10**9))
+        size = os.path.getsize(cache.cache_file(sources[0]))
+
+        # using the oldest entry makes the second one the least recently used
+        assert cache.get(sources[0]) is not None
+        cache.max_size = size * 3 - 1
+        cache.evict()
+        assert cache.get(sources[1]) is None
+        assert cache.get(sources[0]) is not None
+        assert cache.get(sources[2]) is not None
@@ -0,0 +1,55 @@
+import os
+
+from CSBCAsm import Assembler
+from CSBCAsm import Parser
+from CSBCAsm.Lexer import CreateLexer
+
+def parse_line(parser, s):
+    return parser.parse(CreateLexer().lex(s))
+
+def test_cache_file_written(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    Parser.CreateParser(cache_dir=cache_dir)
+    files = os.listdir(cache_dir)
+    assert len(files) == 1
+    assert files[0].startswith("parser-{}-".format(Parser.PARSER_CACHE_VERSION))
+
+def test_cached_parser_matches_generated(tmp_path):
+    cache_dir = str(tmp_path)
+    generated = Parser.CreateParser(cache=False)
+    Parser.CreateParser(cache_dir=cache_dir)
+    cached = Parser.CreateParser(cache_dir=cache_dir)
+
+    assert cached.lr_table.lr_action == generated.lr_table.lr_action
+    assert cached.lr_table.lr_goto == generated.lr_table.lr_goto
+    assert cached.lr_table.default_reductions == generated.lr_table.default_reductions
+
+    line = parse_line(cached, "main:   lda [0x01], Y")
+    assert line.label_declaration.value == "main"
+    assert line.statement_list.value[0].name.value == "lda"
+
+def test_corrupt_cache_is_regenerated(tmp_path):
+    cache_dir = str(tmp_path)
+    Parser.CreateParser(cache_dir=cache_dir)
+    cache_file = os.path.join(cache_dir, os.listdir(cache_dir)[0])
+    with open(cache_file, "w") as fp:
+        fp.write("{ not json")
+
+    parser = Parser.CreateParser(cache_dir=cache_dir)
+    assert parse_line(parser, "    nop").statement_list.value[0].name.value == "nop"
+
+    # and the broken file was replaced
+    parser = Parser.CreateParser(cache_dir=cache_dir)
+    assert parse_line(parser, "    nop").statement_list.value[0].name.value == "nop"
+
+def test_assembler_cache_dir(tmp_path):
+    cache_dir = str(tmp_path)
+    assembler = Assembler.Assembler(parser_cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    code = assembler.assemble_string('''
+    .segment "code", 0x0000, 0x10000, 0
+    .code
+    .org start
+    nop
+''')
+    assert code['code']['code'][0][1] == bytes([0xEA])
@@ -0,0 +1,79 @@
+import pickle
+
+import pytest
+
+from CSBCAsm.Assembler import Assembler
+from CSBCAsm.Errors import CodeOverlapError, SegmentOverflowError
+from CSBCAsm.tools import assemble_string, code_object_with_bytes
+
+def test_chunks_are_views():
+    program_string = '''
+        .segment "code", 0xC000, 0x4000, 0
+        .code
+        .org start
+        lda #$01
+        nop
+'''
+    co = assemble_string(program_string)
+    addr, chunk = co['code']['code'][0]
+    assert addr == 0xC000
+    assert isinstance(chunk, memoryview)
+    assert chunk.readonly
+    assert chunk == bytes([0xA9, 0x01, 0xEA])
+
+def test_out_of_order_org():
+    program_string = '''
+        .segment "code", 0xC000, 0x4000, 0
+        .code
+        .org $C010
+        nop
+        .org $C000
+        lda #$01
+        .org $C003
+        inx
+        .org $C002
+        iny
+        .org $C011
+        dex
+'''
+    co = assemble_string(program_string)
+    assert [(addr, bytes(chunk)) for addr, chunk in co['code']['code']] == [
+        (0xC000, bytes([0xA9, 0x01, 0xC8, 0xE8])),
+        (0xC010, bytes([0xEA, 0xCA])),
+    ]
+
+@pytest.mark.parametrize("org", ["$C001", "$C00F"])
+def test_overlap(org):
+    program_string = '''
+        .segment "code", 0xC000, 0x4000, 0
+        .code
+        .org $C010
+        nop
+        .org $C000
+        lda #$01
+        .org {}
+        lda #$02
+'''.format(org)
+    with pytest.raises(CodeOverlapError):
+        Assembler().assemble_string(program_string)
+
+def test_below_segment_start():
+    program_string = '''
+        .segment "code", 0xC000, 0x4000, 0
+        .code
+        .org $BFFF
+        nop
+'''
+    with pytest.raises(SegmentOverflowError):
+        Assembler().assemble_string(program_string)
+
+def test_code_object_with_bytes():
+    program_string = '''
+        .segment "code", 0xC000, 0x4000, 0
+        .code
+        .org start
+        lda #$01
+'''
+    co = code_object_with_bytes(assemble_string(program_string))
+    assert co['code']['code'] == [(0xC000, bytes([0xA9, 0x01]))]
+    assert pickle.loads(pickle.dumps(co)) == co
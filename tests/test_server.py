@@ -0,0 +1,97 @@
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import pytest
+
+from CSBCAsm.Client import SOCKET_ENV, request, main as client_main
+from CSBCAsm.tools import main
+
+from conftest import read, write
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+program = '''
+        .segment "code", 0xC000, 0x3FE0, 0
+        .code
+        .org {}
+main:   inc a
+        jmp main
+'''
+
+@pytest.fixture
+def server():
+    # not tmp_path, a Unix socket path has to stay short
+    with tempfile.TemporaryDirectory() as d:
+        socket_path = os.path.join(d, "csbcasm.sock")
+        env = dict(os.environ, PYTHONPATH=REPO)
+        process = subprocess.Popen([sys.executable, "-c", "import sys; from CSBCAsm.tools import server_main; sys.argv[0] = 'csbcasm-server'; server_main()",
+                                    socket_path, "-j", "1", "--timeout", "1"], env=env)
+        try:
+            deadline = time.monotonic() + 30
+            while not os.path.exists(socket_path):
+                assert process.poll() is None and time.monotonic() < deadline
+                time.sleep(0.05)
+            yield socket_path, d
+        finally:
+            process.terminate()
+            process.wait()
+        assert not os.path.exists(socket_path)
+
+def test_build(server):
+    socket_path, d = server
+    write(os.path.join(d, "a.s"), program.format("start"))
+    response = request(socket_path, ["-f", "segments", "a.s", "a"], cwd=d)
+    assert response['status'] == 0
+    assert read(os.path.join(d, "a.code")) == bytes([0x1A, 0x4C, 0x00, 0xC0])
+
+    main(["-f", "segments", os.path.join(d, "a.s"), os.path.join(d, "direct")])
+    assert read(os.path.join(d, "direct.code")) == read(os.path.join(d, "a.code"))
+
+def test_requests_are_isolated(server):
+    # the same worker assembles both, each with its own labels
+    socket_path, d = server
+    write(os.path.join(d, "a.s"), program.format("$C000"))
+    write(os.path.join(d, "b.s"), program.format("$C100"))
+    for source, output in (("a.s", "a"), ("b.s", "b"), ("a.s", "a2")):
+        assert request(socket_path, ["-f", "segments", source, output], cwd=d)['status'] == 0
+    assert read(os.path.join(d, "a.code")) == read(os.path.join(d, "a2.code")) == bytes([0x1A, 0x4C, 0x00, 0xC0])
+    assert read(os.path.join(d, "b.code"))[0x100:] == bytes([0x1A, 0x4C, 0x00, 0xC1])
+
+def test_errors(server):
+    socket_path, d = server
+    response = request(socket_path, ["missing.s", "out.bin"], cwd=d)
+    assert response['status'] == 1
+    assert "missing.s" in response['stderr']
+
+    response = request(socket_path, ["--format", "bogus", "a.s", "out.bin"], cwd=d)
+    assert response['status'] == 2
+    assert "invalid choice" in response['stderr']
+
+def test_timeout(server):
+    socket_path, d = server
+    write(os.path.join(d, "big.s"), program.format("start") + "        lda #$12\n        sta $0200, x\n" * 20000)
+    response = request(socket_path, ["big.s", "big.bin"], cwd=d)
+    assert response['status'] == 1
+    assert "timed out" in response['stderr']
+
+    # the worker is replaced and the server carries on
+    write(os.path.join(d, "a.s"), program.format("start"))
+    assert request(socket_path, ["-f", "segments", "a.s", "a"], cwd=d)['status'] == 0
+    assert read(os.path.join(d, "a.code")) == bytes([0x1A, 0x4C, 0x00, 0xC0])
+
+def test_client(server, monkeypatch, capsys):
+    socket_path, d = server
+    write(os.path.join(d, "a.s"), program.format("start"))
+    monkeypatch.chdir(d)
+    with pytest.raises(SystemExit) as e:
+        client_main(["--socket", socket_path, "-v", "-f", "segments", "a.s", "a"])
+    assert e.value.code == 0
+    assert "Output saved to a" in capsys.readouterr().out
+
+    # without a server the client assembles in its own process
+    monkeypatch.setenv(SOCKET_ENV, os.path.join(d, "no-server.sock"))
+    client_main(["-f", "segments", "a.s", "b"])
+    assert read("b.code") == read("a.code")
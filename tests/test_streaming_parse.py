@@ -0,0 +1,94 @@
+import ast
+import glob
+import os
+
+import pytest
+
+from CSBCAsm.Assembler import Assembler
+from CSBCAsm.Parser import ParseError
+
+def ast_repr(obj):
+    # Name.line is the lexer's line number, which is always 1 when lexing a line at a time, and
+    # the line parser restarts column numbers after the end of a multi-line comment
+    if isinstance(obj, (list, tuple)):
+        return [ast_repr(v) for v in obj]
+    if hasattr(obj, '__dict__'):
+        return (obj.__class__.__name__, {k: ast_repr(v) for k, v in vars(obj).items() if k not in ('line', 'column')})
+    return obj
+
+def corpus():
+    '''Every multi-line string constant in the test suite, which is mostly assembly source'''
+    sources = []
+    for fn in sorted(glob.glob(os.path.join(os.path.dirname(__file__), "test_*.py"))):
+        with open(fn, "r") as fp:
+            tree = ast.parse(fp.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Constant) and isinstance(node.value, str) and "\n" in node.value:
+                sources.append(node.value)
+    return sources
+
+assembler = Assembler(streaming_parse=True)
+
+def parse_both(s):
+    by_line = assembler.parse_string_by_line(s, fn="test.s")
+    streamed = assembler.parse_string_streaming(s, fn="test.s")
+    return by_line, streamed
+
+def assert_same(s):
+    by_line, streamed = parse_both(s)
+    assert [l.line_number for l in streamed] == [l.line_number for l in by_line]
+    assert ast_repr(streamed) == ast_repr(by_line)
+
+def test_corpus_matches_line_parser():
+    sources = corpus()
+    assert len(sources) > 50
+    for s in sources:
+        try:
+            assembler.parse_string_by_line(s)
+        except Exception:
+            continue # some tests purposely contain bad syntax
+        assert_same(s)
+
+def test_line_numbers_and_filename():
+    program_string = '''
+        .segment "code", 0x0000, 0x10000, 0
+
+        .code
+label:  nop
+'''
+    lines = assembler.parse_string_streaming(program_string, fn="main.s")
+    assert [l.line_number for l in lines] == [2, 4, 5]
+    assert all(l.filename == "main.s" for l in lines)
+    assert lines[2].label_declaration.value == "label"
+
+def test_multiline_comments():
+    assert_same('''
+        nop /* this comment
+        lda #1 ; goes on
+        */ inx
+        iny
+        /* and
+           on
+        */
+label:  dex
+''')
+
+def test_unterminated_comment():
+    program_string = '''
+        nop
+        inx /* never
+        ends
+        iny
+'''
+    assert_same(program_string)
+    lines = assembler.parse_string_streaming(program_string)
+    assert [l.line_number for l in lines] == [2, 3]
+
+def test_whitespace_only_lines():
+    assert_same("\n  \n\tnop\n\n   \n")
+    assert_same("    nop")
+
+def test_parse_error_line_number(capsys):
+    with pytest.raises(ParseError):
+        assembler.parse_string_streaming("    nop\n\n    lda #1 +\n", fn="bad.s")
+    assert "failure parsing line 3 in file bad.s" in capsys.readouterr().out
@@ -0,0 +1,141 @@
+import os
+import threading
+import time
+
+import pytest
+
+from CSBCAsm.Assembler import Assembler
+from CSBCAsm.Watch import DependencyWatcher, watch
+
+from conftest import write
+
+main_source = '''
+        .segment "code", 0xC000, 0x3FE0, 0
+        .code
+        .org start
+main:   .include "inc.s"
+        jmp main
+'''
+
+def test_watcher(tmp_path):
+    d = str(tmp_path)
+    a = os.path.join(d, "a.s")
+    b = os.path.join(d, "b.s")
+    write(a, "nop\n")
+    write(b, "nop\n")
+    missing = os.path.join(d, "missing.s")
+
+    watcher = DependencyWatcher(interval=0.01)
+    assert watcher.watch([a, b, missing]) == 3
+    assert watcher.changed() == []
+    assert watcher.wait(timeout=0.05) == []
+
+    write(b, "nop\nnop\n")
+    write(missing, "nop\n")
+    assert watcher.wait() == [b, missing]
+
+    # a file written after the build started may have been read before the change
+    since_ns = time.time_ns()
+    write(a, "inc a\n")
+    watcher.watch([a, b], since_ns)
+    assert watcher.changed() == [a]
+
+def test_keep_source_parse(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write("main.s", main_source)
+    write("inc.s", "        inc a\n")
+    assembler = Assembler(keep_source_parse=True)
+    assembler.assemble_file("main.s")
+
+    parsed = []
+    parse_string = assembler.parse_string
+    def counting_parse_string(s, fn="<unknown>", included_from=None):
+        parsed.append(fn)
+        return parse_string(s, fn, included_from)
+    monkeypatch.setattr(assembler, "parse_string", counting_parse_string)
+
+    code = assembler.assemble_file("main.s")
+    assert parsed == []
+    assert bytes(code['code']['code'][0][1]) == bytes([0x1A, 0x4C, 0x00, 0xC0])
+
+    # only the changed file is parsed again
+    write("inc.s", "        dey\n        dey\n")
+    code = assembler.assemble_file("main.s")
+    assert parsed == ["inc.s"]
+    assert bytes(code['code']['code'][0][1]) == bytes([0x88, 0x88, 0x4C, 0x00, 0xC0])
+    assert assembler.dependencies == ["main.s", "inc.s"]
+
+def test_watch(tmp_path, capsys):
+    d = str(tmp_path)
+    inc = os.path.join(d, "inc.s")
+    write(inc, "        inc a\n")
+    assembler = Assembler(include_path=[d], keep_source_parse=True)
+    results = []
+    def build():
+        results.append(bytes(assembler.assemble_string(main_source, "main.s")['code']['code'][0][1]))
+
+    def edit():
+        time.sleep(0.1)
+        write(inc, "        dey\n")
+    editor = threading.Thread(target=edit)
+    editor.start()
+    watch(build, lambda: assembler.dependencies, DependencyWatcher(interval=0.01), max_builds=2)
+    editor.join()
+
+    assert results == [bytes([0x1A, 0x4C, 0x00, 0xC0]), bytes([0x88, 0x4C, 0x00, 0xC0])]
+    output = capsys.readouterr().out
+    assert output.count("Build done in") == 2
+    assert "Changed: {}".format(inc) in output
+
+def test_watch_failed_build(tmp_path, capsys):
+    d = str(tmp_path)
+    inc = os.path.join(d, "inc.s")
+    write(inc, "        bogus a\n")
+    assembler = Assembler(include_path=[d])
+    results = []
+    def build():
+        results.append(bytes(assembler.assemble_string(main_source, "main.s")['code']['code'][0][1]))
+
+    def edit():
+        time.sleep(0.1)
+        write(inc, "        inc a\n")
+    editor = threading.Thread(target=edit)
+    editor.start()
+    watch(build, lambda: assembler.dependencies, DependencyWatcher(interval=0.01), max_builds=2)
+    editor.join()
+
+    assert results == [bytes([0x1A, 0x4C, 0x00, 0xC0])]
+    assert "Build failed after" in capsys.readouterr().out
+
+class LimitedWatcher(DependencyWatcher):
+    # fail instead of waiting forever for a change that isn't noticed
+    def wait(self, timeout=None):
+        changed = super().wait(timeout=5)
+        assert len(changed)
+        return changed
+
+@pytest.mark.parametrize("directive", ['.include "new.s"', '.incbin "{}"'])
+def test_watch_missing_file(tmp_path, capsys, directive):
+    # the build fails until the file it names is created, which is enough to build again
+    d = str(tmp_path)
+    new = os.path.join(d, "new.s")
+    source = main_source.replace('.include "inc.s"', directive.format(new))
+    assembler = Assembler(include_path=[d], keep_source_parse=True)
+    results = []
+    def build():
+        results.append(bytes(assembler.assemble_string(source, "main.s")['code']['code'][0][1]))
+
+    def create():
+        time.sleep(0.1)
+        write(new, "        inc a\n")
+    creator = threading.Thread(target=create)
+    creator.start()
+    watch(build, lambda: assembler.dependencies + assembler.missing_dependencies, LimitedWatcher(interval=0.01), max_builds=2)
+    creator.join()
+
+    assert new in assembler.dependencies
+    assert len(results) == 1
+    assert results[0].endswith(bytes([0x4C, 0x00, 0xC0]))
+    output = capsys.readouterr().out
+    assert "Build failed after" in output
+    assert "Changed: {}".format(new) in output